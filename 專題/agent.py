@@ -1,9 +1,9 @@
 import random
-import time
 from fsm import FSM, State
+from map_system import passability_class
 
 class Agent:
-    def __init__(self, name, role_data, x=0, y=0):
+    def __init__(self, name, role_data, x=0, y=0, clock=None):
         self.name = name
         self.role = role_data  # 保留完整角色屬性
         self.speed = role_data["speed"]
@@ -12,22 +12,23 @@ class Agent:
         self.reaction_time = role_data["reaction_time"]
         self.tolerance = role_data["tolerance"]
         self.move_delay = role_data["move_delay"]
+        self.pclass = passability_class(role_data)  # 通行類別（查 MapSystem 的可通行表用）
         # 位置與狀態
         self.x = x
         self.y = y
         self.log = []
-        self.fsm = FSM(self)
+        self.fsm = FSM(self, clock)
+        self.clock = self.fsm.clock  # snapshot 的時間戳記與 FSM 用同一個時鐘
         
         self.path = None
         self.path_index = 0
+        self.spatial_index = None  # SpatialHash.insert 時設定；移動時同步更新
 
     # 🧭 基礎移動邏輯
     def try_move(self, nx, ny, map_system):
         """嘗試移動至 (nx, ny)，若可行則更新地圖與位置"""
-        if map_system.is_walkable(nx, ny, self.role):
-            map_system.leave(self.x, self.y)
-            self.x, self.y = nx, ny
-            map_system.occupy(nx, ny)
+        if map_system.walkable(nx, ny, self.pclass):
+            self._relocate(nx, ny, map_system)
             self.log.append(f"Moved to ({nx},{ny})")
             return True
         else:
@@ -39,6 +40,14 @@ class Agent:
         dx, dy = random.choice([(1,0),(-1,0),(0,1),(0,-1)])
         return self.x + dx, self.y + dy
 
+    def _relocate(self, nx, ny, map_system):
+        """移到 (nx, ny)：更新地圖佔用與空間索引"""
+        map_system.leave(self.x, self.y)
+        self.x, self.y = nx, ny
+        map_system.occupy(nx, ny)
+        if self.spatial_index is not None:
+            self.spatial_index.update(self)
+
     def move_toward_exit(self):
         """模擬向出口移動"""
         self.log.append(f"{self.name} 正在以速度 {self.speed} 向出口移動")
@@ -50,7 +59,11 @@ class Agent:
         return abs(self.x - other.x) + abs(self.y - other.y)
 
     def find_nearest_adult(self, agents):
-        """找最近的成人（type 為 adult）"""
+        """找最近的成人（type 為 adult）；有空間索引時只查附近的桶"""
+        if self.spatial_index is not None:
+            nearest = self.spatial_index.nearest(self.x, self.y, agent_type="adult",
+                                                 exclude=lambda a: a.name == self.name)
+            return nearest[0][1] if nearest else None
         adults = [a for a in agents if a.type == "adult" and a.name != self.name]
         if not adults:
             return None
@@ -62,21 +75,26 @@ class Agent:
         dy = 1 if target.y > self.y else -1 if target.y < self.y else 0
         nx, ny = self.x + dx, self.y + dy
 
-        if map_system.is_walkable(nx, ny, self.role):
-            map_system.leave(self.x, self.y)
-            self.x, self.y = nx, ny
-            map_system.occupy(nx, ny)
+        if map_system.walkable(nx, ny, self.pclass):
+            self._relocate(nx, ny, map_system)
             msg = f"跟隨 {target.name} 移動到 ({nx},{ny})"
             self.log.append(msg)
             print(msg)
         else:
             self.log.append("跟隨失敗，路被擋住")
 
+    def visible_agents(self, agent_type=None):
+        """視野（vision，曼哈頓距離）內的其他角色 [(距離, agent), ...]，由近到遠；需要空間索引"""
+        if self.spatial_index is None:
+            return []
+        return self.spatial_index.within(self.x, self.y, self.vision, agent_type,
+                                         exclude=lambda a: a is self)
+
     # 📸 狀態記錄
     def snapshot(self, action):
         """回傳當下角色狀態的紀錄 dict"""
         return {
-            "time": time.time(),
+            "time": self.clock.now(),
             "name": self.name,
             "x": self.x,
             "y": self.y,
@@ -0,0 +1,176 @@
+# building.py
+import heapq
+from collections import OrderedDict
+
+from flow_field import FlowField
+from map_system import MapSystem, STAIRS, ELEVATOR, passability_class
+
+# 各種樓層連接（portal）的預設代價與可使用的通行類別
+PORTAL_COSTS = {"stairs": 5, "elevator": 10, "ramp": 3}
+PORTAL_CLASSES = {
+    "stairs": ("stairs",),                 # 只有能走樓梯的角色
+    "elevator": ("stairs", "no_stairs"),   # 所有人
+    "ramp": ("stairs", "no_stairs"),
+}
+
+
+class Building:
+    """
+    多樓層建築
+    - 每層一個 MapSystem（格子 (x, y)，各層大小可不同）
+    - 樓層之間用 portal 連接：上下兩層同一位置都是 STAIRS 就是樓梯，都是 ELEVATOR 就是電梯；
+      坡道等其他連接用 portals 參數另外給 (kind, (f1, x1, y1), (f2, x2, y2))
+    - 每個 portal 端點在所屬樓層有一張到它的距離場（FlowField，依通行類別、依樓層版本快取），
+      跨樓層查詢只在 portal 組成的小圖上做 Dijkstra，不需要在疊起來的大網格上搜尋
+    - 查詢終點的距離場另外放在 LRU 裡，最多留 goal_cache_size 個（終點一直換時記憶體不會一直長）
+    - 不能走樓梯的角色（輪椅等）自動只用電梯 / 坡道
+    """
+
+    def __init__(self, floors, portals=None, portal_costs=None, goal_cache_size=16):
+        self.floors = [MapSystem(grid) for grid in floors]
+        self.portal_costs = dict(PORTAL_COSTS, **(portal_costs or {}))
+
+        # 相鄰樓層同一位置的 STAIRS / ELEVATOR 自動連接
+        self.portals = []   # (kind, (f1, x1, y1), (f2, x2, y2))
+        for f in range(len(self.floors) - 1):
+            lower, upper = self.floors[f], self.floors[f + 1]
+            for y in range(min(lower.h, upper.h)):
+                for x in range(min(lower.w, upper.w)):
+                    c = lower.grid[y][x]
+                    if c in (STAIRS, ELEVATOR) and upper.grid[y][x] == c:
+                        kind = "stairs" if c == STAIRS else "elevator"
+                        self.portals.append((kind, (f, x, y), (f + 1, x, y)))
+        self.portals.extend(portals or [])
+
+        # 端點 -> [(對側端點, 種類)]；每層的端點串列
+        self.links = {}
+        self.floor_ends = [[] for _ in self.floors]
+        for kind, a, b in self.portals:
+            for u, v in ((a, b), (b, a)):
+                if u not in self.links:
+                    self.links[u] = []
+                    self.floor_ends[u[0]].append(u)
+                self.links[u].append((v, kind))
+
+        self.fields = {}                  # portal 端點 (floor, x, y) -> 該層到這一格的 FlowField
+        self.goal_fields = OrderedDict()  # 其他終點 -> FlowField（LRU）
+        self.goal_cache_size = max(1, goal_cache_size)
+
+    def field(self, end, pclass):
+        """某樓層到 end 的距離場 dist[y][x]（樓層改變時 FlowField 會自動重建）"""
+        fields = self.fields if end in self.links else self.goal_fields
+        flow = fields.get(end)
+        if flow is None:
+            flow = FlowField(self.floors[end[0]], (end[1], end[2]))
+            fields[end] = flow
+            if fields is self.goal_fields and len(fields) > self.goal_cache_size:
+                fields.popitem(last=False)
+        elif fields is self.goal_fields:
+            fields.move_to_end(end)
+        return flow.field(pclass)
+
+    def precompute(self, pclasses=("stairs", "no_stairs")):
+        """預先建好所有 portal 端點的距離場（不呼叫也可以，查詢時會在第一次用到時建立）"""
+        for ends in self.floor_ends:
+            for end in ends:
+                for pclass in pclasses:
+                    self.field(end, pclass)
+
+    def set_cell(self, floor, x, y, value):
+        """修改某層的格子（block/clear）；該層的距離場在下次查詢時重建"""
+        return self.floors[floor].set_cell(x, y, value)
+
+    def _search(self, start, goal, pclass):
+        """portal 圖上的 Dijkstra，回傳 (總代價, 經過的端點串列) 或 None"""
+        gf, gx, gy = goal
+        usable = lambda kind: pclass in PORTAL_CLASSES.get(kind, ("stairs", "no_stairs"))
+
+        dist = {start: 0}
+        parent = {start: None}
+        heap = [(0, start)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == goal:
+                path = []
+                while u is not None:
+                    path.append(u)
+                    u = parent[u]
+                path.reverse()
+                return d, path
+
+            f, x, y = u
+            edges = []
+            # 同一層：查距離場（到終點、到其他 portal 端點）
+            if f == gf:
+                step = self.field(goal, pclass)[y][x]
+                if step is not None:
+                    edges.append((goal, step))
+            for end in self.floor_ends[f]:
+                if end != u:
+                    step = self.field(end, pclass)[y][x]
+                    if step is not None:
+                        edges.append((end, step))
+            # 跨樓層：走 portal
+            if u in self.links:
+                for v, kind in self.links[u]:
+                    if usable(kind):
+                        edges.append((v, self.portal_costs.get(kind, 1)))
+
+            for v, cost in edges:
+                nd = d + cost
+                if v not in dist or nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    heapq.heappush(heap, (nd, v))
+        return None
+
+    def distance(self, start, goal, role_dict):
+        """(floor, x, y) 到 (floor, x, y) 的代價（步數 + portal 代價）；到不了回傳 None"""
+        if not (self._inside(start) and self._inside(goal)):
+            return None
+        result = self._search(start, goal, passability_class(role_dict))
+        return result[0] if result is not None else None
+
+    def route(self, start, goal, role_dict):
+        """
+        跨樓層路徑：[(floor, x, y), ...]，不含起點（與 astar_search 相同）；到不了回傳 None
+        同層路段沿距離場下降展開，不需要再搜尋
+        """
+        if not (self._inside(start) and self._inside(goal)):
+            return None
+        pclass = passability_class(role_dict)
+        result = self._search(start, goal, pclass)
+        if result is None:
+            return None
+
+        _, ends = result
+        path = []
+        for u, v in zip(ends, ends[1:]):
+            if u[0] != v[0]:
+                path.append(v)   # 走 portal 換樓層
+                continue
+            path.extend(self._descend(u, v, pclass))
+        return path
+
+    def _descend(self, u, target, pclass):
+        """同一層從 u 沿 target 的距離場一路下降到 target（不含 u）"""
+        f, x, y = u
+        ms = self.floors[f]
+        dist = self.field(target, pclass)
+        cells = []
+        while (x, y) != (target[1], target[2]):
+            here = dist[y][x]
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < ms.w and 0 <= ny < ms.h and dist[ny][nx] is not None \
+                        and dist[ny][nx] < here:
+                    x, y = nx, ny
+                    break
+            cells.append((f, x, y))
+        return cells
+
+    def _inside(self, node):
+        f, x, y = node
+        return 0 <= f < len(self.floors) and 0 <= x < self.floors[f].w and 0 <= y < self.floors[f].h
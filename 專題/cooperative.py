@@ -0,0 +1,210 @@
+# cooperative.py
+import heapq
+
+from flow_field import FlowField
+
+# 四方向移動 + 原地等待
+MOVES = [(1, 0), (-1, 0), (0, 1), (0, -1), (0, 0)]
+
+
+class ReservationTable:
+    """
+    時空預約表（cooperative A* 用）
+    - cells: (x, y, t) -> 預約者：t 時刻這一格已有人
+    - edges: (x1, y1, x2, y2, t) -> 預約者：t-1 → t 從 (x1, y1) 走到 (x2, y2)，用來禁止兩人對穿
+    - 每個預約者記得自己的 key，重新規劃時整批釋放
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self.edges = {}
+        self.owned = {}   # 預約者 -> [key, ...]
+
+    def free(self, x, y, t, owner):
+        o = self.cells.get((x, y, t))
+        return o is None or o is owner
+
+    def crossing(self, x1, y1, x2, y2, t, owner):
+        """(x1, y1) → (x2, y2) 這一步是否會和別人在 t 時刻對穿"""
+        o = self.edges.get((x2, y2, x1, y1, t))
+        return o is not None and o is not owner
+
+    def reserve(self, owner, cells, t0):
+        """預約一段路徑：cells[k] 為 t0 + k 時刻的位置"""
+        keys = self.owned.setdefault(owner, [])
+        prev = None
+        for k, (x, y) in enumerate(cells):
+            t = t0 + k
+            self.cells[(x, y, t)] = owner
+            keys.append((x, y, t))
+            if prev is not None and prev != (x, y):
+                key = (prev[0], prev[1], x, y, t)
+                self.edges[key] = owner
+                keys.append(key)
+            prev = (x, y)
+
+    def release(self, owner):
+        for key in self.owned.pop(owner, ()):
+            table = self.cells if len(key) == 3 else self.edges
+            if table.get(key) is owner:
+                del table[key]
+
+    def prune(self, t):
+        """丟掉 t 之前的預約（已經過去的時刻）"""
+        for owner, keys in self.owned.items():
+            kept = []
+            for key in keys:
+                if key[-1] >= t:
+                    kept.append(key)
+                else:
+                    table = self.cells if len(key) == 3 else self.edges
+                    if table.get(key) is owner:
+                        del table[key]
+            self.owned[owner] = kept
+
+    def __len__(self):
+        return len(self.cells)
+
+
+class CooperativePlanner:
+    """
+    WHCA*（windowed hierarchical cooperative A*）
+    - 所有角色共用一張時空預約表，依序規劃：每人在 (x, y, t) 上做 A*（動作為移動或原地等待，代價都是 1），
+      避開別人已預約的格子與對穿，規劃好後把自己未來 window 步的位置預約起來
+    - 只在 window 步內協調；到 window 邊界時以出口距離場（FlowField，不考慮其他人）當剩餘代價，
+      距離場同時是 A* 的啟發式（真實距離，不會高估）
+    - 每走 window // 2 步（或計畫失效：地圖改變、被擠開）才重新規劃一次
+    - 不照計畫走的人（還沒反應、在出口停留）用 hold() 把所在格整個 window 預約起來
+    """
+
+    def __init__(self, map_system, goal, window=8, stay_at_goal=True):
+        self.map_system = map_system
+        self.goal = goal
+        self.window = window
+        self.stay_at_goal = stay_at_goal   # 到出口後是否留在出口（會佔住出口格）
+        self.flow = FlowField(map_system, goal)
+        self.table = ReservationTable()
+        self.plans = {}   # 角色 -> (t0, cells, 地圖版本)
+        self.searches = 0
+
+    def begin_step(self, t, agents=()):
+        """
+        每步開始時呼叫：丟掉過去的預約；還沒有計畫的人先把目前位置預約到 t+1，
+        排在前面規劃的人才不會把下一步排進他所在的格子
+        """
+        self.table.prune(t)
+        for agent in agents:
+            if agent not in self.plans and not self.table.owned.get(agent):
+                self.table.reserve(agent, [(agent.x, agent.y)] * 2, t)
+
+    def distance(self, x, y, pclass):
+        """到出口的步數（不考慮其他人）；到不了回傳 None"""
+        return self.flow.field(pclass)[y][x]
+
+    def order(self, agents):
+        """依到出口的距離由近到遠排序（到不了的排最後），前面的人先走，後面的人才能跟進空出來的格子"""
+        far = self.map_system.w * self.map_system.h
+        def remaining(agent):
+            d = self.distance(agent.x, agent.y, agent.pclass)
+            return far if d is None else d
+        return sorted(agents, key=remaining)
+
+    def leaving(self, x, y, t):
+        """照計畫在 t 時刻停在 (x, y) 的人，t+1 是否會離開這一格"""
+        owner = self.table.cells.get((x, y, t))
+        return owner is not None and self.table.cells.get((x, y, t + 1)) is not owner
+
+    def hold(self, owner, x, y, t):
+        """owner 在 t ~ t + window 都停在 (x, y)"""
+        self.drop(owner)
+        self.table.reserve(owner, [(x, y)] * (self.window + 1), t)
+
+    def drop(self, owner):
+        """放棄目前的計畫與預約（下次 next_cell 會重新規劃）"""
+        self.plans.pop(owner, None)
+        self.table.release(owner)
+
+    def next_cell(self, owner, x, y, pclass, t):
+        """
+        t → t+1 要去的格子（與 (x, y) 相同表示原地等待）；到不了出口回傳 None
+        """
+        ms = self.map_system
+        plan = self.plans.get(owner)
+        if plan is not None:
+            t0, cells, version = plan
+            k = t - t0
+            if (version != ms.version or k >= self.window // 2 or k + 1 >= len(cells)
+                    or cells[k] != (x, y)):
+                plan = None
+            else:
+                nxt = cells[k + 1]
+                if not ms.walkable(nxt[0], nxt[1], pclass):
+                    plan = None
+        if plan is None:
+            self.drop(owner)
+            cells = self._search(owner, (x, y), t, pclass)
+            if cells is None:
+                return None
+            self.table.reserve(owner, cells, t)
+            self.plans[owner] = (t, cells, ms.version)
+            if len(cells) == 1:
+                return cells[0]
+            return cells[1]
+        return cells[k + 1]
+
+    def _search(self, owner, start, t0, pclass):
+        """
+        時空 A*，回傳 cells（cells[k] 為 t0 + k 時刻的位置，cells[0] 為起點）
+        到達出口或 window 邊界就結束；起點到不了出口回傳 None
+        """
+        ms = self.map_system
+        dist = self.flow.field(pclass)
+        mask = ms.walkable_mask(pclass)
+        table = self.table
+        w, h = ms.w, ms.h
+        sx, sy = start
+        h0 = dist[sy][sx]
+        if h0 is None:
+            return None
+        self.searches += 1
+
+        end = t0 + self.window
+        # 每個動作代價都是 1，g = t - t0 只由時刻決定，同一 (x, y, t) 第一次遇到就是最佳
+        parent = {(sx, sy, t0): None}
+        heap = [(h0, h0, sx, sy, t0)]
+        best = (t0, -h0, sx, sy)   # 被預約圍住時退而求其次：走得最久（再來離出口最近）的那一段
+        while heap:
+            _, d, x, y, t = heapq.heappop(heap)
+            if d == 0 or t == end:
+                break
+            if (t, -d) > best[:2]:
+                best = (t, -d, x, y)
+            nt = t + 1
+            for dx, dy in MOVES:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < w and 0 <= ny < h) or not mask[ny][nx]:
+                    continue
+                nd = dist[ny][nx]
+                if nd is None or (nx, ny, nt) in parent:
+                    continue
+                if not table.free(nx, ny, nt, owner):
+                    continue
+                if (dx or dy) and table.crossing(x, y, nx, ny, nt, owner):
+                    continue
+                parent[(nx, ny, nt)] = (x, y, t)
+                heapq.heappush(heap, (nt - t0 + nd, nd, nx, ny, nt))
+        else:
+            # 走不到 window 邊界：只預約走得到的那一段，用完就重新規劃
+            t, d, x, y = best
+            d = -d
+
+        cells = []
+        node = (x, y, t)
+        while node is not None:
+            cells.append(node[:2])
+            node = parent[node]
+        cells.reverse()
+        # 到出口後留在出口：把剩下的 window 也預約起來
+        if d == 0 and self.stay_at_goal:
+            cells.extend([cells[-1]] * (end - t))
+        return cells
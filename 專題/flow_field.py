@@ -0,0 +1,87 @@
+# flow_field.py
+from collections import deque
+
+from map_system import passability_class
+
+DIRS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class FlowField:
+    """
+    出口距離場（flow field）
+    - 從 goal 反向 BFS 一次，得到每格到出口的步數
+    - 同一通行類別（passability_class）的角色共用同一張距離場
+    - 地圖版本（MapSystem.version）改變時才重建
+    每個角色只要往距離更小的鄰格走即可，不需要各自跑 A*。
+    """
+
+    def __init__(self, map_system, goal):
+        self.map_system = map_system
+        self.goal = goal
+        self.fields = {}   # pclass -> (map version, dist)
+
+    def _build(self, pclass):
+        ms = self.map_system
+        dist = [[None for _ in range(ms.w)] for __ in range(ms.h)]
+        mask = ms.walkable_mask(pclass)
+        gx, gy = self.goal
+        if not ms.walkable(gx, gy, pclass):
+            return dist
+
+        dist[gy][gx] = 0
+        queue = deque([(gx, gy)])
+        while queue:
+            x, y = queue.popleft()
+            d = dist[y][x] + 1
+            for dx, dy in DIRS:
+                nx, ny = x + dx, y + dy
+                if not (0 <= nx < ms.w and 0 <= ny < ms.h):
+                    continue
+                if dist[ny][nx] is not None or not mask[ny][nx]:
+                    continue
+                dist[ny][nx] = d
+                queue.append((nx, ny))
+        return dist
+
+    def field(self, pclass):
+        """取得某通行類別的距離場（dist[y][x]，到不了為 None）"""
+        cached = self.fields.get(pclass)
+        if cached is not None and cached[0] == self.map_system.version:
+            return cached[1]
+        dist = self._build(pclass)
+        self.fields[pclass] = (self.map_system.version, dist)
+        return dist
+
+    def distance(self, x, y, role_dict):
+        """(x, y) 到出口的步數；到不了回傳 None"""
+        if not (0 <= x < self.map_system.w and 0 <= y < self.map_system.h):
+            return None
+        return self.field(passability_class(role_dict))[y][x]
+
+    def next_step(self, x, y, role_dict, occupancy=None):
+        """
+        沿距離場下降的下一格；已在出口或到不了出口時回傳 None
+        - 有多個下降方向時，優先選沒人的格子（occupancy 可選）
+        """
+        ms = self.map_system
+        dist = self.field(passability_class(role_dict))
+        if not (0 <= x < ms.w and 0 <= y < ms.h):
+            return None
+        here = dist[y][x]
+        if here is None or here == 0:
+            return None
+
+        best = None
+        best_free = None
+        for dx, dy in DIRS:
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < ms.w and 0 <= ny < ms.h):
+                continue
+            d = dist[ny][nx]
+            if d is None or d >= here:
+                continue
+            if best is None:
+                best = (nx, ny)
+            if best_free is None and (occupancy is None or occupancy[ny][nx] == 0):
+                best_free = (nx, ny)
+        return best_free if best_free is not None else best
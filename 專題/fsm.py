@@ -1,5 +1,6 @@
 from enum import Enum
-import time
+
+from sim_clock import RealTimeClock
 
 class State(Enum):
     IDLE = "Idle"
@@ -10,14 +11,15 @@ class State(Enum):
 
 
 class FSM:
-    def __init__(self, agent):
+    def __init__(self, agent, clock=None):
         self.agent = agent
         self.name = agent.name
+        self.clock = clock if clock is not None else RealTimeClock()  # reaction_time / move_delay 用的時鐘
         self.state = State.IDLE
         self.history = []
         self.log = []
-        self.start_reaction_time = time.time()
-        self.last_move_time = time.time()
+        self.start_reaction_time = self.clock.now()
+        self.last_move_time = self.clock.now()
 
     def change_state(self, new_state: State):
         print(f"{self.name}: {self.state.value} → {new_state.value}")
@@ -25,7 +27,7 @@ class FSM:
         self.state = new_state
 
     def update(self, event=None, crowd_density=0.0):
-        current_time = time.time()
+        current_time = self.clock.now()
 
         # --- 狀態邏輯 ---
         if self.state == State.IDLE:
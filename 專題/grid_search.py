@@ -0,0 +1,113 @@
+import heapq
+
+
+class GridSearch:
+    def __init__(self, rows, cols):
+        """
+        扁平索引的網格 A* 核心（整數代價、曼哈頓啟發式；astar_search 用）
+
+        參數:
+        - rows, cols: 網格大小；節點 (r, c) 的編號為 (r + 1) * (cols + 2) + c + 1
+
+        - 四周各加一圈代價為 0（不可通行）的邊框，展開鄰居不需要邊界判斷
+        - 編號大小順序與 (r, c) tuple 相同
+        - g / parent 緩衝區在多次搜尋間重複使用，用 generation 戳記判斷是否屬於本次搜尋
+        """
+        self.rows = rows
+        self.cols = cols
+        self.stride = cols + 2
+        self.size = (rows + 2) * self.stride
+        self.g = [0] * self.size
+        self.parent = [-1] * self.size
+        self.seen = [0] * self.size    # g / parent 有效的搜尋世代
+        self.marked = [0] * self.size  # 已展開的搜尋世代
+        self.generation = 0
+        self.expanded = 0              # 最近一次搜尋展開的節點數
+
+    def node(self, r, c):
+        return (r + 1) * self.stride + c + 1
+
+    def cell(self, node):
+        r, c = divmod(node, self.stride)
+        return r - 1, c - 1
+
+    def in_bounds(self, r, c):
+        return 0 <= r < self.rows and 0 <= c < self.cols
+
+    def offsets(self, directions):
+        """把 (dr, dc) 方向轉成編號差"""
+        return [dr * self.stride + dc for dr, dc in directions]
+
+    def padded(self, rows):
+        """把每列的進入代價（0 表示不可通行）攤平成含邊框的一維代價表"""
+        out = [0] * self.stride
+        for row in rows:
+            out.append(0)
+            out.extend(row)
+            out.append(0)
+        out.extend([0] * self.stride)
+        return out
+
+    def search(self, cost, start, goal, offsets):
+        """
+        A*，回傳 start 到 goal 的節點編號串列（含兩端），找不到回傳 None
+
+        - cost: 含邊框的一維整數代價表，cost[v] 為進入 v 的代價，0 表示不可通行
+        - offsets: 四個鄰居方向的編號差（展開順序）
+        - f 相同時先展開 h 小（離目標近）的節點：空曠地圖上 f 相同的節點很多，依編號展開會把整個
+          矩形都展開，往目標方向深入只展開路徑附近的節點。結果一定是最短路徑，但代價相同的路徑
+          可能與依編號平手時選到不同的一條
+        """
+        if start != goal and not cost[goal]:
+            self.expanded = 0
+            return None   # 目標不可進入：不必把整個連通區域搜完才知道到不了
+        self.generation += 1
+        gen = self.generation
+        g, parent, seen, marked = self.g, self.parent, self.seen, self.marked
+        g[start] = 0
+        seen[start] = gen
+        parent[start] = -1
+
+        # heap 存單一整數 (f * span + h) * size + 節點（span 大於任何 h），
+        # 即 (g * span + h * (span + 1)) * size + 節點；h 在推入時才算，不必為每個目標建整張表
+        size = self.size
+        stride = self.stride
+        span = self.rows + self.cols + 4
+        weight = span + 1
+        gr, gc = divmod(goal, stride)
+        o0, o1, o2, o3 = offsets
+        heappush, heappop = heapq.heappush, heapq.heappop
+        heap = [start]
+        expanded = 0
+        while heap:
+            u = heappop(heap) % size
+            if marked[u] == gen:
+                continue
+            marked[u] = gen
+            if u == goal:
+                self.expanded = expanded
+                return self._path(start, goal)
+            expanded += 1
+            gu = g[u]
+            for v in (u + o0, u + o1, u + o2, u + o3):
+                step = cost[v]
+                if step:
+                    ng = gu + step
+                    if seen[v] != gen or ng < g[v]:
+                        g[v] = ng
+                        seen[v] = gen
+                        parent[v] = u
+                        r, c = divmod(v, stride)
+                        heappush(heap, (ng * span + (abs(r - gr) + abs(c - gc)) * weight) * size + v)
+        self.expanded = expanded
+        return None
+
+    def _path(self, start, goal):
+        parent = self.parent
+        path = [goal]
+        cur = goal
+        while cur != start:
+            cur = parent[cur]
+            path.append(cur)
+        path.reverse()
+        return path
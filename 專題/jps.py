@@ -0,0 +1,175 @@
+# jps.py
+import heapq
+
+from map_system import BLOCKED, STAIRS
+
+# 與 pathfinding.DIRS 相同：(dx, dy)
+DIRS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class JumpTables:
+    """
+    JPS+ 的水平跳點表（四方向、每步代價相同的網格）
+    - 每個通行類別、每一列各一份：right[x] / left[x] 為從 x 往右/左直走時
+      遇到的下一個跳點的 x（中途撞牆為 -1）
+    - 跳點：這一格的上方（或下方）可走，但前一格的上方（或下方）不可走，
+      最短路徑只需要在跳點轉向
+    - 某一列的表在第一次用到時才建立；格子改變（block/clear）時呼叫 cell_changed，
+      只讓受影響的上下三列失效
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.h = len(grid)
+        self.w = len(grid[0]) if self.h > 0 else 0
+        self.free_rows = {}   # pclass -> 每列的可通行表（None 表示要重建）
+        self.jump_rows = {}   # pclass -> 每列的 (right, left)（None 表示要重建）
+
+    def cell_changed(self, x, y):
+        """格子 (x, y) 的類型改變：這一列的可通行表、上下三列的跳點表失效"""
+        for rows in self.free_rows.values():
+            if 0 <= y < self.h:
+                rows[y] = None
+        for rows in self.jump_rows.values():
+            for ry in (y - 1, y, y + 1):
+                if 0 <= ry < self.h:
+                    rows[ry] = None
+
+    def free_row(self, y, pclass):
+        rows = self.free_rows.get(pclass)
+        if rows is None:
+            rows = [None] * self.h
+            self.free_rows[pclass] = rows
+        row = rows[y]
+        if row is None:
+            no_stairs = pclass == "no_stairs"
+            row = [not (c == BLOCKED or (c == STAIRS and no_stairs)) for c in self.grid[y]]
+            rows[y] = row
+        return row
+
+    def jump_row(self, y, pclass):
+        rows = self.jump_rows.get(pclass)
+        if rows is None:
+            rows = [None] * self.h
+            self.jump_rows[pclass] = rows
+        row = rows[y]
+        if row is None:
+            row = self._build_row(y, pclass)
+            rows[y] = row
+        return row
+
+    def _build_row(self, y, pclass):
+        w = self.w
+        free = self.free_row(y, pclass)
+        sides = [self.free_row(ny, pclass) for ny in (y - 1, y + 1) if 0 <= ny < self.h]
+        # opens[x]：x 的上/下方可走的集合（位元），與前一格比較就知道是否新出現轉向機會
+        opens = [0] * w
+        for bit, side in enumerate(sides):
+            opens = [o | (s << bit) for o, s in zip(opens, side)]
+
+        right = [-1] * w
+        nxt = -1
+        for x in range(w - 1, -1, -1):
+            right[x] = nxt
+            if not free[x]:
+                nxt = -1
+            elif x > 0 and opens[x] & ~opens[x - 1]:
+                nxt = x
+
+        left = [-1] * w
+        nxt = -1
+        for x in range(w):
+            left[x] = nxt
+            if not free[x]:
+                nxt = -1
+            elif x < w - 1 and opens[x] & ~opens[x + 1]:
+                nxt = x
+        return right, left
+
+    def jump(self, x, y, dx, pclass, goal):
+        """從 (x, y) 往 dx 方向水平跳，回傳下一個跳點（或目標）的 x；沒有回傳 -1"""
+        right, left = self.jump_row(y, pclass)
+        jp = right[x] if dx > 0 else left[x]
+        gx, gy = goal
+        if gy != y or (gx - x) * dx <= 0:
+            return jp
+        # 目標在同一列的前方：比跳點近且中間沒有牆就停在目標
+        if jp != -1 and (gx - jp) * dx > 0:
+            return jp
+        free = self.free_row(y, pclass)
+        if all(free[i] for i in range(x + dx, gx + dx, dx)):
+            return gx
+        return jp
+
+
+def jps_search(tables, pclass, start, goal):
+    """
+    Jump Point Search（四方向、每步代價 1）
+    - 垂直方向逐格走，水平方向用 JumpTables 直接跳到下一個跳點
+    - 回傳與 astar_search 相同格式的最短路徑（不含起點）；找不到回傳 None
+    """
+    w, h = tables.w, tables.h
+    sx, sy = start
+    gx, gy = goal
+    if not (0 <= sx < w and 0 <= sy < h and 0 <= gx < w and 0 <= gy < h):
+        return None
+    if start == goal:
+        return []
+    if not tables.free_row(gy, pclass)[gx]:
+        return None
+
+    g = {start: 0}
+    parent = {start: None}
+    arrived = {start: None}   # 抵達方向
+    closed = set()
+    heap = [(abs(sx - gx) + abs(sy - gy), start)]
+
+    while heap:
+        _, u = heapq.heappop(heap)
+        if u in closed:
+            continue
+        closed.add(u)
+        if u == goal:
+            break
+
+        x, y = u
+        gu = g[u]
+        d = arrived[u]
+        for dx, dy in DIRS:
+            if d is not None and (dx, dy) == (-d[0], -d[1]):
+                continue
+            if dy == 0:
+                nx = tables.jump(x, y, dx, pclass, goal)
+                if nx == -1:
+                    continue
+                v = (nx, y)
+                ng = gu + abs(nx - x)
+            else:
+                ny = y + dy
+                if not (0 <= ny < h) or not tables.free_row(ny, pclass)[x]:
+                    continue
+                v = (x, ny)
+                ng = gu + 1
+            if v not in g or ng < g[v]:
+                g[v] = ng
+                parent[v] = u
+                arrived[v] = (dx, dy)
+                heapq.heappush(heap, (ng + abs(v[0] - gx) + abs(v[1] - gy), v))
+    else:
+        return None
+
+    # 把跳點之間的直線補成逐格路徑
+    path = []
+    cur = goal
+    while cur != start:
+        prev = parent[cur]
+        dx = (cur[0] > prev[0]) - (cur[0] < prev[0])
+        dy = (cur[1] > prev[1]) - (cur[1] < prev[1])
+        x, y = cur
+        while (x, y) != prev:
+            path.append((x, y))
+            x -= dx
+            y -= dy
+        cur = prev
+    path.reverse()
+    return path
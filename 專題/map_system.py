@@ -1,4 +1,11 @@
 PASSABLE, BLOCKED, DANGER, STAIRS = 0, 1, 2, 3
+ELEVATOR = 4   # 電梯：所有角色都可使用，多樓層建築（building.py）中連接上下層
+
+# 通行類別 -> 該類別不能進入的格子類型
+PASSABILITY_CLASSES = {
+    "stairs": (BLOCKED,),             # 可走樓梯
+    "no_stairs": (BLOCKED, STAIRS),   # 不能/不走樓梯（輪椅等）
+}
 
 GRID_W = 5
 GRID_H = 5
@@ -38,8 +45,30 @@ def is_walkable(x, y, role_dict):
         return False
     return True
 
+def passability_class(role_dict):
+    """把角色的通行限制歸類：同一類別的角色對每一格的可通行判斷都相同"""
+    compiled = role_dict.get("passability_class")
+    if compiled is not None:
+        return compiled
+    if not role_dict.get("can_use_stairs", True):
+        return "no_stairs"
+    if "stairs" in role_dict.get("avoid_terrain", []):
+        return "no_stairs"
+    return "stairs"
+
+def compile_roles(roles):
+    """
+    載入角色時算好每個角色的通行類別（存在 role["passability_class"]），之後只查表；
+    回傳新的角色表，傳入的 roles 不變
+    """
+    compiled = {name: dict(role_dict) for name, role_dict in roles.items()}
+    for role_dict in compiled.values():
+        role_dict.pop("passability_class", None)
+        role_dict["passability_class"] = passability_class(role_dict)
+    return compiled
+
 def print_map():
-    symbols = {PASSABLE: "⬜", BLOCKED: "⬛", DANGER: "⚠️ ", STAIRS: "↗️ "}
+    symbols = {PASSABLE: "⬜", BLOCKED: "⬛", DANGER: "⚠️ ", STAIRS: "↗️ ", ELEVATOR: "🛗"}
     for y in range(GRID_H):
         row = ""
         for x in range(GRID_W):
@@ -65,27 +94,83 @@ class MapSystem:
         self.h = len(grid)
         self.w = len(grid[0]) if self.h > 0 else 0
         self.occupancy = [[0 for _ in range(self.w)] for __ in range(self.h)]
+        # 地圖版本：每次 set_cell 改動格子就 +1，讓距離場等快取知道要重建
+        self.version = 0
+        # 每個通行類別一張可通行表 masks[pclass][y][x]，set_cell 時逐格更新
+        self.masks = {
+            pclass: [[c not in blocked for c in row] for row in grid]
+            for pclass, blocked in PASSABILITY_CLASSES.items()
+        }
+        # A* 用的含邊框代價表 (pclass, 是否計擁擠) -> 一維串列；第一次要用時建立，之後逐格更新
+        self.cost_grids = {}
+
+    def walkable_mask(self, pclass):
+        """某通行類別的可通行表（mask[y][x]，原地更新，不要修改）"""
+        return self.masks[pclass]
+
+    def walkable(self, x, y, pclass):
+        """以通行類別判斷能否進入 (x, y)：一次查表"""
+        return 0 <= x < self.w and 0 <= y < self.h and self.masks[pclass][y][x]
 
     def is_walkable(self, x, y, role_dict):
+        return self.walkable(x, y, passability_class(role_dict))
+
+    def set_cell(self, x, y, value):
+        """修改格子類型（block/clear 事件用），並更新地圖版本與各類別的可通行表"""
         if not (0 <= x < self.w and 0 <= y < self.h):
             return False
-        c = self.grid[y][x]
-        if c == BLOCKED:
-            return False
-        if c == STAIRS and not role_dict.get("can_use_stairs", True):
-            return False
-        avoid = role_dict.get("avoid_terrain", [])
-        if c == STAIRS and "stairs" in avoid:
-            return False
+        if self.grid[y][x] != value:
+            self.grid[y][x] = value
+            self.version += 1
+            for pclass, blocked in PASSABILITY_CLASSES.items():
+                self.masks[pclass][y][x] = value not in blocked
+            self._patch_cost(x, y)
         return True
 
     def occupy(self, x, y):
         if 0 <= x < self.w and 0 <= y < self.h:
             self.occupancy[y][x] += 1
+            self._patch_cost(x, y)
 
     def leave(self, x, y):
         if 0 <= x < self.w and 0 <= y < self.h and self.occupancy[y][x] > 0:
             self.occupancy[y][x] -= 1
+            self._patch_cost(x, y)
+
+    def _cost_node(self, x, y):
+        """(x, y) 在代價表中的位置（與 GridSearch(w, h).node(x, y) 相同）"""
+        return (x + 1) * (self.h + 2) + y + 1
+
+    def _cell_cost(self, x, y, pclass, use_crowd):
+        if not self.masks[pclass][y][x]:
+            return 0
+        return 1 + self.occupancy[y][x] if use_crowd else 1
+
+    def cost_grid(self, pclass, use_crowd=True):
+        """
+        A* 的進入代價表（含邊框、0 = 不可通行，格式同 GridSearch.padded）
+        每個 (pclass, use_crowd) 只在第一次呼叫時建立，之後 set_cell / occupy / leave 逐格更新；
+        回傳的串列原地更新，不要修改
+        """
+        key = (pclass, use_crowd)
+        cost = self.cost_grids.get(key)
+        if cost is None:
+            stride = self.h + 2
+            cost = [0] * stride
+            for x in range(self.w):
+                cost.append(0)
+                cost.extend(self._cell_cost(x, y, pclass, use_crowd) for y in range(self.h))
+                cost.append(0)
+            cost.extend([0] * stride)
+            self.cost_grids[key] = cost
+        return cost
+
+    def _patch_cost(self, x, y):
+        """(x, y) 的地形或人數改變：同步已建立的代價表"""
+        if self.cost_grids:
+            node = self._cost_node(x, y)
+            for (pclass, use_crowd), cost in self.cost_grids.items():
+                cost[node] = self._cell_cost(x, y, pclass, use_crowd)
 
     def is_crowded(self, x, y, threshold=0):
         return self.occupancy[y][x] > threshold
@@ -0,0 +1,250 @@
+# monte_carlo.py
+"""
+同一情境以不同種子跑很多次（replica），統計疏散時間、改路徑次數、擁擠等待次數的分布
+
+- 平行方式：replica 分到多個 process 執行（iter_replicas）。沒有跨 replica 向量化：
+  simulate() 每步逐一處理 Agent 物件、共用 random 模組的亂數，一次只能推進一場模擬，
+  沒有可以把多場疊成陣列一起算的部分
+- 種子就是 base_seed + i，統計在最後對全部結果做一次（describe），本身已經不是瓶頸
+"""
+import collections
+import contextlib
+import copy
+import csv
+import io
+import math
+import os
+import random
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+import simulate as simulate_module
+from map_system import PASSABLE
+from sim_clock import SimClock
+
+METRICS = ("evacuation_time", "path_changes", "congestion")
+PERCENTILES = (5, 25, 50, 75, 95)
+
+_roles_cache = {}
+
+
+def _load_roles(path):
+    """每個 worker process 只讀一次角色表"""
+    if path not in _roles_cache:
+        _roles_cache[path] = simulate_module.load_roles(path)
+    return _roles_cache[path]
+
+
+def random_agents(grid, spawn, area=None, exit_pos=None):
+    """
+    在可通行的空格上隨機放角色（用 random 模組，呼叫前先設好種子）
+
+    參數:
+    - spawn: [(角色名稱, 人數), ...]
+    - area: 只在 (x0, y0, x1, y1)（含邊界）範圍內放；None = 整張地圖
+    - exit_pos: 不放在出口上
+    """
+    x0, y0, x1, y1 = area if area is not None else (0, 0, len(grid[0]) - 1, len(grid) - 1)
+    cells = [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)
+             if grid[y][x] == PASSABLE and (x, y) != exit_pos]
+    total = sum(count for _, count in spawn)
+    if total > len(cells):
+        raise ValueError(f"空格只有 {len(cells)} 個，放不下 {total} 人")
+    picked = iter(random.sample(cells, total))
+    return [(name, *next(picked)) for name, count in spawn for _ in range(count)]
+
+
+def replica_metrics(log, exit_pos, agent_count):
+    """
+    從一場模擬的 log 算出：
+    - evacuation_time：最後一人走進出口的時間（模擬時鐘秒數）；沒全部疏散完為 None
+    - evacuated：走進出口的人數
+    - path_changes：Replan + Blocked 次數（兩者都會丟掉路徑重新規劃）
+    - congestion：Wait 次數
+    需要 leave_on_arrival=True，出口才會空出來讓下一個人進去
+    """
+    arrivals = [e["time"] for e in log
+                if e["action"] == "Step" and (e["x"], e["y"]) == tuple(exit_pos)]
+    actions = collections.Counter(e["action"] for e in log)
+    return {
+        "evacuation_time": max(arrivals) if len(arrivals) >= agent_count else None,
+        "evacuated": len(arrivals),
+        "path_changes": actions["Replan"] + actions["Blocked"],
+        "congestion": actions["Wait"],
+    }
+
+
+def run_replica(spec, seed, index=0):
+    """
+    以種子 seed 執行情境 spec 一次（在 worker process 裡呼叫），回傳 replica_metrics 加上 replica / seed
+
+    spec 與 scenario_runner.run_scenario 相同（除了 roles / roles_file 以外都當 simulate() 的參數），另外可以有：
+    - spawn / spawn_area：每次隨機放角色（見 random_agents），取代固定的 agents
+    一律用 SimClock、不寫 log 檔、不印過程
+    """
+    spec = copy.deepcopy(spec)
+    roles = spec.pop("roles", None)
+    roles_file = spec.pop("roles_file", "roles.json")
+    spawn = spec.pop("spawn", None)
+    area = spec.pop("spawn_area", None)
+    if roles is None:
+        roles = _load_roles(roles_file)
+    grid = spec["grid"]
+    exit_pos = spec.setdefault("exit_pos", (len(grid[0]) - 1, len(grid) - 1))
+    spec.setdefault("clock", SimClock(spec.get("sleep_s", 0.05)))
+    spec.setdefault("case_name", f"replica_{index}")
+    spec["write_log"] = False
+
+    random.seed(seed)
+    if spawn is not None:
+        spec["agents"] = random_agents(grid, spawn, area, tuple(exit_pos))
+    with contextlib.redirect_stdout(io.StringIO()):
+        log = simulate_module.simulate(roles, **spec)
+    return dict(replica_metrics(log, exit_pos, len(spec["agents"])), replica=index, seed=seed)
+
+
+def iter_replicas(spec, replicas, workers=None, base_seed=0, in_flight=None):
+    """
+    依 replica 順序逐一產生結果（第 i 個的種子為 base_seed + i，與 workers 數無關）
+    - workers=1：在目前的 process 裡直接跑
+    - 否則丟到 process pool，同時最多 in_flight（預設 workers × 2）個在跑；
+      呼叫端提早停止時，還沒開始的 replica 會被取消
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for i in range(replicas):
+            yield run_replica(spec, base_seed + i, i)
+        return
+
+    in_flight = in_flight or workers * 2
+    pool = ProcessPoolExecutor(max_workers=workers)
+    pending = collections.deque()
+    try:
+        submitted = 0
+        while submitted < replicas or pending:
+            while submitted < replicas and len(pending) < in_flight:
+                pending.append(pool.submit(run_replica, spec, base_seed + submitted, submitted))
+                submitted += 1
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def percentile(sorted_values, q):
+    """已排序資料的第 q 百分位數（線性內插）"""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def describe(values):
+    """平均、標準差、最小/最大與 PERCENTILES 各百分位數"""
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    result = {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "stdev": statistics.stdev(values) if len(values) > 1 else 0.0,
+        "min": values[0],
+        "max": values[-1],
+    }
+    for q in PERCENTILES:
+        result[f"p{q}"] = percentile(values, q)
+    return result
+
+
+class _RunningMean:
+    """Welford 線上平均/變異數，每多一筆 O(1)"""
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self._m2 += delta * (x - self.mean)
+
+    def half_width(self, z):
+        """平均值信賴區間的半寬（常態近似）"""
+        if self.n < 2:
+            return math.inf
+        return z * math.sqrt(self._m2 / (self.n - 1) / self.n)
+
+
+def monte_carlo(spec, replicas=1000, workers=None, base_seed=0, min_replicas=30,
+                confidence=0.95, rel_tol=0.02, csv_path=None, on_replica=None):
+    """
+    同一情境跑 replicas 次（每次不同種子），統計疏散時間、改路徑次數、擁擠等待次數的分布
+
+    參數:
+    - spec: 情境（見 run_replica）；建議 leave_on_arrival=True 並用 spawn 隨機放人
+    - min_replicas: 至少跑這麼多次才檢查是否收斂
+    - confidence / rel_tol: 疏散時間平均值的信賴區間半寬 <= rel_tol × 平均 就提早停止
+      （沒疏散完的 replica 以 steps × dt 計，也就是把上限當成它的疏散時間）；rel_tol=None 則跑滿
+    - csv_path: 每完成一個 replica 就附加一列到這個 CSV
+    - on_replica: 每完成一個 replica 呼叫 on_replica(結果)
+    回傳 {"replicas", "evacuated_all", "converged", "ci_half_width", "evacuation_time", "path_changes", "congestion"}，
+    後三者為 describe() 的結果（evacuation_time 只統計全部疏散完的 replica）
+    """
+    horizon = spec.get("steps", 120) * spec.get("sleep_s", 0.05)
+    z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+    running = _RunningMean()
+    results = []
+    converged = False
+
+    writer = None
+    with open(csv_path, "a", newline="", encoding="utf-8") if csv_path else contextlib.nullcontext() as f:
+        if f is not None:
+            writer = csv.DictWriter(f, fieldnames=["replica", "seed", "evacuated", *METRICS])
+            if f.tell() == 0:
+                writer.writeheader()
+
+        replica_iter = iter_replicas(spec, replicas, workers, base_seed)
+        try:
+            for r in replica_iter:
+                results.append(r)
+                if writer is not None:
+                    writer.writerow(r)
+                    f.flush()
+                if on_replica is not None:
+                    on_replica(r)
+
+                t = r["evacuation_time"]
+                running.add(horizon if t is None else t)
+                if (rel_tol is not None and running.n >= min_replicas
+                        and running.half_width(z) <= rel_tol * running.mean):
+                    converged = True
+                    break
+        finally:
+            replica_iter.close()
+
+    done = [r for r in results if r["evacuation_time"] is not None]
+    return {
+        "replicas": len(results),
+        "evacuated_all": len(done),
+        "converged": converged,
+        "ci_half_width": running.half_width(z),
+        "evacuation_time": describe([r["evacuation_time"] for r in done]),
+        "path_changes": describe([r["path_changes"] for r in results]),
+        "congestion": describe([r["congestion"] for r in results]),
+    }
+
+
+def print_summary(case_name, summary):
+    print(f"\n== {case_name}：{summary['replicas']} 次"
+          f"（全部疏散 {summary['evacuated_all']} 次，{'已收斂' if summary['converged'] else '未收斂'}）==")
+    print(f"{'指標':<16} | {'平均':>8} | " + " | ".join(f"{'p' + str(q):>7}" for q in PERCENTILES))
+    print("-" * 72)
+    for name in METRICS:
+        d = summary[name]
+        if not d["count"]:
+            print(f"{name:<16} | {'-':>8} |")
+            continue
+        print(f"{name:<16} | {d['mean']:>8.2f} | " + " | ".join(f"{d['p' + str(q)]:>7.2f}" for q in PERCENTILES))
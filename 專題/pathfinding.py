@@ -1,68 +1,110 @@
 # pathfinding.py
-import heapq
+from grid_search import GridSearch
+from jps import JumpTables, jps_search
+from map_system import PASSABILITY_CLASSES, passability_class
 
-def heuristic(a, b):
-    # Manhattan distance
-    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+# 與原本鄰居展開順序相同：(dx, dy)
+DIRS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
 
-def reconstruct(came_from, start, goal):
-    cur = goal
-    path = []
-    while cur != start:
-        path.append(cur)
-        cur = came_from.get(cur)
-        if cur is None:
-            return None
-    path.reverse()
-    return path
+# 依網格大小重複使用的搜尋緩衝區
+_searches = {}
 
-def astar_search(request):
-    grid = request["grid"]
-    occ = request["grid_occupancy"]
-    start = request["start"]
-    goal = request["goal"]
+def get_grid_search(w, h):
+    """節點以 (x, y) 編號（x 為第一維），編號順序與 (x, y) tuple 相同"""
+    search = _searches.get((w, h))
+    if search is None:
+        search = GridSearch(w, h)
+        _searches[(w, h)] = search
+    return search
 
-    open_list = []
-    heapq.heappush(open_list, (0, start))
-    came_from = {}
-    g = {start: 0}
+def build_cost_grid(request, search):
+    """
+    搜尋用的進入代價表（0 = 不可通行）
+    - 有 request["map_system"] 時直接用 MapSystem.cost_grid（逐格更新，不用每次重建）
+    - 否則每次重建：有 request["walkable"]（MapSystem.walkable_mask）時直接用；
+      沒有就依 stairs/avoid 規則從 grid 算
+    - use_crowd_cost 只在這裡判斷一次
+    """
+    use_crowd = request.get("use_crowd_cost", True)
+    map_system = request.get("map_system")
+    if map_system is not None:
+        return map_system.cost_grid(request_pclass(request), use_crowd)
 
-    while open_list:
-        _, current = heapq.heappop(open_list)
+    occ = request["grid_occupancy"]
+    mask = request.get("walkable")
+    if mask is None:
+        blocked = PASSABILITY_CLASSES[request_pclass(request)]
+        mask = [[c not in blocked for c in row] for row in request["grid"]]
 
-        if current == goal:
-            return reconstruct(came_from, start, goal)
+    columns = []
+    for col, occ_col in zip(zip(*mask), zip(*occ)):
+        if use_crowd:
+            columns.append([1 + o if ok else 0 for ok, o in zip(col, occ_col)])
+        else:
+            columns.append([1 if ok else 0 for ok in col])
+    return search.padded(columns)
 
-        x, y = current
-        for dx, dy in [(1,0),(-1,0),(0,1),(0,-1)]:
-            nx, ny = x + dx, y + dy
-            neighbor = (nx, ny)
+def request_pclass(request):
+    """路徑請求的通行類別（與 map_system.passability_class 相同的分類）"""
+    return passability_class({"can_use_stairs": request.get("can_use_stairs", True),
+                              "avoid_terrain": request.get("avoid", [])})
 
-            # bounds
-            if not (0 <= nx < len(grid[0]) and 0 <= ny < len(grid)):
-                continue
+def path_cache_key(request):
+    """
+    路徑快取的 key：(起點, 終點, 通行類別, 是否計擁擠代價, 演算法, 擁擠度 bucket)
+    - 地圖改變不放進 key，由呼叫端在 block/clear 時呼叫 PathCache.invalidate_cell / clear
+    - 擁擠度不放進 key：命中時看路線上目前的人數（見 astar_search）；
+      occupancy_bucket 可由呼叫端另外指定（例如每 N 個 step 一個 bucket），強制定期重新規劃
+    """
+    use_crowd = request.get("use_crowd_cost", True)
+    return (tuple(request["start"]), tuple(request["goal"]), request_pclass(request), use_crowd,
+            request.get("algorithm", "astar"), request.get("occupancy_bucket", 0) if use_crowd else 0)
 
-            cell = grid[ny][nx]
-            if cell == 1:  # BLOCKED
-                continue
+def astar_search(request):
+    """
+    request["algorithm"] = "jps" 且 use_crowd_cost=False（每步代價相同）時改用 Jump Point Search；
+    request["jump_tables"] 可傳入共用的 JumpTables（地圖改變時由呼叫端呼叫 cell_changed），
+    沒傳就每次搜尋臨時建立。有擁擠代價時 JPS 不適用，仍走一般 A*。
+    回傳的一定是最短路徑；代價相同的路徑不只一條時選哪一條見 GridSearch.search（與舊版逐格 A* 可能不同）。
+    request["path_cache"] 可傳入 PathCache：key 見 path_cache_key，回傳的路徑可能與其他人共用，不要修改。
+    有擁擠代價時，快取的路線上目前人數比規劃時多出超過 occupancy_tolerance（預設 1）人就重新搜尋。
+    """
+    cache = request.get("path_cache")
+    if cache is None:
+        return _search(request)
+    key = path_cache_key(request)
+    occupancy = request["grid_occupancy"] if request.get("use_crowd_cost", True) else None
+    if occupancy is None:
+        hit, path = cache.lookup(key)
+    else:
+        tolerance = request.get("occupancy_tolerance", 1)
+        hit, path = cache.lookup(key, lambda p, tag: route_occupancy(occupancy, p) <= tag + tolerance)
+    if not hit:
+        path = _search(request)
+        cache.put(key, path, route_occupancy(occupancy, path) if occupancy is not None else None)
+    return path
 
-            # stairs 限制（3 代表 STAIRS）
-            if cell == 3:
-                if not request.get("can_use_stairs", True):
-                    continue
-                if "stairs" in request.get("avoid", []):
-                    continue
+def route_occupancy(occupancy, path):
+    """路線上（不含起點）目前的總人數"""
+    return sum(occupancy[y][x] for x, y in path or ())
 
-            # 擁擠度成本：人越多越貴（至少 1）
-            use_crowd = request.get("use_crowd_cost", True)
-            step_cost = 1 + occ[ny][nx] if use_crowd else 1
+def _search(request):
+    grid = request["grid"]
+    start = request["start"]
+    goal = request["goal"]
 
-            new_g = g[current] + step_cost
+    if request.get("algorithm") == "jps" and not request.get("use_crowd_cost", True):
+        tables = request.get("jump_tables") or JumpTables(grid)
+        return jps_search(tables, request_pclass(request), start, goal)
 
-            if neighbor not in g or new_g < g[neighbor]:
-                g[neighbor] = new_g
-                priority = new_g + heuristic(neighbor, goal)
-                heapq.heappush(open_list, (priority, neighbor))
-                came_from[neighbor] = current
+    w, h = len(grid[0]), len(grid)
+    search = get_grid_search(w, h)
+    if not (search.in_bounds(*start) and search.in_bounds(*goal)):
+        return None
 
-    return None
\ No newline at end of file
+    cost = build_cost_grid(request, search)
+    ids = search.search(cost, search.node(*start), search.node(*goal), search.offsets(DIRS))
+    if ids is None:
+        return None
+    # 與原本相同：不含起點
+    return [search.cell(n) for n in ids[1:]]
@@ -0,0 +1,151 @@
+# scenario_runner.py
+import argparse
+import contextlib
+import copy
+import glob
+import inspect
+import io
+import os
+import random
+import runpy
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import simulate as simulate_module
+from analyze_log import analyze_events, print_table, write_csv
+from sim_clock import SimClock
+
+
+def summarize(log, exit_pos=None, elapsed=None):
+    """用 analyze_log.analyze_events 統計一場模擬（轉成一般 dict，才能在 process 之間傳遞）"""
+    stats = analyze_events(log, exit_pos=exit_pos)
+    return {"elapsed": elapsed, "stats": {name: dict(s) for name, s in stats.items()}}
+
+
+def run_scenario(spec):
+    """
+    執行一個情境（在 worker process 裡呼叫），回傳 (case_name, 摘要)
+
+    spec 為 dict，除了下列鍵以外都直接當 simulate() 的參數（case_name、agents、grid、events、steps...）：
+    - roles：角色表；沒給就讀 roles_file（預設 roles.json）
+    - seed：random 的種子（隨機走步用）；None 表示不設定
+    - realtime：True 時照實際時間播放；預設用 SimClock(sleep_s) 快轉
+    - quiet：預設 True，不印 simulate 的過程輸出
+    """
+    spec = copy.deepcopy(spec)   # grid / events / roles 都用自己的複本
+    roles = spec.pop("roles", None)
+    roles_file = spec.pop("roles_file", "roles.json")
+    seed = spec.pop("seed", None)
+    realtime = spec.pop("realtime", False)
+    quiet = spec.pop("quiet", True)
+    if roles is None:
+        roles = simulate_module.load_roles(roles_file)
+    if not realtime:
+        spec.setdefault("clock", SimClock(spec.get("sleep_s", 0.05)))
+    case_name = spec.setdefault("case_name", "default_case")
+
+    random.seed(seed)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        log = simulate_module.simulate(roles, **spec)
+    return case_name, summarize(log, spec.get("exit_pos"), time.perf_counter() - start)
+
+
+def run_scenarios(specs, workers=None, base_seed=0):
+    """
+    在 process pool 上平行執行多個情境，回傳 {case_name: 摘要}（依 specs 的順序）
+
+    參數:
+    - specs: run_scenario 的 spec 串列；case_name 不可重複（log 檔名以它區分）
+    - workers: process 數（None = CPU 數）
+    - base_seed: 沒指定 seed 的情境用 base_seed + 索引
+    """
+    specs = [dict(spec, seed=spec.get("seed", base_seed + i)) for i, spec in enumerate(specs)]
+    names = [spec.get("case_name", "default_case") for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("情境的 case_name 重複，log 檔會互相覆蓋")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return dict(pool.map(run_scenario, specs))
+
+
+def run_script(path, seed=0, realtime=False):
+    """
+    執行一個 test_case* / test_scene* 腳本（在 worker process 裡呼叫），
+    回傳腳本中每次 simulate() 的 [(case_name, 摘要), ...]
+    """
+    results = []
+    original = simulate_module.simulate
+    signature = inspect.signature(original)
+
+    def recording(*args, **kwargs):
+        # 依 simulate 的參數表對應，腳本用位置參數傳 case_name / exit_pos / sleep_s 也讀得到
+        bound = signature.bind(*args, **kwargs)
+        arguments = bound.arguments
+        if not realtime and arguments.get("clock") is None:
+            arguments["clock"] = SimClock(arguments.get("sleep_s", 0.05))
+        start = time.perf_counter()
+        log = original(*bound.args, **bound.kwargs)
+        results.append((arguments.get("case_name", "default_case"),
+                        summarize(log, arguments.get("exit_pos"), time.perf_counter() - start)))
+        return log
+
+    # 腳本執行 from simulate import simulate 時拿到的是 recording
+    simulate_module.simulate = recording
+    random.seed(seed)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(path, run_name="__main__")
+    finally:
+        simulate_module.simulate = original
+    return results
+
+
+def run_scripts(paths, workers=None, base_seed=0, realtime=False):
+    """
+    平行執行多個腳本（每個腳本一個 task），回傳 {腳本路徑: [(case_name, 摘要), ...]}；
+    執行失敗的腳本對應到它丟出的例外，不影響其他腳本
+    """
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {path: pool.submit(run_script, path, base_seed + i, realtime)
+                   for i, path in enumerate(paths)}
+        results = {}
+        for path, future in futures.items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                results[path] = e
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="平行執行 test_case* / test_scene* 情境並彙整統計")
+    parser.add_argument("scripts", nargs="*", help="要執行的腳本（預設為全部 test_case*.py 與 test_scene*.py）")
+    parser.add_argument("--workers", type=int, default=None, help="process 數（預設為 CPU 數）")
+    parser.add_argument("--seed", type=int, default=0, help="第 i 個腳本的亂數種子為 seed + i")
+    parser.add_argument("--realtime", action="store_true", help="照實際時間播放（預設用模擬時鐘快轉）")
+    parser.add_argument("--csv", default=None, help="把統計附加寫入這個 CSV（格式同 analyze_log）")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))   # 腳本以相對路徑讀 roles.json、寫 logs/
+    scripts = args.scripts or sorted(glob.glob("test_case*.py") + glob.glob("test_scene*.py"))
+
+    start = time.perf_counter()
+    results = run_scripts(scripts, args.workers, args.seed, args.realtime)
+    total = time.perf_counter() - start
+
+    for path, cases in results.items():
+        if isinstance(cases, Exception):
+            print(f"\n❌ {path} 執行失敗：{cases!r}")
+            continue
+        for case_name, summary in cases:
+            print_table(case_name, summary["stats"])
+            print(f"（{path}，{summary['elapsed']:.2f} 秒）")
+            if args.csv:
+                write_csv(args.csv, case_name, summary["stats"])
+    slowest = max((s["elapsed"] for cases in results.values() if not isinstance(cases, Exception)
+                   for _, s in cases), default=0.0)
+    print(f"\n✅ {len(scripts)} 個腳本完成，總耗時 {total:.2f} 秒（最慢的一場 {slowest:.2f} 秒）")
+
+
+if __name__ == "__main__":
+    main()
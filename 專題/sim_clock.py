@@ -0,0 +1,37 @@
+# sim_clock.py
+import time
+
+
+class SimClock:
+    """
+    模擬時鐘（無頭快轉）
+    - 時間只在 tick() 時前進 dt 秒，與電腦快慢無關：同樣的輸入每次都得到同樣的結果
+    - now() 從 0 開始；以 tick 次數 × dt 計算，不會累積浮點誤差
+    """
+
+    def __init__(self, dt=0.05):
+        self.dt = dt
+        self.ticks = 0
+
+    def now(self):
+        return self.ticks * self.dt
+
+    def tick(self):
+        self.ticks += 1
+
+
+class RealTimeClock:
+    """
+    實際時間時鐘（demo 用，即時播放）
+    - now() 讀牆上時間（time.time()）
+    - tick() 睡 dt 秒，控制每個 step 的節奏
+    """
+
+    def __init__(self, dt=0.05):
+        self.dt = dt
+
+    def now(self):
+        return time.time()
+
+    def tick(self):
+        time.sleep(self.dt)
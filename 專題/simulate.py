@@ -1,12 +1,18 @@
+import heapq
 import json
-import time
 import os
 
 from agent import Agent
-from map_system import MapSystem
+from flow_field import FlowField
+from map_system import MapSystem, BLOCKED, PASSABLE, compile_roles
 from path_interface import agent_to_path_request, apply_path_to_agent
 from pathfinding import astar_search
+from jps import JumpTables
+from cooperative import CooperativePlanner
+from path_cache import PathCache
 from fsm import State
+from sim_clock import RealTimeClock
+from event_scheduler import EventScheduler
 
 
 def load_roles(filepath="roles.json"):
@@ -18,7 +24,7 @@ def load_roles(filepath="roles.json"):
         for field in required_fields:
             if field not in info:
                 raise ValueError(f"角色 {name} 缺少欄位：{field}")
-    return roles
+    return compile_roles(roles)
 
 
 def simulate(
@@ -31,7 +37,17 @@ def simulate(
     events=None,            # ✅ W18：事件表（全域+環境事件）
     stuck_replan=10,        # ✅ W17：連續 Wait 幾次就 replan
     sleep_s=0.05,
-    end_when_all_arrived=True
+    end_when_all_arrived=True,
+    planner="astar",        # "astar"：每人各自 A*；"flow_field"：共用出口距離場；"jps"：每人各自 JPS；
+                            # "cooperative"：共用時空預約表（WHCA*）
+    path_cache_size=256,    # 路徑快取上限（0 = 不快取）
+    occupancy_bucket_steps=None,  # 路徑快取每幾個 step 強制失效一次（None = 只看路線上人數的變化）
+    occupancy_tolerance=1,  # 快取的路線上人數比規劃時多出超過這個數就重新搜尋
+    cooperative_window=8,   # cooperative 模式協調的步數
+    leave_on_arrival=False, # 到出口後離開地圖（不再佔住出口格）
+    clock=None,             # 模擬時鐘（sim_clock.py）；None = RealTimeClock(sleep_s)
+    write_log=True,         # False：不寫 logs/ 檔案，只回傳 log（大量重複執行時用）
+    activation="every_step" # "every_step"：每步處理每個人；"event"：只處理被叫醒的人
 ):
     """
     事件驅動整合版（W18）+ 動態重新規劃（W17）
@@ -41,7 +57,37 @@ def simulate(
         1) 下一步路徑格變 BLOCKED/不可走
         2) 連續 Wait 太久
         3) try_move 失敗(視為 obstacle)
+    - planner="flow_field"：每個通行類別只在地圖改變時從出口反向 BFS 一次，
+      角色每步沿距離場下降，不再各自跑 A*
+    - planner="jps"：不計擁擠代價（每步代價相同），用 Jump Point Search 規劃；
+      跳點表在整場模擬共用，block/clear 時只讓受影響的列失效
+    - 路徑快取：同角色類別、同起點、同出口、同擁擠度 bucket 的請求共用結果；
+      block 只丟掉經過該格的路徑，clear 全部丟掉
+    - planner="cooperative"：角色依離出口遠近依序規劃，在時空預約表上避開別人未來
+      cooperative_window 步的位置（見 cooperative.py），瓶頸處排隊前進，不再 Wait/Replan 空轉；
+      照預約原地等待記為 Wait，但不累計 stuck_count
+    - leave_on_arrival=True：到出口的人離開地圖，後面的人才能進出口格（計算疏散人數時用）
+    - clock：reaction_time / move_delay 與 log 的時間戳記都用這個時鐘，每個 step 結束時 tick() 一次。
+      預設 RealTimeClock 照實際時間播放（每步睡 sleep_s 秒）；傳 SimClock(dt) 則每步只把模擬時間
+      往前推 dt 秒、不睡，無頭執行時能全速跑完，結果也不受電腦快慢影響
+    - 回傳 log（與寫進 logs/simulation_log_<case_name>.json 的內容相同）；傳入的 grid 不會被修改。
+      write_log=False 時不寫檔（Monte Carlo 一次跑上千場時用，見 monte_carlo.py）
+    - activation="event"：沒事做的人不處理，每步的成本只跟「醒著的人」有關
+        * 到出口的人記一次 Arrived 後就不再處理（不會每步重複記 Arrived）
+        * IDLE 的人睡到警報；WAIT 的人依 reaction_time 排進時間 heap，時間到才叫醒
+        * flow_field：照距離場走、目標格有人而 Wait 的人睡到上下左右有人進出、地圖改變，或是連續 Wait 達
+          stuck_replan 次的那一步（睡著時略過的重試照樣累計 stuck_count）；astar / jps 每次重試
+          都沿路徑往下一格試，不算沒事做，照常每步處理
+        * 睡著的步數不會記 Wait；這一步還沒輪到的人當步叫醒，已經輪過的下一步才處理
+        * 不能與 cooperative 一起用（cooperative 每步都要幫停著的人延長預約）
     """
+    if planner not in ("astar", "flow_field", "jps", "cooperative"):
+        raise ValueError(f"未知的 planner：{planner}")
+    if activation not in ("every_step", "event"):
+        raise ValueError(f"未知的 activation：{activation}")
+    if activation == "event" and planner == "cooperative":
+        raise ValueError("activation=\"event\" 不能與 cooperative 一起使用")
+    roles = compile_roles(roles)
 
     # ---------- default grid ----------
     if grid is None:
@@ -51,7 +97,10 @@ def simulate(
             [0, 0, 0]
         ]
 
+    grid = [row[:] for row in grid]   # block/clear 事件改的是這份複本，呼叫者傳入的 grid 不變
     map_system = MapSystem(grid)
+    if clock is None:
+        clock = RealTimeClock(sleep_s)
 
     # ---------- default exit ----------
     if exit_pos is None:
@@ -61,6 +110,13 @@ def simulate(
     if agents is None:
         agents = [("一般人", 0, 0)]
 
+    flow = FlowField(map_system, exit_pos) if planner == "flow_field" else None
+    jump_tables = JumpTables(grid) if planner == "jps" else None
+    path_cache = PathCache(path_cache_size)
+    coop = (CooperativePlanner(map_system, exit_pos, cooperative_window,
+                               stay_at_goal=not leave_on_arrival)
+            if planner == "cooperative" else None)
+
     # ---------- default events (W18) ----------
     # 你可以在外部傳入 events；不傳就用預設 demo
     if events is None:
@@ -70,29 +126,152 @@ def simulate(
             # {"t": 80, "type": "clear", "data": {"cell": (2, 1)}}, # 解除封路（可選）
         ]
 
+    # 事件依 t 排進 heap，每步只取出到期的事件（不再每步掃過整張事件表）
+    scheduler = EventScheduler()
+    for e in events:
+        if e.get("t") is not None:
+            scheduler.schedule(e["t"], e.get("type"), e)
+
     # ---------- init agents ----------
     agent_objs = []
     for name, x, y in agents:
         if name not in roles:
             raise KeyError(f"roles.json 找不到角色：{name}")
 
-        a = Agent(name, roles[name], x, y)
+        a = Agent(name, roles[name], x, y, clock)
         a.stuck_count = 0
         a.path = None
         a.path_index = 0
+        a.left = False
+        a.index = len(agent_objs)   # 處理順序（activation="event" 依此排序醒著的人）
+        a.sleep = None              # 睡著的原因："idle" / "reaction" / "blocked" / "arrived"
+        a.sleep_id = 0              # 每睡一次 +1，heap 裡過期的叫醒紀錄靠它分辨
+        a.watching = ()
 
         agent_objs.append(a)
         map_system.occupy(x, y)
 
     log = []
 
+    # ---------- activation="event"：醒著的人、叫醒條件 ----------
+    event_driven = activation == "event"
+    awake = set(range(len(agent_objs)))
+    sleepers = {"idle": set(), "blocked": set()}   # 等警報 / 等周圍有變化的人
+    watchers = {}             # 格子 -> 在等這格有人進出的人
+    wake_next = set()         # 周圍有變化、但這一步已經輪過，下一步才叫醒的人
+    queue = []                # 這一步還沒輪到的醒著的人（heap，依 index）
+    current = -1              # 正在處理的人的 index
+    reaction_timers = EventScheduler()   # 時鐘時間 -> 反應時間到的人
+    stuck_deadlines = EventScheduler()   # step -> 連續 Wait 會達到 stuck_replan 的人
+    at_exit = sum((ag.x, ag.y) == exit_pos for ag in agent_objs)
+    visits = 0                # 實際處理的人次
+    steps_run = 0
+
+    def sleep(a, reason, cells=()):
+        awake.discard(a.index)
+        a.sleep = reason
+        a.sleep_id += 1
+        a.slept_at = step
+        a.watching = cells
+        for cell in cells:
+            watchers.setdefault(cell, set()).add(a.index)
+        if reason in sleepers:
+            sleepers[reason].add(a.index)
+
+    def wake(i, sleep_id=None):
+        """叫醒第 i 個人，回傳是否真的叫醒（醒著、已抵達、叫醒紀錄過期都不算）"""
+        a = agent_objs[i]
+        if a.sleep in (None, "arrived") or (sleep_id is not None and sleep_id != a.sleep_id):
+            return False
+        if a.sleep == "blocked":
+            # 睡著時略過的每一步都視為一次 Wait（叫醒這一步的重試不算）
+            a.stuck_count += step - a.slept_at - 1
+            if stuck_replan is not None:
+                a.stuck_count = min(a.stuck_count, stuck_replan - 1)
+        for cell in a.watching:
+            group = watchers[cell]
+            group.discard(i)
+            if not group:
+                del watchers[cell]
+        sleepers.get(a.sleep, set()).discard(i)
+        a.sleep = None
+        a.watching = ()
+        awake.add(i)
+        return True
+
+    def touched(x, y):
+        """
+        (x, y) 有人進出：在等這格的人，這一步還沒輪到的當步就叫醒（與每步處理每個人時一樣，
+        排在後面的人能馬上跟進空出來的格子），已經輪過的下一步叫醒
+        """
+        for i in list(watchers.get((x, y), ())):
+            if i > current:
+                if wake(i):
+                    heapq.heappush(queue, i)
+            else:
+                wake_next.add(i)
+
+    def awake_in_order():
+        """依 index 逐一取出這一步醒著的人（處理中被叫醒的人也會插進來）"""
+        nonlocal current, visits
+        queue[:] = sorted(awake)
+        while queue:
+            current = heapq.heappop(queue)
+            visits += 1
+            yield agent_objs[current]
+        current = -1
+
+    def sleep_blocked(a):
+        """目標格有人：睡到周圍有變化，最晚睡到連續 Wait 達 stuck_replan 次的那一步"""
+        cells = [(a.x + dx, a.y + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))]
+        sleep(a, "blocked", cells)
+        if stuck_replan is not None:
+            stuck_deadlines.schedule(step + stuck_replan - a.stuck_count, None, (a.index, a.sleep_id))
+
+    def wait_occupied(a):
+        """目標格有人 → Wait（連續 Wait 過久 → Replan）"""
+        a.fsm.update(None, crowd_density=1.0)
+        a.stuck_count += 1
+        log.append(a.snapshot("Wait"))
+        if coop is not None:
+            coop.drop(a)   # 計畫與實際位置對不上了，下一步重新規劃
+
+        # --- W17：連續 Wait 過久 → Replan ---
+        if stuck_replan is not None and a.stuck_count >= stuck_replan:
+            a.path = None
+            a.path_index = 0
+            a.stuck_count = 0
+            log.append(a.snapshot("Replan"))
+
+    def move(a, nx, ny, crowd_density):
+        """嘗試移動：失敗 → obstacle → Replan"""
+        nonlocal at_exit
+        ox, oy = a.x, a.y
+        ok = a.try_move(nx, ny, map_system)
+        if not ok:
+            a.fsm.update("obstacle", crowd_density=crowd_density)
+            a.path = None
+            a.path_index = 0
+            a.stuck_count = 0
+            if coop is not None:
+                coop.drop(a)
+            log.append(a.snapshot("Blocked"))
+        else:
+            a.stuck_count = 0
+            a.fsm.update("clear", crowd_density=crowd_density)
+            log.append(a.snapshot("Step"))
+            if event_driven:
+                touched(ox, oy)
+                touched(nx, ny)
+                at_exit += (nx, ny) == exit_pos
+
     # ==============================
     # main simulation loop
     # ==============================
     for step in range(steps):
 
-        # 取出本 step 的事件
-        step_events = [e for e in events if e.get("t") == step]
+        # 取出本 step 的事件（t 不是整數步的事件不會剛好等於 step，與逐一比對時相同，直接丟掉）
+        step_events = [e for _, _, e in scheduler.pop_due(step) if e["t"] == step]
 
         # ------------------------------
         # 2-1 全域事件（給 FSM）
@@ -102,7 +281,7 @@ def simulate(
             if e.get("type") in ("alarm", "quake"):
                 global_event = "alarm"   # FSM 用 alarm 足夠
                 log.append({
-                    "time": time.time(),
+                    "time": clock.now(),
                     "name": "SYSTEM",
                     "x": None, "y": None,
                     "state": "EVENT",
@@ -112,15 +291,19 @@ def simulate(
         # ------------------------------
         # 2-2 環境事件（改地圖）
         # ------------------------------
+        map_changed = False
         for e in step_events:
             etype = e.get("type")
             if etype == "block":
                 x, y = e["data"]["cell"]
-                if 0 <= y < len(grid) and 0 <= x < len(grid[0]):
-                    grid[y][x] = 1  # 1 = BLOCKED
+                if map_system.set_cell(x, y, BLOCKED):
+                    map_changed = True
+                    if jump_tables is not None:
+                        jump_tables.cell_changed(x, y)
+                    path_cache.invalidate_cell((x, y))
                     print(f"🚧 Blocked at step={step}: ({x},{y})")
                     log.append({
-                        "time": time.time(),
+                        "time": clock.now(),
                         "name": "SYSTEM",
                         "x": x, "y": y,
                         "state": "EVENT",
@@ -128,11 +311,14 @@ def simulate(
                     })
             elif etype == "clear":
                 x, y = e["data"]["cell"]
-                if 0 <= y < len(grid) and 0 <= x < len(grid[0]):
-                    grid[y][x] = 0
+                if map_system.set_cell(x, y, PASSABLE):
+                    map_changed = True
+                    if jump_tables is not None:
+                        jump_tables.cell_changed(x, y)
+                    path_cache.clear()
                     print(f"✅ Cleared at step={step}: ({x},{y})")
                     log.append({
-                        "time": time.time(),
+                        "time": clock.now(),
                         "name": "SYSTEM",
                         "x": x, "y": y,
                         "state": "EVENT",
@@ -147,12 +333,47 @@ def simulate(
         # ------------------------------
         # agent loop
         # ------------------------------
-        for a in agent_objs:
+        order = agent_objs
+        pending = []   # cooperative：等目標格的人先走開的移動 (agent, nx, ny, crowd_density)
+        if coop is not None:
+            coop.begin_step(step, [ag for ag in agent_objs if not ag.left])
+            order = coop.order(agent_objs)   # 離出口近的先走
+        elif event_driven:
+            # 叫醒：上一步周圍有變化的、反應時間到的、連續 Wait 到期的；警報叫醒 IDLE，地圖改變叫醒等路的
+            woken = list(wake_next)
+            wake_next.clear()
+            woken += [i for _, _, (i, _) in reaction_timers.pop_due(clock.now())]
+            if global_event is not None:
+                woken += sleepers["idle"]
+            if map_changed:
+                woken += sleepers["blocked"]
+            for i in woken:
+                wake(i)
+            for _, _, (i, sleep_id) in stuck_deadlines.pop_due(step):
+                wake(i, sleep_id)
+            order = awake_in_order()
+        else:
+            visits += len(order)
+        steps_run += 1
+
+        for a in order:
 
             # 已到出口
             if (a.x, a.y) == exit_pos:
                 a.fsm.update("arrived", crowd_density=0.0)
+                if leave_on_arrival and not a.left:
+                    map_system.leave(a.x, a.y)
+                    a.left = True
+                    if event_driven:
+                        touched(a.x, a.y)
+                if coop is not None:
+                    if a.left:
+                        coop.drop(a)
+                    else:
+                        coop.hold(a, a.x, a.y, step)
                 log.append(a.snapshot("Arrived"))
+                if event_driven:
+                    sleep(a, "arrived")   # 不會再被叫醒
                 continue
 
             # 擁擠度（先用本格 occupancy 當 proxy）
@@ -163,42 +384,83 @@ def simulate(
 
             # WAIT/IDLE：不移動
             if a.fsm.state in (State.IDLE, State.WAIT):
+                if coop is not None:
+                    coop.hold(a, a.x, a.y, step)
                 log.append(a.snapshot("Wait"))
+                if event_driven:
+                    if a.fsm.state == State.IDLE:
+                        sleep(a, "idle")
+                    else:
+                        sleep(a, "reaction")
+                        reaction_timers.schedule(a.fsm.start_reaction_time + a.reaction_time, None,
+                                                 (a.index, a.sleep_id))
                 continue
 
             # AVOID：強制清路徑，下一段會重規劃
             if a.fsm.state == State.AVOID:
                 a.path = None
                 a.path_index = 0
-
-            # 需要路徑就規劃
-            if a.path is None or a.path_index >= len(a.path):
-                req = agent_to_path_request(
-                    agent=a,
-                    grid=grid,
-                    grid_occupancy=map_system.occupancy,
-                    goal=exit_pos
-                )
-                path = astar_search(req)
-                apply_path_to_agent(a, path if path else None)
-
-            # 決定下一步（路徑 or 隨機）
-            if a.path is None or a.path_index >= len(a.path):
-                nx, ny = a.choose_random_step()
-            else:
-                tx, ty = a.path[a.path_index]
-
-                # --- W17：路徑失效偵測 → Replan ---
-                # 1) 這格被封了  2) 或角色不可走（stairs/avoid 等）
-                if grid[ty][tx] == 1 or (not map_system.is_walkable(tx, ty, a.role)):
-                    a.path = None
-                    a.path_index = 0
-                    a.stuck_count = 0
-                    log.append(a.snapshot("Replan"))
+                if coop is not None:
+                    coop.drop(a)
+
+            # cooperative：照時空預約表的計畫走（計畫用完或失效時才重新規劃）
+            flow_step = False   # 這一步是照距離場走的（隨機亂走的不算）
+            if coop is not None:
+                nxt = coop.next_cell(a, a.x, a.y, a.pclass, step)
+                if nxt is None:
+                    nx, ny = a.choose_random_step()
+                elif nxt == (a.x, a.y):
+                    log.append(a.snapshot("Wait"))
                     continue
-
-                nx, ny = tx, ty
-                a.path_index += 1
+                else:
+                    nx, ny = nxt
+            # flow field：直接沿距離場走下一格（O(1)，不需要路徑）
+            elif flow is not None:
+                nxt = flow.next_step(a.x, a.y, a.role, map_system.occupancy)
+                if nxt is None:
+                    nx, ny = a.choose_random_step()
+                else:
+                    nx, ny = nxt
+                    flow_step = True
+            else:
+                # 需要路徑就規劃
+                if a.path is None or a.path_index >= len(a.path):
+                    req = agent_to_path_request(
+                        agent=a,
+                        grid=grid,
+                        grid_occupancy=map_system.occupancy,
+                        goal=exit_pos
+                    )
+                    if jump_tables is not None:
+                        req["use_crowd_cost"] = False
+                        req["algorithm"] = "jps"
+                        req["jump_tables"] = jump_tables
+                    req["walkable"] = map_system.walkable_mask(a.pclass)
+                    req["map_system"] = map_system   # 代價表隨地圖 / 佔用逐格更新，不用每次重建
+                    req["path_cache"] = path_cache
+                    req["occupancy_tolerance"] = occupancy_tolerance
+                    if occupancy_bucket_steps:
+                        req["occupancy_bucket"] = step // occupancy_bucket_steps
+                    path = astar_search(req)
+                    apply_path_to_agent(a, path if path else None)
+
+                # 決定下一步（路徑 or 隨機）
+                if a.path is None or a.path_index >= len(a.path):
+                    nx, ny = a.choose_random_step()
+                else:
+                    tx, ty = a.path[a.path_index]
+
+                    # --- W17：路徑失效偵測 → Replan ---
+                    # 1) 這格被封了  2) 或角色不可走（stairs/avoid 等）
+                    if not map_system.walkable(tx, ty, a.pclass):
+                        a.path = None
+                        a.path_index = 0
+                        a.stuck_count = 0
+                        log.append(a.snapshot("Replan"))
+                        continue
+
+                    nx, ny = tx, ty
+                    a.path_index += 1
 
             # 邊界
             if not (0 <= nx < len(grid[0]) and 0 <= ny < len(grid)):
@@ -207,42 +469,51 @@ def simulate(
 
             # 目標格有人 → Wait（可觸發 Replan）
             if map_system.occupancy[ny][nx] > 0:
-                a.fsm.update(None, crowd_density=1.0)
-                a.stuck_count += 1
-                log.append(a.snapshot("Wait"))
-
-                # --- W17：連續 Wait 過久 → Replan ---
-                if stuck_replan is not None and a.stuck_count >= stuck_replan:
-                    a.path = None
-                    a.path_index = 0
-                    a.stuck_count = 0
-                    log.append(a.snapshot("Replan"))
+                if coop is not None and coop.leaving(nx, ny, step):
+                    pending.append((a, nx, ny, crowd_density))   # 那個人這一步會走開，等他先動
+                else:
+                    wait_occupied(a)
+                    if event_driven and flow_step and a.stuck_count > 0:
+                        sleep_blocked(a)   # 隨機亂走被擋的人下一步要重抽方向，不能睡
                 continue
 
-            # 嘗試移動：失敗 → obstacle → Replan
-            ok = a.try_move(nx, ny, map_system)
-            if not ok:
-                a.fsm.update("obstacle", crowd_density=crowd_density)
-                a.path = None
-                a.path_index = 0
-                a.stuck_count = 0
-                log.append(a.snapshot("Blocked"))
-            else:
-                a.stuck_count = 0
-                a.fsm.update("clear", crowd_density=crowd_density)
-                log.append(a.snapshot("Step"))
+            move(a, nx, ny, crowd_density)
+
+        # cooperative：目標格空出來就補上移動，一直沒空出來才算 Wait
+        while pending:
+            ready = next((p for p in pending if map_system.occupancy[p[2]][p[1]] == 0), None)
+            if ready is None:
+                break
+            pending.remove(ready)
+            move(*ready)
+        for a, *_ in pending:
+            wait_occupied(a)
 
         # 全員抵達就提前結束（demo 很好看）
-        if end_when_all_arrived and all((ag.x, ag.y) == exit_pos for ag in agent_objs):
+        if end_when_all_arrived and (at_exit == len(agent_objs) if event_driven
+                                     else all((ag.x, ag.y) == exit_pos for ag in agent_objs)):
             print("🏁 All agents arrived. End simulation.")
             break
 
-        time.sleep(sleep_s)
+        clock.tick()
 
     # output log
-    os.makedirs("logs", exist_ok=True)
-    output_path = f"logs/simulation_log_{case_name}.json"
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(log, f, ensure_ascii=False, indent=2)
-
-    print(f"✅ 模擬完成，輸出：{output_path}")
\ No newline at end of file
+    if write_log:
+        os.makedirs("logs", exist_ok=True)
+        output_path = f"logs/simulation_log_{case_name}.json"
+        with open(output_path, "w", encoding="utf-8") as f:
+            json.dump(log, f, ensure_ascii=False, indent=2)
+
+        print(f"✅ 模擬完成，輸出：{output_path}")
+    else:
+        print(f"✅ 模擬完成：{case_name}")
+    if path_cache.hits or path_cache.misses:
+        stats = path_cache.stats()
+        print(f"📦 路徑快取：命中 {stats['hits']} / 未命中 {stats['misses']}"
+              f"（命中率 {stats['hit_rate']:.0%}）")
+    if coop is not None:
+        arrived = sum((ag.x, ag.y) == exit_pos for ag in agent_objs)
+        print(f"🤝 cooperative：時空搜尋 {coop.searches} 次，抵達 {arrived}/{len(agent_objs)} 人")
+    if event_driven:
+        print(f"🔔 activation：共處理 {visits} 人次（每步每人都處理為 {len(agent_objs) * steps_run} 人次）")
+    return log
\ No newline at end of file
@@ -0,0 +1,138 @@
+# spatial_index.py
+import heapq
+
+
+class SpatialHash:
+    """
+    角色位置的均勻格網索引（spatial hash）
+    - 地圖切成 cell_size x cell_size 的桶，每個桶依角色 type 分開記錄裡面的角色
+    - insert / remove / update：O(1)；角色移動時（Agent.try_move / move_toward）自動 update
+    - nearest：從所在桶一圈一圈往外找，已找到的第 k 近比下一圈可能的最近距離還近就停
+    - within：只看半徑涵蓋的桶
+    - 距離用曼哈頓距離（與 Agent.distance_to 相同）；距離相同時先加入索引的排前面
+    """
+
+    def __init__(self, cell_size=4):
+        self.cell_size = cell_size
+        self.buckets = {}   # (bx, by) -> {type: {agent: None}}（dict 保持加入順序）
+        self.where = {}     # agent -> (bx, by)
+        self.order = {}     # agent -> 加入序號（距離相同時的排序）
+        self.counts = {}    # type -> 人數
+        self.bounds = None  # 用過的桶範圍 (min_bx, min_by, max_bx, max_by)，nearest 找到這裡為止
+        self._next = 0
+
+    def __len__(self):
+        return len(self.where)
+
+    def _bucket_of(self, x, y):
+        return x // self.cell_size, y // self.cell_size
+
+    def _add(self, agent, key):
+        self.buckets.setdefault(key, {}).setdefault(agent.type, {})[agent] = None
+        self.where[agent] = key
+        bx, by = key
+        if self.bounds is None:
+            self.bounds = (bx, by, bx, by)
+        else:
+            x0, y0, x1, y1 = self.bounds
+            self.bounds = (min(x0, bx), min(y0, by), max(x1, bx), max(y1, by))
+
+    def _discard(self, agent, key):
+        bucket = self.buckets[key]
+        group = bucket[agent.type]
+        del group[agent]
+        if not group:
+            del bucket[agent.type]
+            if not bucket:
+                del self.buckets[key]
+
+    def insert(self, agent):
+        """加入角色；之後 agent 移動時會自己呼叫 update"""
+        if agent in self.where:
+            return
+        self._add(agent, self._bucket_of(agent.x, agent.y))
+        self.order[agent] = self._next
+        self._next += 1
+        self.counts[agent.type] = self.counts.get(agent.type, 0) + 1
+        agent.spatial_index = self
+
+    def remove(self, agent):
+        key = self.where.pop(agent, None)
+        if key is None:
+            return
+        self._discard(agent, key)
+        del self.order[agent]
+        self.counts[agent.type] -= 1
+        agent.spatial_index = None
+
+    def update(self, agent):
+        """agent.x / agent.y 改變後呼叫；還在同一個桶就不用動"""
+        key = self._bucket_of(agent.x, agent.y)
+        old = self.where[agent]
+        if key != old:
+            self._discard(agent, old)
+            self._add(agent, key)
+
+    def _members(self, key, agent_type):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return ()
+        if agent_type is not None:
+            return bucket.get(agent_type, ())
+        return [a for group in bucket.values() for a in group]
+
+    def nearest(self, x, y, k=1, agent_type=None, exclude=None):
+        """
+        離 (x, y) 最近的 k 個角色，回傳 [(距離, agent), ...]（由近到遠）
+
+        參數:
+        - agent_type: 只找這種 type 的角色（None = 全部）
+        - exclude: 要排除的條件 exclude(agent) -> bool（例如排除自己）
+        """
+        total = len(self.where) if agent_type is None else self.counts.get(agent_type, 0)
+        if total == 0 or k <= 0:
+            return []
+        bx, by = self._bucket_of(x, y)
+        x0, y0, x1, y1 = self.bounds
+        reach = max(bx - x0, x1 - bx, by - y0, y1 - by)   # 超過這一圈就沒有桶了
+
+        found = []   # (距離, 序號, agent)
+        r = 0
+        while r <= reach:
+            for key in self._ring(bx, by, r):
+                for a in self._members(key, agent_type):
+                    if exclude is not None and exclude(a):
+                        continue
+                    found.append((abs(a.x - x) + abs(a.y - y), self.order[a], a))
+            # 第 r + 1 圈以外的角色距離至少 r * cell_size + 1
+            if len(found) >= k and heapq.nsmallest(k, found)[-1][0] <= r * self.cell_size:
+                break
+            r += 1
+        return [(d, a) for d, _, a in heapq.nsmallest(k, found)]
+
+    def within(self, x, y, radius, agent_type=None, exclude=None):
+        """曼哈頓距離 radius 以內的角色，回傳 [(距離, agent), ...]（由近到遠）"""
+        bx0, by0 = self._bucket_of(x - radius, y - radius)
+        bx1, by1 = self._bucket_of(x + radius, y + radius)
+        found = []
+        for bx in range(bx0, bx1 + 1):
+            for by in range(by0, by1 + 1):
+                for a in self._members((bx, by), agent_type):
+                    d = abs(a.x - x) + abs(a.y - y)
+                    if d <= radius and (exclude is None or not exclude(a)):
+                        found.append((d, self.order[a], a))
+        found.sort(key=lambda f: f[:2])
+        return [(d, a) for d, _, a in found]
+
+    @staticmethod
+    def _ring(bx, by, r):
+        """以 (bx, by) 為中心、切比雪夫距離剛好為 r 的桶"""
+        if r == 0:
+            yield bx, by
+            return
+        for dx in range(-r, r + 1):
+            yield bx + dx, by - r
+            yield bx + dx, by + r
+        for dy in range(-r + 1, r):
+            yield bx - r, by + dy
+            yield bx + r, by + dy
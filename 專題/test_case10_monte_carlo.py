@@ -0,0 +1,30 @@
+from monte_carlo import monte_carlo, print_summary
+import time
+
+# 隨機走步與隨機起點讓單場結果沒有代表性：同一個瓶頸情境跑多個不同種子的 replica，
+# 看疏散時間的分布；平均值的 95% 信賴區間半寬小於平均的 0.5% 就提早停止
+W, H = 14, 9
+grid = [[0] * W for _ in range(H)]
+for y in range(H):
+    if y != H // 2:
+        grid[y][W - 4] = 1   # 牆，只留中間一格通道
+
+spec = {
+    "case_name": "case10_monte_carlo",
+    "grid": grid,
+    "exit_pos": (W - 1, H // 2),
+    "spawn": [("一般人", 12), ("學生", 6), ("輪椅", 2)],
+    "spawn_area": (0, 0, W - 6, H - 1),
+    "steps": 300,
+    "sleep_s": 0.05,
+    "planner": "flow_field",
+    "leave_on_arrival": True,
+    "events": [{"t": 0, "type": "alarm", "data": {}}],
+}
+
+if __name__ == "__main__":   # worker process 會重新 import 這個檔案
+    start = time.perf_counter()
+    summary = monte_carlo(spec, replicas=2000, base_seed=0, rel_tol=0.005, csv_path="logs/monte_carlo_case10.csv")
+    print_summary(spec["case_name"], summary)
+    print(f"\n⏱ 實際耗時 {time.perf_counter() - start:.2f} 秒；"
+          f"疏散時間平均的 95% 信賴區間 ±{summary['ci_half_width']:.3f} 秒")
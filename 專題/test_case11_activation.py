@@ -0,0 +1,82 @@
+from simulate import simulate
+from sim_clock import SimClock
+import contextlib
+import io
+import json
+import random
+import time
+
+with open("roles.json", "r", encoding="utf-8") as f:
+    roles = json.load(f)
+
+# 大量人員擠一個通道、到出口就離開：比較每步處理每個人與只處理被叫醒的人
+# 排隊的人睡到前面有人走開才醒，到出口的人不再處理，每步成本只跟醒著的人數有關
+W, H = 40, 30
+grid = [[0] * W for _ in range(H)]
+for y in range(H):
+    if y != H // 2:
+        grid[y][W - 6] = 1   # 牆，只留中間一格通道
+
+agents = [(("一般人", "學生", "輪椅")[(x + y) % 3], x, y) for y in range(H) for x in range(0, 16)]
+
+for planner in ("flow_field", "astar"):
+    for activation in ("every_step", "event"):
+        start = time.perf_counter()
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            log = simulate(
+                roles,
+                case_name=f"case11_{planner}_{activation}",
+                agents=agents,
+                grid=grid,
+                exit_pos=(W - 1, H // 2),
+                steps=1500,
+                planner=planner,
+                leave_on_arrival=True,
+                clock=SimClock(dt=0.05),
+                write_log=False,
+                activation=activation
+            )
+        elapsed = time.perf_counter() - start
+        arrived = [e["time"] for e in log if e["action"] == "Step" and (e["x"], e["y"]) == (W - 1, H // 2)]
+        print(f"{planner:<10} {activation:<10} 抵達 {len(arrived)}/{len(agents)} 人，"
+              f"最後一人 {max(arrived, default=0):.2f} 秒，log {len(log)} 筆，實際耗時 {elapsed:.2f} 秒")
+        for line in out.getvalue().splitlines():
+            if line.startswith("🔔"):
+                print("   ", line)
+
+
+# 兩種 activation 的行為要完全相同：不看 Wait / Arrived（event 模式睡著時不記），
+# 其餘 log 逐筆比對；封路會讓人站在距離場沒有值的格子上，只能隨機亂走
+def non_wait_log(planner, activation, seed, events):
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        log = simulate(
+            roles,
+            case_name=f"case11_cmp_{planner}_{activation}",
+            agents=[(("一般人", "小孩", "老人")[k % 3], x, y)
+                    for k, (x, y) in enumerate((x, y) for y in range(6) for x in range(4))],
+            grid=[[1 if (x, y) in ((6, 1), (6, 2), (6, 4), (6, 5)) else 0 for x in range(12)] for y in range(8)],
+            exit_pos=(11, 3),
+            steps=150,
+            events=events,
+            planner=planner,
+            leave_on_arrival=True,
+            clock=SimClock(dt=0.05),
+            write_log=False,
+            activation=activation
+        )
+    return [{k: v for k, v in e.items() if k != "time"} for e in log if e["action"] not in ("Wait", "Arrived")]
+
+for seed in range(8):
+    rng = random.Random(seed)
+    events = [{"t": 0, "type": "alarm", "data": {}}]
+    for _ in range(3):
+        cell = (rng.randrange(4), rng.randrange(6))   # 封在人群裡，被封的人只能亂走
+        t = rng.randint(1, 20)
+        events.append({"t": t, "type": "block", "data": {"cell": cell}})
+        events.append({"t": t + rng.randint(5, 30), "type": "clear", "data": {"cell": cell}})
+    for planner in ("flow_field", "astar", "jps"):
+        assert non_wait_log(planner, "every_step", seed, events) == non_wait_log(planner, "event", seed, events), \
+            f"seed {seed} {planner}：event 模式的結果與 every_step 不同"
+print("activation=\"event\" 與 every_step 的移動 / Replan / Blocked 紀錄完全相同")
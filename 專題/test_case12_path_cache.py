@@ -0,0 +1,43 @@
+from simulate import simulate
+from sim_clock import SimClock
+import contextlib
+import io
+import json
+import re
+
+with open("roles.json", "r", encoding="utf-8") as f:
+    roles = json.load(f)
+
+# 大量人員擠同一個出口通道、每人各自 A*：排隊的人一直從同一格重新規劃，
+# 路線上的人數沒明顯變多就沿用快取的路徑，命中率不應該是 0
+W, H = 30, 20
+grid = [[0] * W for _ in range(H)]
+for y in range(H):
+    if y != H // 2:
+        grid[y][W - 6] = 1   # 牆，只留中間一格通道
+
+agents = [("一般人", x, y) for y in range(H) for x in range(0, 10)]
+exit_pos = (W - 1, H // 2)
+
+out = io.StringIO()
+with contextlib.redirect_stdout(out):
+    log = simulate(
+        roles,
+        case_name="case12_path_cache",
+        agents=agents,
+        grid=grid,
+        exit_pos=exit_pos,
+        steps=400,
+        events=[{"t": 0, "type": "alarm", "data": {}}],
+        clock=SimClock(dt=0.05),
+        leave_on_arrival=True,
+        write_log=False
+    )
+
+arrived = sum(1 for e in log if e["action"] == "Step" and (e["x"], e["y"]) == exit_pos)
+stats = re.search(r"命中 (\d+) / 未命中 (\d+)", out.getvalue())
+hits, misses = int(stats.group(1)), int(stats.group(2))
+print(f"抵達出口：{arrived}/{len(agents)} 人，路徑快取命中 {hits} / 未命中 {misses}"
+      f"（命中率 {hits / (hits + misses):.0%}）")
+assert arrived == len(agents), "所有人都應該疏散"
+assert hits > 0, "擁擠情境下路徑快取應該有命中"
@@ -0,0 +1,60 @@
+from pathfinding import astar_search
+from map_system import MapSystem
+import heapq
+import random
+
+# astar_search 在 f 相同時往目標方向深入，代價相同的路徑可能與舊版選到不同的一條；
+# 這裡確認路徑代價一定與 Dijkstra 算出的最短代價相同（擁擠代價 = 1 + 該格人數）
+
+
+def dijkstra_cost(grid, occ, start, goal, use_crowd):
+    dist = {start: 0}
+    heap = [(0, start)]
+    while heap:
+        d, (x, y) = heapq.heappop(heap)
+        if (x, y) == goal:
+            return d
+        if d > dist[(x, y)]:
+            continue
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < len(grid[0]) and 0 <= ny < len(grid) and grid[ny][nx] == 0:
+                nd = d + (1 + occ[ny][nx] if use_crowd else 1)
+                if nd < dist.get((nx, ny), float("inf")):
+                    dist[(nx, ny)] = nd
+                    heapq.heappush(heap, (nd, (nx, ny)))
+    return None
+
+
+def path_cost(path, start, occ, use_crowd):
+    cells = [start] + path
+    for (x0, y0), (x1, y1) in zip(cells, cells[1:]):
+        assert abs(x0 - x1) + abs(y0 - y1) == 1, "路徑不連續"
+    return sum(1 + occ[y][x] if use_crowd else 1 for x, y in path)
+
+
+rng = random.Random(0)
+checked = 0
+for trial in range(300):
+    W, H = rng.randint(2, 25), rng.randint(2, 25)
+    grid = [[1 if rng.random() < 0.25 else 0 for _ in range(W)] for _ in range(H)]
+    map_system = MapSystem(grid)
+    for _ in range(rng.randint(0, W * H // 3)):
+        map_system.occupy(rng.randrange(W), rng.randrange(H))
+    occ = map_system.occupancy
+    start = (rng.randrange(W), rng.randrange(H))
+    goal = (rng.randrange(W), rng.randrange(H))
+    grid[start[1]][start[0]] = 0
+    map_system.set_cell(start[0], start[1], 0)
+    for use_crowd in (True, False):
+        req = {"grid": grid, "grid_occupancy": occ, "start": start, "goal": goal, "use_crowd_cost": use_crowd}
+        expected = dijkstra_cost(grid, occ, start, goal, use_crowd)
+        for extra in ({}, {"map_system": map_system}):   # 每次重建代價表 / 用 MapSystem 的代價表
+            path = astar_search(dict(req, **extra))
+            if expected is None:
+                assert path is None, f"trial {trial}：應該找不到路徑"
+            else:
+                assert path is not None and (not path or path[-1] == goal), f"trial {trial}：沒走到終點"
+                assert path_cost(path, start, occ, use_crowd) == expected, f"trial {trial}：不是最短路徑"
+            checked += 1
+
+print(f"✅ {checked} 次搜尋的路徑代價都與 Dijkstra 相同")
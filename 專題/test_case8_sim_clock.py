@@ -0,0 +1,34 @@
+from simulate import simulate
+from sim_clock import SimClock
+import json
+import time
+
+with open("roles.json", "r", encoding="utf-8") as f:
+    roles = json.load(f)
+
+# 與 case4 相同的反應延遲情境，改用模擬時鐘：每步推進 0.05 秒模擬時間、不睡
+# 兩次執行的 log（含時間戳記）應完全相同，而且幾乎不花實際時間
+logs = []
+for run in range(2):
+    start = time.perf_counter()
+    simulate(
+        roles,
+        case_name=f"case8_sim_clock_{run}",
+        agents=[
+            ("老師", 0, 0),
+            ("學生", 1, 0),
+            ("輪椅", 2, 0),
+        ],
+        grid=[
+            [0,0,0,0],
+            [0,1,0,0],
+            [0,0,0,0]
+        ],
+        steps=200,
+        clock=SimClock(dt=0.05)
+    )
+    print(f"⏱ 第 {run + 1} 次：實際耗時 {time.perf_counter() - start:.3f} 秒")
+    with open(f"logs/simulation_log_case8_sim_clock_{run}.json", "r", encoding="utf-8") as f:
+        logs.append(json.load(f))
+
+print("兩次 log 相同：", logs[0] == logs[1])
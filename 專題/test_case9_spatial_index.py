@@ -0,0 +1,52 @@
+from agent import Agent
+from map_system import MapSystem
+from spatial_index import SpatialHash
+import contextlib
+import io
+import json
+import random
+import time
+
+with open("roles.json", "r", encoding="utf-8") as f:
+    roles = json.load(f)
+
+# 小孩跟隨最近的成人、成人隨機走：同樣的亂數下，有無空間索引的結果應完全相同
+W, H = 120, 120
+N_ADULT, N_CHILD, STEPS = 300, 1500, 20
+
+
+def run(use_index):
+    random.seed(7)
+    map_system = MapSystem([[0] * W for _ in range(H)])
+    index = SpatialHash(cell_size=8) if use_index else None
+    agents = []
+    for k in range(N_ADULT + N_CHILD):
+        name = "一般人" if k < N_ADULT else "小孩"
+        a = Agent(name, roles[name], random.randrange(W), random.randrange(H))
+        agents.append(a)
+        if index is not None:
+            index.insert(a)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for step in range(STEPS):
+            for a in agents:
+                if a.type == "child":
+                    target = a.find_nearest_adult(agents)
+                    if target:
+                        a.move_toward(target, map_system)
+                else:
+                    nx, ny = a.choose_random_step()
+                    a.try_move(nx, ny, map_system)
+    elapsed = time.perf_counter() - start
+    return [(a.x, a.y) for a in agents], elapsed, agents
+
+
+linear, t_linear, _ = run(False)
+hashed, t_hashed, agents = run(True)
+print(f"線性搜尋：{t_linear:.3f} 秒；空間索引：{t_hashed:.3f} 秒")
+print("兩種方式結果相同：", linear == hashed)
+
+child = next(a for a in agents if a.type == "child")
+print(f"{child.name} 在 ({child.x},{child.y})，視野 {child.vision} 內：",
+      [(d, a.name, (a.x, a.y)) for d, a in child.visible_agents()[:5]])
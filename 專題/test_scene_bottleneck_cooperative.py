@@ -0,0 +1,30 @@
+from simulate import simulate
+import json
+
+with open("roles.json", "r", encoding="utf-8") as f:
+    roles = json.load(f)
+for role in roles.values():
+    role["reaction_time"] = 0   # 反應時間以實際秒數計，sleep_s=0 時直接開始疏散
+
+# 同一個單格通道，比較每人各自 A* 與共用時空預約表（cooperative）的 Wait/Replan 次數
+W, H = 30, 20
+grid = [[0] * W for _ in range(H)]
+for y in range(H):
+    if y != H // 2:
+        grid[y][W - 6] = 1   # 牆，只留中間一格通道
+
+agents = [("一般人", x, y) for y in range(H) for x in range(0, 10)]
+
+for planner in ("astar", "cooperative"):
+    simulate(
+        roles,
+        case_name=f"scene_bottleneck_{planner}",
+        agents=agents,
+        grid=[row[:] for row in grid],
+        exit_pos=(W - 1, H // 2),
+        steps=400,
+        sleep_s=0.0,
+        events=[{"t": 0, "type": "alarm", "data": {}}],
+        planner=planner,
+        leave_on_arrival=True   # 出去的人離開出口格，才看得出每步疏散人數
+    )
@@ -0,0 +1,34 @@
+from simulate import simulate
+from sim_clock import SimClock
+import json
+
+with open("roles.json", "r", encoding="utf-8") as f:
+    roles = json.load(f)
+
+# 大量人員擠同一個出口通道：用共用的出口距離場（flow field）取代每人各自 A*
+W, H = 30, 20
+grid = [[0] * W for _ in range(H)]
+for y in range(H):
+    if y != H // 2:
+        grid[y][W - 6] = 1   # 牆，只留中間一格通道
+
+agents = [("一般人", x, y) for y in range(H) for x in range(0, 10)]
+exit_pos = (W - 1, H // 2)
+
+# 只發警報（不用預設 demo 的封路，那格在人群裡）；模擬時鐘讓 reaction_time 照步數經過
+log = simulate(
+    roles,
+    case_name="scene_bottleneck_crowd",
+    agents=agents,
+    grid=grid,
+    exit_pos=exit_pos,
+    steps=400,
+    events=[{"t": 0, "type": "alarm", "data": {}}],
+    clock=SimClock(dt=0.05),
+    planner="flow_field",
+    leave_on_arrival=True
+)
+
+arrived = sum(1 for e in log if e["action"] == "Step" and (e["x"], e["y"]) == exit_pos)
+print(f"抵達出口：{arrived}/{len(agents)} 人")
+assert arrived == len(agents), "flow field 情境應該全部疏散"
@@ -0,0 +1,30 @@
+from building import Building
+from map_system import STAIRS, ELEVATOR
+import json
+
+with open("roles.json", "r", encoding="utf-8") as f:
+    roles = json.load(f)
+
+# 三層樓：左側樓梯、右側電梯，出口在一樓 (0, 0)
+W, H = 12, 8
+floors = []
+for level in range(3):
+    grid = [[0] * W for _ in range(H)]
+    for y in range(1, H - 1):
+        grid[y][5] = 1             # 每層中間一道牆，只留上下兩端可以繞
+    grid[H - 2][1] = STAIRS
+    grid[H - 2][W - 2] = ELEVATOR
+    floors.append(grid)
+
+building = Building(floors)
+building.precompute()
+
+start = (2, W - 1, 0)   # 三樓右上角
+exit_cell = (0, 0, 0)
+for name in ("一般人", "輪椅"):
+    path = building.route(start, exit_cell, roles[name])
+    cost = building.distance(start, exit_cell, roles[name])
+    changes = [(a, b) for a, b in zip([start] + path, path) if a[0] != b[0]]
+    print(f"=== {name} ===")
+    print("代價:", cost, "步數:", len(path))
+    print("換樓層:", changes)
@@ -0,0 +1,29 @@
+from simulate import simulate
+import json
+
+with open("roles.json", "r", encoding="utf-8") as f:
+    roles = json.load(f)
+
+# 放大版的開放大廳：每步代價相同，用 JPS 取代逐格展開的 A*
+W, H = 120, 80
+grid = [[0] * W for _ in range(H)]
+for x in range(20, 100):
+    grid[H // 2][x] = 1   # 大廳中間一道長隔板
+
+simulate(
+    roles,
+    case_name="scene_open_large",
+    agents=[
+        ("一般人", 0, 0),
+        ("學生", 0, H // 2 + 5),
+        ("輪椅", 10, H - 1),
+    ],
+    grid=grid,
+    exit_pos=(W - 1, H - 1),
+    events=[
+        {"t": 0, "type": "alarm", "data": {}},
+        {"t": 20, "type": "block", "data": {"cell": (100, H // 2)}},   # 隔板延長
+    ],
+    steps=300,
+    planner="jps"
+)
@@ -39,6 +39,7 @@ def main():
     print(f"疏散時間: {stats['evacuation_time']:.2f} 秒")
     print(f"路徑變更次數: {stats['path_changes']}")
     print(f"擁擠點數量: {len(stats['congestion_points'])}")
+    print(f"瓶頸格（依擁擠時間）: {sim.bottlenecks(5)}")
     
     # 繪製最終擁擠度地圖
     plt.figure(figsize=(8, 6))
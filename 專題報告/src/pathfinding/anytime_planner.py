@@ -0,0 +1,145 @@
+import heapq
+import time
+
+
+class AnytimeSearch:
+    def __init__(self, planner, start, goal, weight=3.0, weight_step=0.5):
+        """
+        ARA*（anytime repairing A*）：可分段執行、逐步改善的單一路徑搜尋
+
+        參數:
+        - planner: PathPlanner（使用它的代價表與 A* 核心的編號方式）
+        - start, goal: 起點、終點 (x, y)
+        - weight: 第一輪加權 A* 的啟發式權重（越大越快找到第一條路徑，代價最多是最短路徑的 weight 倍）
+        - weight_step: 每找到一條路徑權重就減少多少，直到 1（最短路徑）
+
+        - improve(deadline) 在期限內盡量搜尋，時間到就停下來，搜尋狀態保留到下次呼叫
+        - 每一輪沿用上一輪的 g 值，只重新展開不一致的節點（ARA* 的 INCONS 集合）
+        - 代價表在建立時取一份快照（擁擠度每次 update 都會變，搜尋中途不跟著換）；
+          通行層改變（map_version）時整個搜尋重來
+        """
+        self.planner = planner
+        self.start = start
+        self.goal = goal
+        self.initial_weight = weight
+        self.weight_step = weight_step
+        self.path = None           # 目前最好的路徑（包含起點與終點）
+        self.path_cost = None
+        self.done = False          # 已找到最短路徑，或確定沒有路徑
+        self.expanded = 0
+        self._reset()
+
+    def _reset(self):
+        planner = self.planner
+        search = planner.grid_search
+        self.map_version = planner.map_version
+        self.weight = self.initial_weight
+        self.path = None
+        self.path_cost = None
+        self.done = False
+        if not (search.in_bounds(*self.start) and search.in_bounds(*self.goal)):
+            self.done = True
+            return
+
+        self.cost, _, self.scale = planner.search_costs()
+        self.offsets = planner._offsets
+        self.stride = search.stride
+        self.source = search.node(*self.start)
+        self.target = search.node(*self.goal)
+        self.g = {self.source: 0}
+        self.parent = {self.source: None}
+        self.closed = set()
+        self.incons = set()
+        self.open = [(self.weight * self.heuristic(self.source), 0, self.source)]
+        if self.source == self.target:
+            self._publish()
+            self.done = True
+
+    def heuristic(self, node):
+        """曼哈頓距離（乘上代價倍數）；大地圖上不預先建整張表，展開到哪算到哪"""
+        r, c = divmod(node, self.stride)
+        tr, tc = divmod(self.target, self.stride)
+        return (abs(r - tr) + abs(c - tc)) * self.scale
+
+    def improve(self, deadline):
+        """
+        搜尋到 deadline（time.perf_counter() 的時間）為止；
+        回傳這次呼叫是否得到更好的路徑（結果在 self.path）
+        """
+        if self.planner.map_version != self.map_version:
+            self._reset()
+        improved = False
+        while not self.done:
+            finished = self._improve_path(deadline)
+            if not finished:
+                break  # 時間到
+            if self.target not in self.g:
+                self.done = True  # open set 用完仍到不了終點
+                break
+            if self.path_cost is None or self.g[self.target] < self.path_cost:
+                self._publish()
+                improved = True
+            if self.weight <= 1.0:
+                self.done = True
+                break
+            self._next_round()
+        return improved
+
+    def _improve_path(self, deadline):
+        """展開到終點的 g 不大於 open set 最小的 key；回傳 False 表示時間到還沒結束"""
+        cost, offsets, g, parent = self.cost, self.offsets, self.g, self.parent
+        closed, incons, open_heap = self.closed, self.incons, self.open
+        w = self.weight
+        target = self.target
+        stride, scale = self.stride, self.scale
+        tr, tc = divmod(target, stride)
+        inf = float('inf')
+        count = 0
+        while open_heap and open_heap[0][0] < g.get(target, inf):
+            _, gu, u = heapq.heappop(open_heap)
+            if u in closed or gu != g[u]:
+                continue  # 已展開或過期的 heap 項目
+            closed.add(u)
+            count += 1
+            for o in offsets:
+                v = u + o
+                c = cost[v]
+                if not c:
+                    continue
+                ng = gu + c
+                if ng < g.get(v, inf):
+                    g[v] = ng
+                    parent[v] = u
+                    if v in closed:
+                        incons.add(v)
+                    else:
+                        vr, vc = divmod(v, stride)
+                        h = (abs(vr - tr) + abs(vc - tc)) * scale
+                        heapq.heappush(open_heap, (ng + w * h, ng, v))
+            # 每展開一批節點才看一次時間
+            if count & 255 == 0 and time.perf_counter() >= deadline:
+                self.expanded += count
+                return False
+        self.expanded += count
+        return True
+
+    def _next_round(self):
+        """降低權重，open set 與不一致節點以新權重重新排序，下一輪重新展開"""
+        self.weight = max(1.0, self.weight - self.weight_step)
+        w, g = self.weight, self.g
+        nodes = {u for _, _, u in self.open if u not in self.closed} | self.incons
+        self.open = [(g[u] + w * self.heuristic(u), g[u], u) for u in nodes]
+        heapq.heapify(self.open)
+        self.closed = set()
+        self.incons = set()
+
+    def _publish(self):
+        search = self.planner.grid_search
+        node = self.target
+        path = []
+        while node is not None:
+            path.append(search.cell(node))
+            node = self.parent[node]
+        path.reverse()
+        self.path = path
+        self.path_cost = self.g[self.target]
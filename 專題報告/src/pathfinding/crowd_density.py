@@ -0,0 +1,98 @@
+import numpy as np
+
+# 權重量化：1/距離 取到 2^-20 的整數倍，浮點加減就是精確運算，
+# 增量更新不會累積誤差，結果與整張重算逐位元相同
+WEIGHT_QUANTUM = 2.0 ** -20
+
+
+class CrowdDensityField:
+    def __init__(self, shape, radius=3):
+        """
+        擁擠度引擎：每個人對周圍 (2r+1)x(2r+1) 範圍內的格子貢獻 1/距離
+
+        參數:
+        - shape: 地圖大小 (height, width)
+        - radius: 影響半徑（格）
+        """
+        self.height, self.width = shape
+        self.radius = radius
+        r = radius
+
+        # 預先計算 kernel：偏移量與權重（本格距離為 0，不計入）
+        offsets = [(dx, dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1)
+                   if (dx, dy) != (0, 0)]
+        self.padded_width = self.width + 2 * r
+        self.kernel_offsets = offsets
+        self.kernel_flat = np.array([dx * self.padded_width + dy for dx, dy in offsets],
+                                    dtype=np.intp)
+        self.kernel_weights = np.array(
+            [np.round(1.0 / np.sqrt(dx * dx + dy * dy) / WEIGHT_QUANTUM) * WEIGHT_QUANTUM
+             for dx, dy in offsets])
+
+        # 擁擠度存在四周各留 r 格的緩衝區中，散佈時不用做邊界判斷
+        self._padded = np.zeros((self.height + 2 * r, self.width + 2 * r), dtype=float)
+        self._padded_flat = self._padded.reshape(-1)
+        self.density = self._padded[r:r + self.height, r:r + self.width]
+
+        # 每格人數（一維，row-major）
+        self.counts = np.zeros(self.height * self.width, dtype=np.int64)
+        # 擁擠度版本：內容有變動就 +1
+        self.version = 0
+
+    def _cell_ids(self, positions):
+        """把 (x, y) 位置轉成一維格子編號，丟掉超出地圖的位置"""
+        pos = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+        x, y = pos[:, 0], pos[:, 1]
+        inside = (x >= 0) & (x < self.height) & (y >= 0) & (y < self.width)
+        return x[inside] * self.width + y[inside]
+
+    def _scatter(self, cells, delta):
+        """把格子人數的變化量散佈到周圍的擁擠度"""
+        if len(cells) == 0:
+            return
+        r = self.radius
+        padded = (cells // self.width + r) * self.padded_width + cells % self.width + r
+        delta = delta.astype(float)
+        for off, w in zip(self.kernel_flat, self.kernel_weights):
+            self._padded_flat[padded + off] += w * delta
+        self.version += 1
+
+    def rebuild(self):
+        """依目前人數整張重算擁擠度"""
+        r = self.radius
+        counts = np.zeros((self.height + 2 * r, self.width + 2 * r))
+        counts[r:r + self.height, r:r + self.width] = self.counts.reshape(self.height, self.width)
+        self.density[:] = 0.0
+        for (dx, dy), w in zip(self.kernel_offsets, self.kernel_weights):
+            self.density += w * counts[r + dx:r + dx + self.height, r + dy:r + dy + self.width]
+        self.version += 1
+
+    def update(self, positions):
+        """
+        以整批位置更新擁擠度：先數每格人數，只對人數有變動的格子做增量散佈；
+        變動太多時改為整張重算
+        """
+        new_counts = np.bincount(self._cell_ids(positions), minlength=self.counts.size)
+        changed = np.flatnonzero(new_counts != self.counts)
+        if len(changed) == 0:
+            return
+        delta = new_counts[changed] - self.counts[changed]
+        self.counts = new_counts
+        if len(changed) * 8 > self.counts.size:
+            self.rebuild()
+        else:
+            self._scatter(changed, delta)
+
+    def move(self, old_positions, new_positions):
+        """只套用有移動的人：old_positions[i] → new_positions[i]"""
+        old_cells = self._cell_ids(old_positions)
+        new_cells = self._cell_ids(new_positions)
+        cells = np.concatenate([old_cells, new_cells])
+        signs = np.concatenate([-np.ones(len(old_cells), dtype=np.int64),
+                                np.ones(len(new_cells), dtype=np.int64)])
+        cells, inverse = np.unique(cells, return_inverse=True)
+        delta = np.bincount(inverse, weights=signs, minlength=len(cells)).astype(np.int64)
+        keep = delta != 0
+        cells, delta = cells[keep], delta[keep]
+        self.counts[cells] += delta
+        self._scatter(cells, delta)
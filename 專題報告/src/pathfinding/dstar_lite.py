@@ -0,0 +1,162 @@
+import heapq
+import numpy as np
+
+INF = float("inf")
+
+
+class DStarLite:
+    def __init__(self, planner, goal):
+        """
+        D* Lite 增量路徑規劃：從目標反向搜尋並保留搜尋狀態，
+        地圖（障礙物、擁擠度）改變時只修復受影響的節點
+
+        參數:
+        - planner: 提供地圖大小與每格進入代價的 PathPlanner
+        - goal: 目標位置 (x, y)
+
+        同一個目標的所有代理共用同一份搜尋狀態，起點改變時用 km 修正 key。
+        """
+        self.planner = planner
+        self.height = planner.height
+        self.width = planner.width
+        self.goal = goal
+        self.goal_id = goal[0] * self.width + goal[1]
+
+        n = self.height * self.width
+        self.g = [INF] * n
+        self.rhs = [INF] * n
+        self.rhs[self.goal_id] = 0.0
+
+        # 每格進入代價快照（障礙物為 inf）
+        self.cost_array = planner.entering_costs()
+        self.cost = self.cost_array.tolist()
+        self.density_version = planner.crowd.version
+
+        self.queue = []
+        self.queued = {}  # 節點 -> 目前有效的 key
+        self.km = 0.0
+        self.last_start = None
+
+    def heuristic(self, a, b):
+        """兩個節點編號之間的曼哈頓距離"""
+        ax, ay = divmod(a, self.width)
+        bx, by = divmod(b, self.width)
+        return abs(ax - bx) + abs(ay - by)
+
+    def neighbors(self, u):
+        """上下左右的節點編號（順序與 PathPlanner.get_neighbors 相同）"""
+        x, y = divmod(u, self.width)
+        result = []
+        if y + 1 < self.width:
+            result.append(u + 1)
+        if x + 1 < self.height:
+            result.append(u + self.width)
+        if y > 0:
+            result.append(u - 1)
+        if x > 0:
+            result.append(u - self.width)
+        return result
+
+    def calculate_key(self, u):
+        m = min(self.g[u], self.rhs[u])
+        return (m + self.heuristic(self.last_start, u) + self.km, m)
+
+    def update_vertex(self, u):
+        if u != self.goal_id:
+            cost, g = self.cost, self.g
+            self.rhs[u] = min((cost[v] + g[v] for v in self.neighbors(u)), default=INF)
+        if self.g[u] != self.rhs[u]:
+            key = self.calculate_key(u)
+            self.queued[u] = key
+            heapq.heappush(self.queue, (key[0], key[1], u))
+        else:
+            self.queued.pop(u, None)
+
+    def compute_shortest_path(self, s):
+        g, rhs, queue, queued = self.g, self.rhs, self.queue, self.queued
+        while queue:
+            k1, k2, u = queue[0]
+            if queued.get(u) != (k1, k2):
+                heapq.heappop(queue)  # 過期的項目
+                continue
+            if (k1, k2) >= self.calculate_key(s) and rhs[s] == g[s]:
+                break
+
+            heapq.heappop(queue)
+            k_new = self.calculate_key(u)
+            if (k1, k2) < k_new:
+                queued[u] = k_new
+                heapq.heappush(queue, (k_new[0], k_new[1], u))
+            elif g[u] > rhs[u]:
+                g[u] = rhs[u]
+                del queued[u]
+                for p in self.neighbors(u):
+                    self.update_vertex(p)
+            else:
+                g[u] = INF
+                del queued[u]
+                self.update_vertex(u)
+                for p in self.neighbors(u):
+                    self.update_vertex(p)
+
+    def _set_cost(self, v, new_cost):
+        if self.cost[v] == new_cost:
+            return
+        self.cost[v] = new_cost
+        self.cost_array[v] = new_cost
+        # 進入 v 的邊代價改變 → 只影響 v 的鄰居
+        if self.last_start is not None:
+            for p in self.neighbors(v):
+                self.update_vertex(p)
+
+    def cell_changed(self, position):
+        """單一格子的通行狀態改變（新增/移除動態障礙物）"""
+        x, y = position
+        if 0 <= x < self.height and 0 <= y < self.width:
+            self._set_cost(x * self.width + y, self.planner.entering_cost(position))
+
+    def sync_costs(self):
+        """擁擠度版本改變時，只對代價有變動的格子做修復"""
+        if self.density_version == self.planner.crowd.version:
+            return
+        new_costs = self.planner.entering_costs()
+        changed = np.flatnonzero(new_costs != self.cost_array)
+        for v in changed.tolist():
+            self._set_cost(v, float(new_costs[v]))
+        self.density_version = self.planner.crowd.version
+
+    def plan(self, start):
+        """從 start 到目標的路徑（包含起點與終點）；找不到回傳 None"""
+        x, y = start
+        if not (0 <= x < self.height and 0 <= y < self.width):
+            return None
+        s = x * self.width + y
+
+        if self.last_start is None:
+            self.last_start = s
+            self.update_vertex(self.goal_id)
+        elif s != self.last_start:
+            self.km += self.heuristic(self.last_start, s)
+            self.last_start = s
+
+        self.sync_costs()
+        self.compute_shortest_path(s)
+        if self.g[s] == INF and s != self.goal_id:
+            return None
+
+        # 沿著 cost + g 最小的鄰居走到目標
+        path = [start]
+        cur = s
+        for _ in range(len(self.g)):
+            if cur == self.goal_id:
+                return path
+            best, best_value = None, INF
+            for v in self.neighbors(cur):
+                value = self.cost[v] + self.g[v]
+                if value < best_value:
+                    best, best_value = v, value
+            if best is None:
+                return None
+            cur = best
+            path.append(divmod(cur, self.width))
+        return None
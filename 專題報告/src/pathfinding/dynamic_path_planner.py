@@ -1,25 +1,71 @@
+from collections import OrderedDict, deque
+
+import numpy as np
+
 from .path_planner import PathPlanner
+from .dstar_lite import DStarLite
 
 class DynamicPathPlanner(PathPlanner):
-    def __init__(self, grid_map, crowd_weight=0.5, replanning_threshold=0.5):
+    def __init__(self, grid_map, crowd_weight=0.5, replanning_threshold=0.5, incremental=False,
+                 path_cache_size=4096, landmarks=0, bidirectional=False, route_tolerance=1.0):
         """
         初始化動態路徑規劃器
         
         參數:
         - replanning_threshold: 重規劃閾值，當路徑代價變化超過此閾值時觸發重規劃
+        - incremental: 使用 D* Lite 增量重規劃（每個目標保留搜尋狀態，只修復受影響的節點）
+        - path_cache_size: should_replan 快取的路徑數量上限
+        - landmarks, bidirectional, route_tolerance: 見 PathPlanner
         """
-        super().__init__(grid_map, crowd_weight)
+        super().__init__(grid_map, crowd_weight, landmarks=landmarks, bidirectional=bidirectional,
+                         route_tolerance=route_tolerance)
         self.replanning_threshold = replanning_threshold
         self.dynamic_obstacles = set()  # 動態障礙物集合
+        self.incremental = incremental
+        self.incremental_planners = {}  # 目標 -> DStarLite
+        
+        # should_replan 用的快取
+        self.path_cache_size = path_cache_size
+        self._path_costs = OrderedDict()  # id(path) -> 路徑索引與剩餘代價
+        self._goal_distances = {}  # 目標 -> (map_version, 單位代價距離場)
+        self._last_probe = None  # 最近一次 should_replan 搜尋到的路徑
+        
+    def _in_bounds(self, position):
+        x, y = position
+        return 0 <= x < self.height and 0 <= y < self.width
         
     def add_dynamic_obstacle(self, position):
-        """添加動態障礙物"""
+        """添加動態障礙物（O(1) 更新有效通行層）"""
         self.dynamic_obstacles.add(position)
+        if self._in_bounds(position) and self.passable[position]:
+            self.passable[position] = False
+            self.map_version += 1
+            self.on_cell_changed(position)
         
     def remove_dynamic_obstacle(self, position):
-        """移除動態障礙物"""
+        """移除動態障礙物（O(1) 還原有效通行層）"""
         if position in self.dynamic_obstacles:
             self.dynamic_obstacles.remove(position)
+            if self._in_bounds(position):
+                self._refresh_passable(position)
+    
+    def _refresh_passable(self, node):
+        if node in self.dynamic_obstacles:
+            return  # 仍被動態障礙物佔據
+        super()._refresh_passable(node)
+    
+    def on_cell_changed(self, node):
+        super().on_cell_changed(node)
+        for planner in self.incremental_planners.values():
+            planner.cell_changed(node)
+    
+    def incremental_path(self, start, goal):
+        """用該目標的 D* Lite 搜尋狀態規劃路徑"""
+        planner = self.incremental_planners.get(goal)
+        if planner is None:
+            planner = DStarLite(self, goal)
+            self.incremental_planners[goal] = planner
+        return planner.plan(start)
     
     def is_path_valid(self, path):
         """檢查路徑是否有效（沒有被動態障礙物阻擋）"""
@@ -44,49 +90,171 @@ class DynamicPathPlanner(PathPlanner):
         
         return total_cost
     
+    def _path_entry(self, path):
+        """取得路徑的快取：節點索引、剩餘代價（地圖或擁擠度版本改變時才重算）"""
+        entry = self._path_costs.get(id(path))
+        if entry is None or entry["path"] is not path:
+            index = {}
+            for i, node in enumerate(path):
+                index.setdefault(node, i)
+            cells = np.array(path, dtype=np.intp).reshape(-1, 2)
+            entry = {"path": path, "index": index, "rows": cells[1:, 0], "cols": cells[1:, 1],
+                     "map_version": None, "valid": True, "density_version": None, "remaining": None}
+            self._path_costs[id(path)] = entry
+            if len(self._path_costs) > self.path_cache_size:
+                self._path_costs.popitem(last=False)
+        else:
+            self._path_costs.move_to_end(id(path))
+        
+        if entry["map_version"] != self.map_version:
+            entry["valid"] = self.dynamic_obstacles.isdisjoint(path)
+            entry["map_version"] = self.map_version
+        if entry["density_version"] != self.crowd.version:
+            # 每一步的代價 = calculate_cost；remaining[i] = 從第 i 個節點走到終點的代價
+            steps = 1.0 + self.crowd_density[entry["rows"], entry["cols"]] * self.crowd_weight
+            entry["remaining"] = np.concatenate([np.cumsum(steps[::-1])[::-1], [0.0]])
+            entry["density_version"] = self.crowd.version
+        return entry
+    
+    def _goal_distance(self, goal):
+        """到目標的單位代價距離場（反向 BFS，通行層改變時才重建）"""
+        cached = self._goal_distances.get(goal)
+        if cached is not None and cached[0] == self.map_version:
+            return cached[1]
+        
+        width = self.width
+        passable = self.passable.reshape(-1).tolist()
+        dist = [float('inf')] * (self.height * width)
+        if self._in_bounds(goal) and self.passable[goal]:
+            g = goal[0] * width + goal[1]
+            dist[g] = 0
+            queue = deque([g])
+            while queue:
+                u = queue.popleft()
+                d = dist[u] + 1
+                x, y = divmod(u, width)
+                for v, ok in ((u + width, x + 1 < self.height), (u - width, x > 0),
+                              (u + 1, y + 1 < width), (u - 1, y > 0)):
+                    # 反向走：v → u 只需要 u 可通行；v 本身不可通行時（人站在上面）不再往外擴展
+                    if ok and dist[v] == float('inf'):
+                        dist[v] = d
+                        if passable[v]:
+                            queue.append(v)
+        dist = np.array(dist).reshape(self.height, self.width)
+        self._goal_distances[goal] = (self.map_version, dist)
+        return dist
+    
+    def path_cost_lower_bound(self, position, goal):
+        """從 position 到 goal 的代價下界（每步代價至少 1，擁擠度只會增加代價）"""
+        if not self._in_bounds(position):
+            return abs(position[0] - goal[0]) + abs(position[1] - goal[1])
+        return float(self._goal_distance(goal)[position])
+    
+    def path_cost_lower_bounds(self, positions, goal):
+        """path_cost_lower_bound 的批次版本：positions 為 (n, 2) 陣列，回傳 n 個下界"""
+        positions = np.asarray(positions, dtype=np.intp).reshape(-1, 2)
+        x, y = positions[:, 0], positions[:, 1]
+        bounds = (np.abs(x - goal[0]) + np.abs(y - goal[1])).astype(float)
+        inside = (x >= 0) & (x < self.height) & (y >= 0) & (y < self.width)
+        bounds[inside] = self._goal_distance(goal)[x[inside], y[inside]]
+        return bounds
+    
     def should_replan(self, current_path, current_position):
         """判斷是否需要重新規劃路徑"""
+        decision, old_cost = self._replan_precheck(current_path, current_position)
+        if decision is not None:
+            return decision
+        
+        # 重新計算從當前位置到目標的路徑
+        goal = current_path[-1]
+        new_path = self._plan(current_position, goal)
+        self._last_probe = (current_position, goal, self.map_version, self.crowd.version, new_path)
+        return self._is_better(new_path, old_cost)
+    
+    def _replan_precheck(self, current_path, current_position):
+        """
+        should_replan 不需要搜尋的部分，回傳 (結論, 剩餘代價)；
+        結論為 None 表示要搜尋新路徑、與剩餘代價比較才能決定
+        """
+        if not current_path:
+            return True, None
+        entry = self._path_entry(current_path)
+        
         # 如果路徑被動態障礙物阻擋，需要重規劃
-        if not self.is_path_valid(current_path):
-            return True
+        if not entry["valid"]:
+            return True, None
         
         # 如果當前位置不在路徑上，需要重規劃
-        if current_position not in current_path:
-            return True
+        current_index = entry["index"].get(current_position)
+        if current_index is None:
+            return True, None
         
-        # 計算剩餘路徑的代價
-        current_index = current_path.index(current_position)
-        remaining_path = current_path[current_index:]
+        # 剩餘路徑的代價（快取）
+        if len(current_path) - current_index < 2:
+            return False, None  # 已在終點
+        old_cost = float(entry["remaining"][current_index])
         
-        # 重新計算從當前位置到目標的路徑
+        # 任何新路徑的代價都不低於下界：若下界已經無法讓代價降低超過閾值，就不必搜尋
         goal = current_path[-1]
-        new_path = self.find_path(current_position, goal)
-        
+        if self.path_cost_lower_bound(current_position, goal) >= old_cost * (1 - self.replanning_threshold):
+            return False, None
+        return None, old_cost
+    
+    def _is_better(self, new_path, old_cost):
         if not new_path:
             return False  # 無法找到新路徑，保持原路徑
         
         # 比較新舊路徑代價
-        old_cost = self.calculate_path_cost(remaining_path)
         new_cost = self.calculate_path_cost(new_path)
         
         # 如果新路徑比舊路徑更好（代價降低超過閾值），則重規劃
         return (old_cost - new_cost) / old_cost > self.replanning_threshold
     
+    def _plan(self, start, goal):
+        if self.incremental:
+            return self.incremental_path(start, goal)
+        # 有效通行層已包含動態障礙物，直接搜尋
+        return self.find_path(start, goal)
+    
     def update_and_replan(self, current_position, goal, current_path=None):
         """更新環境信息並在必要時重新規劃路徑"""
         if current_path is None or self.should_replan(current_path, current_position):
-            # 考慮動態障礙物的臨時地圖
-            temp_map = self.grid_map.copy()
-            for obs_x, obs_y in self.dynamic_obstacles:
-                if 0 <= obs_x < self.height and 0 <= obs_y < self.width:
-                    temp_map[obs_x, obs_y] = 1  # 標記為障礙物
-            
-            # 暫時替換地圖進行路徑規劃
-            original_map = self.grid_map
-            self.grid_map = temp_map
-            new_path = self.find_path(current_position, goal)
-            self.grid_map = original_map  # 恢復原始地圖
-            
-            return new_path
+            # should_replan 剛搜尋過同樣的起終點且地圖未變 → 直接沿用
+            probe = self._last_probe
+            self._last_probe = None
+            if probe is not None and probe[:4] == (current_position, goal, self.map_version,
+                                                   self.crowd.version):
+                return probe[4]
+            return self._plan(current_position, goal)
         
         return current_path
+    
+    def replan_paths(self, positions, goal, current_paths):
+        """
+        update_and_replan 的批次版本：同一目標的多個代理一起判斷
+        
+        參數:
+        - positions: 各代理目前位置 (x, y) 串列
+        - goal: 共同目標
+        - current_paths: 各代理目前的路徑（None 表示沒有路徑）
+        
+        回傳與 positions 對應的路徑串列。判斷規則與 should_replan 相同，
+        只是需要搜尋的新路徑由 find_paths 一次反向搜尋全部得到（代價相同的路徑可能選到不同的一條）
+        """
+        result = list(current_paths)
+        searches = []  # (索引, 剩餘代價)；剩餘代價為 None 表示一定換成新路徑
+        for k, (position, path) in enumerate(zip(positions, current_paths)):
+            decision, old_cost = (True, None) if path is None else self._replan_precheck(path, position)
+            if decision is None or decision:
+                searches.append((k, old_cost))
+        if not searches:
+            return result
+        
+        if self.incremental or len(searches) == 1:
+            new_paths = [self._plan(positions[k], goal) for k, _ in searches]
+        else:
+            new_paths = self.find_paths([positions[k] for k, _ in searches], goal)
+        for (k, old_cost), new_path in zip(searches, new_paths):
+            if old_cost is None or self._is_better(new_path, old_cost):
+                result[k] = new_path
+        return result
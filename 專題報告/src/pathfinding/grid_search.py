@@ -0,0 +1,363 @@
+import heapq
+
+
+class GridSearch:
+    def __init__(self, rows, cols):
+        """
+        扁平索引的網格 A* 核心
+
+        參數:
+        - rows, cols: 網格大小；節點 (r, c) 的編號為 (r + 1) * (cols + 2) + c + 1
+
+        - 四周各加一圈代價為 0（不可通行）的邊框，展開鄰居不需要邊界判斷
+        - 編號大小順序與 (r, c) tuple 相同，heap 的平手順序和用 tuple 時一致
+        - g / parent 緩衝區在多次搜尋間重複使用，用 generation 戳記判斷是否屬於本次搜尋
+        """
+        self.rows = rows
+        self.cols = cols
+        self.stride = cols + 2
+        self.size = (rows + 2) * self.stride
+        self.g = [0] * self.size
+        self.parent = [-1] * self.size
+        self.seen = [0] * self.size    # g / parent 有效的搜尋世代
+        self.marked = [0] * self.size  # 已展開（lazy）或在 open set 中的搜尋世代
+        self.generation = 0
+        self.expanded = 0              # 最近一次搜尋展開的節點數
+        self._heuristics = {}          # (goal, scale) -> 曼哈頓距離表
+
+    def node(self, r, c):
+        return (r + 1) * self.stride + c + 1
+
+    def cell(self, node):
+        r, c = divmod(node, self.stride)
+        return r - 1, c - 1
+
+    def in_bounds(self, r, c):
+        return 0 <= r < self.rows and 0 <= c < self.cols
+
+    def offsets(self, directions):
+        """把 (dr, dc) 方向轉成編號差"""
+        return [dr * self.stride + dc for dr, dc in directions]
+
+    def padded(self, rows):
+        """把每列的進入代價（0 表示不可通行）攤平成含邊框的一維代價表"""
+        out = [0] * self.stride
+        for row in rows:
+            out.append(0)
+            out.extend(row)
+            out.append(0)
+        out.extend([0] * self.stride)
+        return out
+
+    def heuristic(self, goal, scale=1):
+        """到 goal 的曼哈頓距離表（乘上 scale），同一個目標只算一次"""
+        key = (goal, scale)
+        h = self._heuristics.get(key)
+        if h is None:
+            if len(self._heuristics) >= 16:
+                self._heuristics.clear()
+            gr, gc = divmod(goal, self.stride)
+            h = []
+            if isinstance(scale, int):
+                # 每列是 gc 左邊遞減、右邊遞增的等差數列，用 range 產生（不逐格算）
+                for r in range(self.rows + 2):
+                    d = abs(r - gr) * scale
+                    h.extend(range(d + gc * scale, d, -scale))
+                    h.extend(range(d, d + (self.stride - gc) * scale, scale))
+            else:
+                for r in range(self.rows + 2):
+                    dr = abs(r - gr)
+                    h.extend([(dr + abs(c - gc)) * scale for c in range(self.stride)])
+            self._heuristics[key] = h
+        return h
+
+    def search(self, cost, start, goal, offsets, lazy=True, integer=False, scale=1, h=None):
+        """
+        A*（預設曼哈頓啟發式），回傳 start 到 goal 的節點編號串列（含兩端），找不到回傳 None
+
+        - cost: 含邊框的一維代價表，cost[v] 為進入 v 的代價，0 表示不可通行
+        - offsets: 四個鄰居方向的編號差（展開順序）
+        - lazy=True：改善時重複推入 heap，展開過的節點略過（標準 A*）
+        - lazy=False：每個節點在 heap 中最多一筆，已在 open set 時只更新 g 不重新排序
+          （與 PathPlanner.find_path 原本的 open_set_hash 行為相同）
+        - integer: 代價全為整數；heap 改存 f * size + 節點 的單一整數（比 tuple 快，平手順序相同）
+        - scale: 代價相對於一步的倍數（整數化代價時用），啟發式會乘上同樣倍數
+        - h: 自訂的啟發式表（含邊框的一維、已乘上 scale，例如 ALT 地標啟發式）；integer 時必須是整數
+        """
+        if start != goal and not cost[goal]:
+            self.expanded = 0
+            return None   # 目標不可進入：不必把整個連通區域搜完才知道到不了
+        self.generation += 1
+        gen = self.generation
+        self.g[start] = 0
+        self.seen[start] = gen
+        self.parent[start] = -1
+        self.marked[start] = 0 if lazy else gen
+        if h is None:
+            h = self.heuristic(goal, scale)
+
+        # 四種模式各一個迴圈：熱迴圈裡不做模式判斷，四個方向展開成固定的 tuple
+        if lazy:
+            loop = self._lazy_int if integer else self._lazy_float
+        else:
+            loop = self._open_int if integer else self._open_float
+        found = loop(cost, start, goal, tuple(offsets), h, gen)
+        return self._path(start, goal) if found else None
+
+    def _lazy_int(self, cost, start, goal, offsets, h, gen):
+        g, parent, seen, marked = self.g, self.parent, self.seen, self.marked
+        size = self.size
+        o0, o1, o2, o3 = offsets
+        heappush, heappop = heapq.heappush, heapq.heappop
+        heap = [start]
+        expanded = 0
+        while heap:
+            u = heappop(heap) % size
+            if marked[u] == gen:
+                continue
+            marked[u] = gen
+            if u == goal:
+                self.expanded = expanded
+                return True
+            expanded += 1
+            gu = g[u]
+            for v in (u + o0, u + o1, u + o2, u + o3):
+                c = cost[v]
+                if c:
+                    ng = gu + c
+                    if seen[v] != gen or ng < g[v]:
+                        g[v] = ng
+                        seen[v] = gen
+                        parent[v] = u
+                        heappush(heap, (ng + h[v]) * size + v)
+        self.expanded = expanded
+        return False
+
+    def _lazy_float(self, cost, start, goal, offsets, h, gen):
+        g, parent, seen, marked = self.g, self.parent, self.seen, self.marked
+        o0, o1, o2, o3 = offsets
+        heappush, heappop = heapq.heappush, heapq.heappop
+        heap = [(0, start)]
+        expanded = 0
+        while heap:
+            u = heappop(heap)[1]
+            if marked[u] == gen:
+                continue
+            marked[u] = gen
+            if u == goal:
+                self.expanded = expanded
+                return True
+            expanded += 1
+            gu = g[u]
+            for v in (u + o0, u + o1, u + o2, u + o3):
+                c = cost[v]
+                if c:
+                    ng = gu + c
+                    if seen[v] != gen or ng < g[v]:
+                        g[v] = ng
+                        seen[v] = gen
+                        parent[v] = u
+                        heappush(heap, (ng + h[v], v))
+        self.expanded = expanded
+        return False
+
+    def _open_int(self, cost, start, goal, offsets, h, gen):
+        g, parent, seen, in_open = self.g, self.parent, self.seen, self.marked
+        size = self.size
+        o0, o1, o2, o3 = offsets
+        heappush, heappop = heapq.heappush, heapq.heappop
+        heap = [start]
+        expanded = 0
+        while heap:
+            u = heappop(heap) % size
+            in_open[u] = 0
+            if u == goal:
+                self.expanded = expanded
+                return True
+            expanded += 1
+            gu = g[u]
+            for v in (u + o0, u + o1, u + o2, u + o3):
+                c = cost[v]
+                if c:
+                    ng = gu + c
+                    if seen[v] != gen or ng < g[v]:
+                        g[v] = ng
+                        seen[v] = gen
+                        parent[v] = u
+                        if in_open[v] != gen:
+                            heappush(heap, (ng + h[v]) * size + v)
+                            in_open[v] = gen
+        self.expanded = expanded
+        return False
+
+    def _open_float(self, cost, start, goal, offsets, h, gen):
+        g, parent, seen, in_open = self.g, self.parent, self.seen, self.marked
+        o0, o1, o2, o3 = offsets
+        heappush, heappop = heapq.heappush, heapq.heappop
+        heap = [(0, start)]
+        expanded = 0
+        while heap:
+            u = heappop(heap)[1]
+            in_open[u] = 0
+            if u == goal:
+                self.expanded = expanded
+                return True
+            expanded += 1
+            gu = g[u]
+            for v in (u + o0, u + o1, u + o2, u + o3):
+                c = cost[v]
+                if c:
+                    ng = gu + c
+                    if seen[v] != gen or ng < g[v]:
+                        g[v] = ng
+                        seen[v] = gen
+                        parent[v] = u
+                        if in_open[v] != gen:
+                            heappush(heap, (ng + h[v], v))
+                            in_open[v] = gen
+        self.expanded = expanded
+        return False
+
+    def search_bidirectional(self, cost, start, goal, offsets, h_goal, h_start):
+        """
+        雙向 A*：從 start 往前、從 goal 往後同時搜尋，每次展開兩邊 key 較小的一邊，回傳最短路徑
+        （含兩端的節點編號串列），找不到回傳 None
+
+        - h_goal / h_start: 到 goal、從 start 出發的一致啟發式表（含邊框的一維）；
+          兩邊用平均位能 ±(h_goal - h_start) / 2，key 乘 2 保持整數
+        - 兩邊最小 key 相加不小於目前最佳相接路徑代價的 2 倍時結束
+        - 反向邊 u -> v（往後搜尋從 u 退到 v）的代價是進入 u 的代價；起點本身不可通行也可以退到
+        """
+        if start == goal:
+            self.expanded = 0
+            return [start]
+        if not cost[goal]:
+            self.expanded = 0
+            return None
+        if getattr(self, "_back", None) is None:
+            self._back = ([0] * self.size, [-1] * self.size, [0] * self.size, [0] * self.size)
+        gb, parentb, seenb, markedb = self._back
+        self.generation += 1
+        gen = self.generation
+        g, parent, seen, marked = self.g, self.parent, self.seen, self.marked
+        g[start] = 0
+        seen[start] = gen
+        parent[start] = -1
+        gb[goal] = 0
+        seenb[goal] = gen
+        parentb[goal] = -1
+        heappush, heappop = heapq.heappush, heapq.heappop
+        forward = [(h_goal[start] - h_start[start], start)]
+        backward = [(h_start[goal] - h_goal[goal], goal)]
+        best = None
+        meet = -1
+        expanded = 0
+        while forward and backward:
+            if best is not None and forward[0][0] + backward[0][0] >= 2 * best:
+                break
+            if forward[0][0] <= backward[0][0]:
+                u = heappop(forward)[1]
+                if marked[u] == gen:
+                    continue
+                marked[u] = gen
+                expanded += 1
+                gu = g[u]
+                for o in offsets:
+                    v = u + o
+                    c = cost[v]
+                    if c:
+                        ng = gu + c
+                        if seen[v] != gen or ng < g[v]:
+                            g[v] = ng
+                            seen[v] = gen
+                            parent[v] = u
+                            heappush(forward, (2 * ng + h_goal[v] - h_start[v], v))
+                            if seenb[v] == gen and (best is None or ng + gb[v] < best):
+                                best = ng + gb[v]
+                                meet = v
+            else:
+                u = heappop(backward)[1]
+                if markedb[u] == gen:
+                    continue
+                markedb[u] = gen
+                if not cost[u]:
+                    continue  # 不可通行的起點：只能當路徑的開頭，不再往後退
+                expanded += 1
+                ng = gb[u] + cost[u]
+                for o in offsets:
+                    v = u + o
+                    if cost[v] or v == start:
+                        if seenb[v] != gen or ng < gb[v]:
+                            gb[v] = ng
+                            seenb[v] = gen
+                            parentb[v] = u
+                            heappush(backward, (2 * ng + h_start[v] - h_goal[v], v))
+                            if seen[v] == gen and (best is None or g[v] + ng < best):
+                                best = g[v] + ng
+                                meet = v
+        self.expanded = expanded
+        if best is None:
+            return None
+        path = self._path(start, meet)
+        node = meet
+        while parentb[node] != -1:
+            node = parentb[node]
+            path.append(node)
+        return path
+
+    def search_tree(self, cost, source, targets, offsets, integer=False):
+        """
+        從 source 反向 Dijkstra：g[v] 為 v 走到 source 的代價，parent[v] 為往 source 的下一格
+        targets 全部確定最短距離後提前結束；回傳本次搜尋的世代（用 tree_path 取路徑）
+        - 反向邊 v -> u 的代價是進入 u 的代價 cost[u]，不可通行的 v 不會被展開
+        """
+        self.generation += 1
+        gen = self.generation
+        g, parent, seen, marked = self.g, self.parent, self.seen, self.marked
+        size = self.size
+        g[source] = 0
+        seen[source] = gen
+        parent[source] = -1
+        remaining = set(targets)
+        remaining.discard(source)
+        heappush, heappop = heapq.heappush, heapq.heappop
+        heap = [source] if integer else [(0, source)]
+        expanded = 0
+        while heap and remaining:
+            u = heappop(heap) % size if integer else heappop(heap)[1]
+            if marked[u] == gen:
+                continue
+            marked[u] = gen
+            remaining.discard(u)
+            expanded += 1
+            ng = g[u] + cost[u]
+            for o in offsets:
+                v = u + o
+                if cost[v] and (seen[v] != gen or ng < g[v]):
+                    g[v] = ng
+                    seen[v] = gen
+                    parent[v] = u
+                    heappush(heap, ng * size + v if integer else (ng, v))
+        self.expanded = expanded
+        return gen
+
+    def tree_path(self, gen, node):
+        """search_tree 之後，從 node 沿 parent 走到 source 的節點編號串列（含兩端）；到不了回傳 None"""
+        if self.seen[node] != gen:
+            return None
+        parent = self.parent
+        path = [node]
+        while parent[node] != -1:
+            node = parent[node]
+            path.append(node)
+        return path
+
+    def _path(self, start, goal):
+        parent = self.parent
+        path = [goal]
+        cur = goal
+        while cur != start:
+            cur = parent[cur]
+            path.append(cur)
+        path.reverse()
+        return path
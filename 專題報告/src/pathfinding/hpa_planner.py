@@ -0,0 +1,280 @@
+import heapq
+from collections import deque
+
+from .dynamic_path_planner import DynamicPathPlanner
+
+# 地圖格數達到這個數量時，UnitySimulationServer 改用分層規劃
+HIERARCHICAL_MIN_CELLS = 250_000
+
+
+class HierarchicalPathPlanner(DynamicPathPlanner):
+    def __init__(self, grid_map, crowd_weight=0.5, replanning_threshold=0.5, cluster_size=16):
+        """
+        HPA* 分層路徑規劃器（大型樓層用）
+
+        參數:
+        - cluster_size: 每個區塊的邊長（格）
+
+        - 地圖切成 cluster_size x cluster_size 的區塊，相鄰區塊邊界上每一段連續可通行的
+          開口取中間一格當入口；抽象圖的節點是入口，邊是區塊內入口之間的距離（單位代價）
+          與跨邊界的一步
+        - 查詢時只把起點、終點接到所在區塊的入口，在抽象圖上 A*，再把每一段展開成格子路徑
+        - 區塊資料在第一次用到時才建立；通行層改變時只丟掉受影響的區塊（與相鄰邊界）
+        - 抽象層不計擁擠度；擁擠造成的重規劃仍由 should_replan 判斷
+        """
+        super().__init__(grid_map, crowd_weight, replanning_threshold)
+        self.cluster_size = cluster_size
+        self.clusters = {}  # 區塊 -> {"entrances", "edges", "segments"}
+        self.borders = {}   # (區塊, 右/下方區塊) -> [(本側格子, 對側格子), ...]
+
+    def cluster_of(self, node):
+        return node[0] // self.cluster_size, node[1] // self.cluster_size
+
+    def _cluster_bounds(self, cluster):
+        c = self.cluster_size
+        x0, y0 = cluster[0] * c, cluster[1] * c
+        return x0, min(x0 + c, self.height), y0, min(y0 + c, self.width)
+
+    def _neighbor_clusters(self, cluster):
+        ci, cj = cluster
+        for ni, nj in ((ci, cj + 1), (ci + 1, cj), (ci, cj - 1), (ci - 1, cj)):
+            if 0 <= ni * self.cluster_size < self.height and 0 <= nj * self.cluster_size < self.width:
+                yield ni, nj
+
+    def on_cell_changed(self, node):
+        super().on_cell_changed(node)
+        # 格子所在區塊的區塊內距離失效；在區塊邊緣時，相鄰區塊的入口也可能改變
+        cluster = self.cluster_of(node)
+        self.clusters.pop(cluster, None)
+        x0, x1, y0, y1 = self._cluster_bounds(cluster)
+        x, y = node
+        for other in self._neighbor_clusters(cluster):
+            di, dj = other[0] - cluster[0], other[1] - cluster[1]
+            on_edge = ((dj == 1 and y == y1 - 1) or (dj == -1 and y == y0) or
+                       (di == 1 and x == x1 - 1) or (di == -1 and x == x0))
+            if on_edge:
+                self.borders.pop(min(cluster, other) + max(cluster, other), None)
+                self.clusters.pop(other, None)
+
+    def _border(self, a, b):
+        """區塊 a、b（b 在 a 的右方或下方）之間的入口配對"""
+        key = a + b
+        pairs = self.borders.get(key)
+        if pairs is not None:
+            return pairs
+
+        x0, x1, y0, y1 = self._cluster_bounds(a)
+        if b[1] > a[1]:
+            cells = [((x, y1 - 1), (x, y1)) for x in range(x0, x1)]
+        else:
+            cells = [((x1 - 1, y), (x1, y)) for y in range(y0, y1)]
+
+        # 每一段兩側都可通行的連續開口取中間一格
+        pairs = []
+        run = []
+        for pair in cells + [None]:
+            if pair is not None and self.passable[pair[0]] and self.passable[pair[1]]:
+                run.append(pair)
+            elif run:
+                pairs.append(run[len(run) // 2])
+                run = []
+        self.borders[key] = pairs
+        return pairs
+
+    def _frame(self, cluster):
+        """區塊的含邊框可通行表（一維），區塊內 BFS 不需要邊界判斷"""
+        x0, x1, y0, y1 = self._cluster_bounds(cluster)
+        stride = y1 - y0 + 2
+        free = [False] * stride
+        for row in self.passable[x0:x1, y0:y1].tolist():
+            free.append(False)
+            free.extend(row)
+            free.append(False)
+        free.extend([False] * stride)
+        return free, stride, x0, y0
+
+    def _local_search(self, frame, source, targets=()):
+        """
+        在區塊內從 source 做 BFS，回傳 (targets 中到得了的距離, 前一格表)
+        targets 全部找到就提前結束
+        """
+        free, stride, x0, y0 = frame
+        ids = {t: (t[0] - x0 + 1) * stride + t[1] - y0 + 1 for t in targets}
+        s = (source[0] - x0 + 1) * stride + source[1] - y0 + 1
+        dist = [-1] * len(free)
+        parent = [-1] * len(free)
+        dist[s] = 0
+        remaining = len(set(ids.values()) - {s})
+        wanted = set(ids.values())
+        queue = deque([s])
+        offsets = (1, stride, -1, -stride)
+        while queue and remaining:
+            u = queue.popleft()
+            d = dist[u] + 1
+            for v in (u + offsets[0], u + offsets[1], u + offsets[2], u + offsets[3]):
+                if free[v] and dist[v] < 0:
+                    dist[v] = d
+                    parent[v] = u
+                    queue.append(v)
+                    if v in wanted:
+                        remaining -= 1
+        found = {t: dist[i] for t, i in ids.items() if dist[i] >= 0}
+        return found, parent
+
+    def _local_path(self, frame, parent, source, target):
+        """沿 BFS 的前一格表從 target 走回 source，回傳 source 之後到 target 的格子"""
+        _, stride, x0, y0 = frame
+        s = (source[0] - x0 + 1) * stride + source[1] - y0 + 1
+        v = (target[0] - x0 + 1) * stride + target[1] - y0 + 1
+        path = []
+        while v != s:
+            r, c = divmod(v, stride)
+            path.append((r - 1 + x0, c - 1 + y0))
+            v = parent[v]
+        path.reverse()
+        return path
+
+    def _cluster(self, cluster):
+        """取得區塊的抽象圖資料（沒有或已失效時重建）"""
+        data = self.clusters.get(cluster)
+        if data is not None:
+            return data
+
+        links = {}  # 入口 -> 對側格子
+        for other in self._neighbor_clusters(cluster):
+            if other > cluster:
+                for mine, theirs in self._border(cluster, other):
+                    links.setdefault(mine, []).append(theirs)
+            else:
+                for theirs, mine in self._border(other, cluster):
+                    links.setdefault(mine, []).append(theirs)
+
+        frame = self._frame(cluster)
+        entrances = sorted(links)
+        edges = {}
+        for e in entrances:
+            dist, _ = self._local_search(frame, e, entrances)
+            edges[e] = [(o, d) for o, d in dist.items() if o != e]
+            edges[e].extend((t, 1) for t in links[e])
+
+        data = {"entrances": entrances, "edges": edges, "segments": {}, "frame": frame}
+        self.clusters[cluster] = data
+        return data
+
+    def _segment(self, a, b):
+        """把同一區塊內 a → b 的抽象邊展開成格子（不含 a），同一區塊版本內快取"""
+        if abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1:
+            return [b]
+        data = self._cluster(self.cluster_of(a))
+        path = data["segments"].get((a, b))
+        if path is None:
+            _, parent = self._local_search(data["frame"], a, [b])
+            path = self._local_path(data["frame"], parent, a, b)
+            data["segments"][(a, b)] = path
+        return path
+
+    def find_abstract_path(self, start, goal):
+        """在抽象圖上搜尋，回傳經過的入口串列（含起點與終點）；找不到回傳 None"""
+        result = self._abstract_search(start, goal)
+        return result[0] if result is not None else None
+
+    def _abstract_search(self, start, goal):
+        """回傳 (抽象路徑, 起點區塊 BFS 的 parent, 終點區塊 BFS 的 parent)"""
+        if not (self._in_bounds(start) and self._in_bounds(goal)):
+            return None
+        if start == goal:
+            return [start], None, None  # 與一般 A* 相同：起點即終點時不看是否可通行
+        if not self.passable[goal]:
+            return None
+        if not self.passable[start]:
+            return None  # 起點不可通行時沒有對應的入口，由 find_path 改用一般 A*
+
+        start_cluster = self.cluster_of(start)
+        goal_cluster = self.cluster_of(goal)
+
+        # 起點、終點接到所在區塊的入口（同一區塊時也可能直接相連）
+        start_data = self._cluster(start_cluster)
+        start_targets = list(start_data["entrances"])
+        if goal_cluster == start_cluster:
+            start_targets.append(goal)
+        dist, start_parent = self._local_search(start_data["frame"], start, start_targets)
+        start_edges = [(t, d) for t, d in dist.items() if t != start]
+        # 起點本身是入口時，跨邊界的那一步也要保留
+        start_edges += start_data["edges"].get(start, [])
+        goal_data = self._cluster(goal_cluster)
+        goal_links, goal_parent = self._local_search(goal_data["frame"], goal,
+                                                     goal_data["entrances"])
+
+        gx, gy = goal
+        g = {start: 0}
+        parent = {start: None}
+        closed = set()
+        # f 相同時先展開離終點近的（網格上同 f 的節點非常多，不這樣會展開整張圖）
+        h = abs(start[0] - gx) + abs(start[1] - gy)
+        heap = [(h, h, start)]
+        while heap:
+            _, _, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            closed.add(u)
+            if u == goal:
+                break
+            if u == start:
+                edges = start_edges
+            else:
+                edges = self._cluster(self.cluster_of(u))["edges"].get(u, [])
+                if u in goal_links:
+                    edges = edges + [(goal, goal_links[u])]
+            gu = g[u]
+            for v, d in edges:
+                ng = gu + d
+                if v not in g or ng < g[v]:
+                    g[v] = ng
+                    parent[v] = u
+                    h = abs(v[0] - gx) + abs(v[1] - gy)
+                    heapq.heappush(heap, (ng + h, h, v))
+        else:
+            return None
+
+        return [start] + _follow(parent, goal), start_parent, goal_parent
+
+    def find_paths(self, starts, goal):
+        """大型地圖上反向 Dijkstra 會走遍整張圖，改為逐一分層搜尋（共用區塊資料與路徑快取）"""
+        return [self.find_path(start, goal) for start in starts]
+
+    def _search_path(self, start, goal):
+        """分層 A*：抽象圖搜尋後逐段展開成格子路徑（包含起點與終點）"""
+        if self._in_bounds(start) and not self.passable[start] and start != goal:
+            return super()._search_path(start, goal)
+        result = self._abstract_search(start, goal)
+        if result is None:
+            return None
+        abstract, start_parent, goal_parent = result
+        if len(abstract) == 1:
+            return abstract
+
+        start_frame = self._cluster(self.cluster_of(start))["frame"]
+        goal_frame = self._cluster(self.cluster_of(goal))["frame"]
+        path = [start]
+        last = len(abstract) - 2
+        for i, (a, b) in enumerate(zip(abstract, abstract[1:])):
+            if i == 0 and abs(a[0] - b[0]) + abs(a[1] - b[1]) != 1:
+                # 起點那一段用剛才的 BFS
+                path.extend(self._local_path(start_frame, start_parent, start, b))
+            elif i == last and abs(a[0] - b[0]) + abs(a[1] - b[1]) != 1:
+                # 終點那一段：從終點做的 BFS 反向走
+                back = self._local_path(goal_frame, goal_parent, goal, a)
+                path.extend(reversed(back[:-1]))
+                path.append(b)
+            else:
+                path.extend(self._segment(a, b))
+        return path
+
+def _follow(parent, node):
+    """沿 parent 從 node 走回起點，回傳起點之後到 node 的路徑（不含起點）"""
+    path = []
+    while parent[node] is not None:
+        path.append(node)
+        node = parent[node]
+    path.reverse()
+    return path
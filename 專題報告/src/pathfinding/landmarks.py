@@ -0,0 +1,111 @@
+from collections import OrderedDict, deque
+
+import numpy as np
+
+
+class LandmarkHeuristic:
+    def __init__(self, planner, count=4, table_cache_size=16):
+        """
+        ALT（A*, Landmarks, Triangle inequality）啟發式
+
+        參數:
+        - planner: PathPlanner（讀取它的通行層與 A* 核心的編號方式）
+        - count: 地標數量
+        - table_cache_size: 快取幾個目標的啟發式表
+
+        - 地標用最遠點法挑選（每個新地標離已選地標越遠越好），各做一次單位代價 BFS 記下距離
+        - h(v) = max(曼哈頓距離, max_L |d(L, t) - d(L, v)|)，乘上代價倍數；
+          每步代價至少 1（擁擠度只會增加代價），所以在擁擠度代價下仍可採納且一致
+        - 格子被封時舊的距離表仍是下界（只是變鬆），不重建；格子變成可通行才重建
+        """
+        self.planner = planner
+        self.count = count
+        self.table_cache_size = table_cache_size
+        search = planner.grid_search
+        self.stride = search.stride
+        self.size = search.size
+        rows, cols = np.divmod(np.arange(self.size), self.stride)
+        self._rows = rows
+        self._cols = cols
+        self.landmarks = []     # 地標的節點編號
+        self.distances = None   # (地標數, 節點數) 的單位代價距離，到不了為 unreachable
+        self.unreachable = 2 * self.size
+        self.stale = True
+        self._tables = OrderedDict()  # (節點, 倍數) -> 啟發式表
+
+    def cell_changed(self, node, passable):
+        """通行層某格改變時呼叫：變成可通行時距離可能變短，下次查詢前重建"""
+        if passable:
+            self.stale = True
+            self._tables.clear()
+
+    def _free(self):
+        """含邊框的一維可通行表"""
+        free = [False] * self.stride
+        for row in self.planner.passable.tolist():
+            free.append(False)
+            free.extend(row)
+            free.append(False)
+        free.extend([False] * self.stride)
+        return free
+
+    def _bfs(self, free, source):
+        dist = [self.unreachable] * self.size
+        dist[source] = 0
+        queue = deque([source])
+        offsets = self.planner._offsets
+        while queue:
+            u = queue.popleft()
+            d = dist[u] + 1
+            for o in offsets:
+                v = u + o
+                if free[v] and dist[v] == self.unreachable:
+                    dist[v] = d
+                    queue.append(v)
+        return dist
+
+    def build(self):
+        """重新挑選地標並計算距離表"""
+        free = self._free()
+        self.landmarks = []
+        self.distances = None
+        self._tables.clear()
+        self.stale = False
+        seed = next((v for v, ok in enumerate(free) if ok), None)
+        if seed is None or self.count <= 0:
+            return
+
+        # 最遠點法：第一個地標是離任一格最遠的格子，之後每次取離已選地標最近距離最大的格子
+        nearest = np.array(self._bfs(free, seed))
+        nearest[nearest == self.unreachable] = -1
+        rows = []
+        for _ in range(self.count):
+            landmark = int(np.argmax(nearest))
+            if nearest[landmark] <= 0 and rows:
+                break
+            dist = np.array(self._bfs(free, landmark))
+            self.landmarks.append(landmark)
+            rows.append(dist)
+            nearest = np.minimum(nearest, np.where(dist == self.unreachable, -1, dist))
+        self.distances = np.array(rows)
+
+    def table(self, node, scale=1):
+        """到 node 的啟發式表（含邊框的一維串列，值已乘上 scale）"""
+        if self.stale:
+            self.build()
+        key = (node, scale)
+        table = self._tables.get(key)
+        if table is not None:
+            self._tables.move_to_end(key)
+            return table
+
+        r, c = divmod(node, self.stride)
+        h = np.abs(self._rows - r) + np.abs(self._cols - c)
+        if self.distances is not None:
+            alt = np.abs(self.distances - self.distances[:, node:node + 1]).max(axis=0)
+            h = np.maximum(h, alt)
+        table = (h * scale).tolist()
+        self._tables[key] = table
+        if len(self._tables) > self.table_cache_size:
+            self._tables.popitem(last=False)
+        return table
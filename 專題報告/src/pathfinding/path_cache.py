@@ -0,0 +1,79 @@
+from collections import OrderedDict
+
+
+class PathCache:
+    """
+    有上限的 LRU 路徑快取
+    - key 由呼叫端決定（起點、終點、通行類別、擁擠度 bucket ...），value 為路徑（找不到為 None）
+    - 另外記錄「格子 -> 經過它的 key」，格子被封（block）時只丟掉經過該格的路徑；
+      沒經過的路徑不受影響，仍是最短路徑
+    - 格子被解除（clear）可能出現新的捷徑，呼叫 clear() 全部丟掉
+    - put 時可附上 tag（例如規劃當下路線上的擁擠程度），lookup 時由 accept(路徑, tag)
+      決定是否沿用；不沿用就丟掉該筆並算未命中
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()   # key -> path
+        self.tags = {}                 # key -> put 時附上的 tag
+        self.by_cell = {}              # 格子 -> 經過它的 key 集合
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def lookup(self, key, accept=None):
+        """回傳 (是否命中, 路徑)，命中時更新 LRU 順序（找不到路徑的結果 None 也會快取）"""
+        if key in self.entries and accept is not None and not accept(self.entries[key], self.tags[key]):
+            self._remove(key)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return True, self.entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, path, tag=None):
+        if self.maxsize <= 0:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = path
+        self.tags[key] = tag
+        for cell in path or ():
+            self.by_cell.setdefault(cell, set()).add(key)
+        while len(self.entries) > self.maxsize:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        path = self.entries.pop(key)
+        del self.tags[key]
+        for cell in path or ():
+            keys = self.by_cell.get(cell)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_cell[cell]
+
+    def invalidate_cell(self, cell):
+        """格子變成不可通行：丟掉經過它的路徑"""
+        for key in list(self.by_cell.get(cell, ())):
+            self._remove(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.tags.clear()
+        self.by_cell.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self.entries),
+        }
@@ -1,37 +1,79 @@
-import heapq
 import numpy as np
 
+from .crowd_density import CrowdDensityField
+from .grid_search import GridSearch
+from .landmarks import LandmarkHeuristic
+from .path_cache import PathCache
+
+# 整數化搜尋代價的倍數（擁擠度 kernel 權重是 2^-20 的整數倍，乘上權重 0.5 後為 2^-21 的倍數）
+SEARCH_COST_SCALE = 2 ** 21
+
 class PathPlanner:
-    def __init__(self, grid_map, crowd_weight=0.5):
+    def __init__(self, grid_map, crowd_weight=0.5, cache_size=1024, landmarks=0,
+                 bidirectional=False, route_tolerance=1.0):
         """
         初始化路徑規劃器
         
         參數:
         - grid_map: 2D網格地圖，0表示可通行，1表示障礙物
         - crowd_weight: 擁擠度權重係數
+        - cache_size: find_path 結果快取上限（0 = 不快取）
+        - landmarks: ALT 地標數量（0 = 只用曼哈頓距離）；牆多、繞路長的地圖上啟發式準很多
+        - bidirectional: 改用雙向 A*（結果一定是最短路徑）
+        - route_tolerance: 快取的路線擁擠代價比規劃時增加超過這個值（一步的代價為 1）才重新搜尋；
+          None 表示只在擁擠度沒變時沿用，且通行層任何改變都清空快取，
+          結果與不用快取逐位元相同，與先前規劃過哪些路徑無關
         """
         self.grid_map = grid_map
-        self.crowd_density = np.zeros_like(grid_map, dtype=float)  # 初始化擁擠度地圖
+        self.crowd = CrowdDensityField(grid_map.shape)  # 擁擠度引擎（kernel 只算一次）
+        self.crowd_density = self.crowd.density  # 擁擠度地圖（原地更新）
         self.crowd_weight = crowd_weight
         self.height, self.width = grid_map.shape
+        # 有效通行層：地圖 + 動態障礙物，原地維護，搜尋直接讀取
+        self.passable = (grid_map == 0)
+        self.map_version = 0  # 通行層每次改變就 +1
         
-    def update_crowd_density(self, positions):
-        """更新擁擠度地圖"""
-        # 重置擁擠度地圖
-        self.crowd_density = np.zeros_like(self.grid_map, dtype=float)
+        # A* 核心（g / parent 緩衝區跨搜尋重複使用）
+        self.grid_search = GridSearch(self.height, self.width)
+        self._offsets = self.grid_search.offsets([(0, 1), (1, 0), (0, -1), (-1, 0)])
+        self._search_costs = None
+        self._search_costs_key = None
+        self.landmarks = LandmarkHeuristic(self, landmarks) if landmarks else None
+        self.bidirectional = bidirectional
+        
+        # find_path 結果快取：key 為 (起點, 終點, 權重)，擁擠度變了就看路線上的擁擠代價（_route_still_good）；
+        # 障礙物只讓經過該格的路徑失效，障礙物移除時全部清空
+        self.path_cache = PathCache(cache_size)
+        self.route_tolerance = route_tolerance
         
-        # 根據當前人員位置更新擁擠度
-        for x, y in positions:
-            if 0 <= x < self.height and 0 <= y < self.width:
-                # 在位置周圍增加擁擠度
-                for dx in range(-3, 4):
-                    for dy in range(-3, 4):
-                        nx, ny = x + dx, y + dy
-                        if 0 <= nx < self.height and 0 <= ny < self.width:
-                            # 距離越近，擁擠度越高
-                            distance = np.sqrt(dx**2 + dy**2)
-                            if distance > 0:
-                                self.crowd_density[nx, ny] += 1.0 / distance
+    def update_crowd_density(self, positions):
+        """更新擁擠度地圖（只重算人數有變動的格子）"""
+        self.crowd.update(positions)
+    
+    def set_cell(self, node, value):
+        """修改地圖格子（0 可通行、1 障礙物）並同步有效通行層"""
+        self.grid_map[node] = value
+        self._refresh_passable(node)
+    
+    def _refresh_passable(self, node):
+        passable = self.grid_map[node] == 0
+        if self.passable[node] != passable:
+            self.passable[node] = passable
+            self.map_version += 1
+            self.on_cell_changed(node)
+    
+    def on_cell_changed(self, node):
+        """有效通行層某格改變時呼叫（子類別覆寫時要呼叫 super() 以同步路徑快取）"""
+        if self.passable[node] or self.route_tolerance is None:
+            self.path_cache.clear()  # 多了可走的格子，任何路徑都可能有新捷徑
+        else:
+            self.path_cache.invalidate_cell(node)
+        if self.landmarks is not None:
+            self.landmarks.cell_changed(node, self.passable[node])
+    
+    def move_crowd(self, old_positions, new_positions):
+        """只對有移動的人增量更新擁擠度"""
+        self.crowd.move(old_positions, new_positions)
     
     def heuristic(self, a, b):
         """計算兩點之間的曼哈頓距離"""
@@ -47,7 +89,7 @@ class PathPlanner:
         for dx, dy in directions:
             nx, ny = x + dx, y + dy
             if (0 <= nx < self.height and 0 <= ny < self.width and 
-                self.grid_map[nx, ny] == 0):  # 確保是可通行區域
+                self.passable[nx, ny]):  # 確保是可通行區域
                 neighbors.append((nx, ny))
                 
         return neighbors
@@ -62,42 +104,153 @@ class PathPlanner:
         
         return base_cost + crowd_cost
     
+    def entering_cost(self, node):
+        """進入某格的代價（障礙物為 inf），與 calculate_cost 一致"""
+        if not self.passable[node]:
+            return float('inf')
+        return 1.0 + self.crowd_density[node] * self.crowd_weight
+    
+    def entering_costs(self):
+        """每格進入代價的一維陣列（row-major，障礙物為 inf）"""
+        cost = 1.0 + self.crowd_density * self.crowd_weight
+        cost[~self.passable] = np.inf
+        return cost.reshape(-1)
+    
+    def search_costs(self):
+        """
+        A* 核心用的含邊框代價表（通行層或擁擠度改變時才重建）
+        回傳 (代價表, 是否整數, 倍數)：代價乘上 2^21 剛好都是整數時（擁擠度權重量化過、
+        crowd_weight 為 0.5 這類二進位小數）改用整數代價，搜尋較快且結果完全相同
+        """
+        key = (self.map_version, self.crowd.version, self.crowd_weight)
+        if self._search_costs_key != key:
+            cost = np.zeros((self.height + 2, self.width + 2))
+            cost[1:-1, 1:-1] = np.where(self.passable,
+                                        1.0 + self.crowd_density * self.crowd_weight, 0.0)
+            scaled = cost * SEARCH_COST_SCALE
+            if np.array_equal(scaled, np.floor(scaled)) and scaled.max() < 2.0 ** 40:
+                self._search_costs = (scaled.astype(np.int64).reshape(-1).tolist(), True,
+                                      SEARCH_COST_SCALE)
+            else:
+                self._search_costs = (cost.reshape(-1).tolist(), False, 1)
+            self._search_costs_key = key
+        return self._search_costs
+    
     def find_path(self, start, goal):
-        """使用改進的A*算法尋找路徑"""
-        open_set = []
-        heapq.heappush(open_set, (0, start))
+        """尋找路徑（包含起點與終點），結果經過路徑快取；回傳的串列可能與其他人共用，不要修改"""
+        key = (start, goal, self.crowd_weight)
+        hit, path = self.path_cache.lookup(key, self._route_still_good)
+        if not hit:
+            path = self._search_path(start, goal)
+            self.path_cache.put(key, path, self._route_tag(path))
+        return path
+    
+    def _route_crowd_cost(self, path):
+        """路徑上（不含起點）目前的擁擠代價總和"""
+        if path is None or len(path) < 2:
+            return 0.0
+        xs, ys = np.asarray(path[1:]).T
+        return float(self.crowd_density[xs, ys].sum()) * self.crowd_weight
+    
+    def _route_tag(self, path):
+        return self.crowd.version, self._route_crowd_cost(path)
+    
+    def _route_still_good(self, path, tag):
+        """擁擠度沒變，或路線上的擁擠代價比規劃時增加不超過 route_tolerance，就沿用快取的路徑"""
+        version, cost = tag
+        if version == self.crowd.version:
+            return True
+        return self.route_tolerance is not None and self._route_crowd_cost(path) <= cost + self.route_tolerance
+    
+    def find_paths(self, starts, goal):
+        """
+        多個起點到同一目標的批次規劃：從目標做一次反向 Dijkstra，所有起點共用同一棵最短路徑樹
+        
+        參數:
+        - starts: 起點串列
+        - goal: 共同目標
         
-        came_from = {}
-        g_score = {start: 0}
-        f_score = {start: self.heuristic(start, goal)}
+        回傳與 starts 對應的路徑串列（每條含起點與終點，找不到為 None），結果同樣放進路徑快取
+        """
+        paths = [None] * len(starts)
+        pending = {}  # 起點 -> 在 starts 中的索引
+        for i, start in enumerate(starts):
+            hit, path = self.path_cache.lookup((start, goal, self.crowd_weight), self._route_still_good)
+            if hit:
+                paths[i] = path
+            else:
+                pending.setdefault(start, []).append(i)
+        if not pending:
+            return paths
+        
+        for start, path in self._search_paths(list(pending), goal).items():
+            self.path_cache.put((start, goal, self.crowd_weight), path, self._route_tag(path))
+            for i in pending[start]:
+                paths[i] = path
+        return paths
+    
+    def _search_paths(self, starts, goal):
+        """find_paths 的反向搜尋本體，回傳 起點 -> 路徑"""
+        search = self.grid_search
+        result = {start: None for start in starts}
+        if not search.in_bounds(*goal):
+            return result
+        if goal in result:
+            result[goal] = [goal]  # 與 find_path 相同：起點就是目標時不看可否通行
+        if not self.passable[goal]:
+            return result
         
-        open_set_hash = {start}
+        # 不可通行的起點（例如剛被設成障礙物的位置）由它的可通行鄰格接上
+        targets = {}
+        for start in starts:
+            if not search.in_bounds(*start) or start == goal:
+                continue
+            node = search.node(*start)
+            if self.passable[start]:
+                targets[start] = (node, [node])
+            else:
+                targets[start] = (node, [node + o for o in self._offsets])
         
-        while open_set:
-            _, current = heapq.heappop(open_set)
-            open_set_hash.remove(current)
-            
-            if current == goal:
-                # 重建路徑
-                path = []
-                while current in came_from:
-                    path.append(current)
-                    current = came_from[current]
-                path.append(start)
-                return path[::-1]  # 反轉路徑
-            
-            for neighbor in self.get_neighbors(current):
-                # 計算到鄰居的臨時g分數
-                temp_g_score = g_score[current] + self.calculate_cost(current, neighbor)
-                
-                # 如果找到更好的路徑
-                if neighbor not in g_score or temp_g_score < g_score[neighbor]:
-                    came_from[neighbor] = current
-                    g_score[neighbor] = temp_g_score
-                    f_score[neighbor] = temp_g_score + self.heuristic(neighbor, goal)
-                    
-                    if neighbor not in open_set_hash:
-                        heapq.heappush(open_set, (f_score[neighbor], neighbor))
-                        open_set_hash.add(neighbor)
+        cost, integer, _ = self.search_costs()
+        wanted = [n for _, nodes in targets.values() for n in nodes if cost[n]]
+        gen = search.search_tree(cost, search.node(*goal), wanted, self._offsets, integer=integer)
+        
+        for start, (node, nodes) in targets.items():
+            best, best_cost = None, None
+            for n in nodes:
+                if search.seen[n] == gen:
+                    c = search.g[n] + (cost[n] if n != node else 0)
+                    if best is None or c < best_cost:
+                        best, best_cost = n, c
+            if best is None:
+                continue
+            tree = search.tree_path(gen, best)
+            if best != node:
+                tree = [node] + tree
+            result[start] = [search.cell(n) for n in tree]
+        return result
+    
+    def heuristic_table(self, node, scale):
+        """到 node 的啟發式表（有地標時為 ALT，否則為曼哈頓距離）"""
+        if self.landmarks is not None:
+            return self.landmarks.table(node, scale)
+        return self.grid_search.heuristic(node, scale)
+    
+    def _search_path(self, start, goal):
+        """使用改進的A*算法尋找路徑（扁平索引核心，緩衝區跨搜尋重複使用）"""
+        search = self.grid_search
+        if not (search.in_bounds(*start) and search.in_bounds(*goal)):
+            return None
         
-        return None  # 沒有找到路徑
+        cost, integer, scale = self.search_costs()
+        s, t = search.node(*start), search.node(*goal)
+        if self.bidirectional:
+            path = search.search_bidirectional(cost, s, t, self._offsets,
+                                               self.heuristic_table(t, scale),
+                                               self.heuristic_table(s, scale))
+        else:
+            path = search.search(cost, s, t, self._offsets, lazy=False, integer=integer,
+                                 scale=scale, h=self.heuristic_table(t, scale))
+        if path is None:
+            return None  # 沒有找到路徑
+        return [search.cell(node) for node in path]
@@ -0,0 +1,76 @@
+def line_of_sight(passable, a, b):
+    """
+    兩格中心之間的直線是否只經過可通行格子
+
+    參數:
+    - passable: 可通行表（passable[x, y]，與 PathPlanner.passable 相同）
+    - a, b: 兩端格子 (x, y)
+
+    沿直線依序走過碰到的每一格；剛好穿過格子角落時兩側的格子都要可通行（不切牆角）
+    """
+    x, y = a
+    nx, ny = abs(b[0] - x), abs(b[1] - y)
+    sx = 1 if b[0] > x else -1
+    sy = 1 if b[1] > y else -1
+    ix = iy = 0
+    while ix < nx or iy < ny:
+        # 比較直線先碰到 x 方向還是 y 方向的格線（整數運算，沒有浮點誤差）
+        decision = (1 + 2 * ix) * ny - (1 + 2 * iy) * nx
+        if decision == 0:
+            if not (passable[x + sx, y] and passable[x, y + sy]):
+                return False
+            x += sx
+            y += sy
+            ix += 1
+            iy += 1
+        elif decision < 0:
+            x += sx
+            ix += 1
+        else:
+            y += sy
+            iy += 1
+        if not passable[x, y]:
+            return False
+    return True
+
+
+def corner_points(path):
+    """只留下路徑的起點、轉彎處與終點（同方向的直線段合併）"""
+    if len(path) < 3:
+        return list(path)
+    corners = [path[0]]
+    for prev, node, nxt in zip(path, path[1:], path[2:]):
+        if (node[0] - prev[0], node[1] - prev[1]) != (nxt[0] - node[0], nxt[1] - node[1]):
+            corners.append(node)
+    corners.append(path[-1])
+    return corners
+
+
+def compress_path(passable, path):
+    """
+    把格子路徑壓成轉角路徑點（string pulling）
+
+    參數:
+    - passable: 可通行表（passable[x, y]）
+    - path: 格子路徑（包含起點與終點）
+
+    回傳路徑點串列（包含起點與終點，都是原路徑上的格子）；相鄰兩點之間的直線只經過可通行格子。
+    先把直線段合併成轉彎點，再從目前的點往後找看得到的最遠轉彎點，視線檢查只在轉彎點之間做
+    """
+    corners = corner_points(path)
+    if len(corners) < 3:
+        return corners
+
+    waypoints = [corners[0]]
+    anchor = 0
+    i = 1
+    while i < len(corners) - 1:
+        # corners[i + 1] 從 anchor 看得到，corners[i] 就可以省略
+        if line_of_sight(passable, corners[anchor], corners[i + 1]):
+            i += 1
+            continue
+        waypoints.append(corners[i])
+        anchor = i
+        i += 1
+    waypoints.append(corners[-1])
+    return waypoints
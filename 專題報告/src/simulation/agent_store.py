@@ -0,0 +1,300 @@
+from collections.abc import MutableMapping, Sequence
+
+import numpy as np
+
+# 代理狀態
+ACTIVE = 0
+EVACUATED = 1
+
+# 欄位名稱 -> (dtype, 每列的形狀, 預設值)
+COLUMNS = {
+    "position": (np.int32, (2,), 0),
+    "goal": (np.int32, (2,), 0),
+    "path_start": (np.int64, (), 0),
+    "path_length": (np.int32, (), 0),
+    "path_index": (np.int32, (), 0),
+    "state": (np.int8, (), ACTIVE),
+    "speed": (np.float32, (), 1.0),
+    "tolerance": (np.float32, (), np.inf),
+    "reaction_time": (np.float32, (), 0.0),
+    "path_changes": (np.int32, (), 0),
+}
+
+
+class AgentStore:
+    def __init__(self, capacity=1024):
+        """
+        代理資料（structure of arrays）：每個欄位一個 NumPy 陣列，第 i 列是第 i 個代理
+
+        參數:
+        - capacity: 初始容量（不夠時加倍）
+
+        - position / goal: 格子座標 (x, y)
+        - path_start / path_length / path_index: 路徑在 path_cells 中的起點、長度，以及目前走到第幾個節點
+        - state: ACTIVE / EVACUATED
+        - speed: 每個時間步可以移動的網格數
+        - tolerance: 所在格擁擠度超過此值就檢查是否重規劃
+        - reaction_time: 模擬時間到了才開始移動（秒）
+        - 路徑不保留 Python 串列，全部串接存在 path_cells（(m, 2) int32）；批次加入時同一條路徑只存一份。
+          換掉的路徑留下空洞，空洞比使用中的多時整理一次，所以記憶體不超過使用中路徑的兩倍
+        """
+        self.count = 0
+        self.capacity = max(1, capacity)
+        for name, (dtype, shape, default) in COLUMNS.items():
+            setattr(self, name, np.full((self.capacity,) + shape, default, dtype=dtype))
+        self.ids = []
+        self.index = {}  # agent_id -> 列號
+
+        self.path_cells = np.zeros((1024, 2), dtype=np.int32)
+        self.path_used = 0      # path_cells 已用到的長度
+        self.path_garbage = 0   # 其中已不再使用的格數
+        self._users = {}        # 路徑起點 -> 使用這段路徑的代理數
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, n):
+        """確保還能再放 n 個代理"""
+        if self.count + n <= self.capacity:
+            return
+        while self.count + n > self.capacity:
+            self.capacity *= 2
+        for name, (dtype, shape, default) in COLUMNS.items():
+            old = getattr(self, name)
+            new = np.full((self.capacity,) + shape, default, dtype=dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def add(self, agent_id, position, goal, path, speed=1.0, tolerance=np.inf, reaction_time=0.0):
+        """新增一個代理，回傳列號"""
+        return self.add_many([agent_id], [position], [goal], [path], speed, tolerance, reaction_time)[0]
+
+    def add_many(self, agent_ids, positions, goals, paths, speed=1.0, tolerance=np.inf,
+                 reaction_time=0.0):
+        """
+        批次新增代理，回傳列號陣列
+
+        參數:
+        - agent_ids, positions, goals, paths: 等長串列（path 為 None 或空串列表示沒有路徑）
+        - speed, tolerance, reaction_time: 純量或與代理對應的陣列
+        """
+        n = len(agent_ids)
+        self._reserve(n)
+        rows = np.arange(self.count, self.count + n)
+        self.count += n
+        if n == 0:
+            return rows
+        self.position[rows] = np.asarray(positions, dtype=np.int32).reshape(-1, 2)
+        self.goal[rows] = np.asarray(goals, dtype=np.int32).reshape(-1, 2)
+        self.state[rows] = ACTIVE
+        self.speed[rows] = speed
+        self.tolerance[rows] = tolerance
+        self.reaction_time[rows] = reaction_time
+        self.path_changes[rows] = 0
+        self.path_length[rows] = 0
+        self.path_index[rows] = 0
+        for i, agent_id in zip(rows.tolist(), agent_ids):
+            self.ids.append(agent_id)
+            self.index[agent_id] = i
+
+        # 同一個路徑串列（例如 find_paths 給相同起點的結果）只存一份
+        starts = {}
+        for i, path in zip(rows.tolist(), paths):
+            if not path:
+                continue
+            start = starts.get(id(path))
+            if start is None:
+                start = starts[id(path)] = self._append_cells(path)
+            self._use(i, start, len(path))
+        return rows
+
+    def set_path(self, i, path):
+        """換掉第 i 個代理的路徑，並從路徑起點開始走"""
+        self._release(i)
+        self.path_index[i] = 0
+        if path:
+            self._use(i, self._append_cells(path), len(path))
+
+    def path(self, i):
+        """第 i 個代理的路徑（(x, y) 串列，包含起點與終點）；沒有路徑回傳 None"""
+        if self.path_length[i] == 0:
+            return None
+        start = int(self.path_start[i])
+        return [tuple(c) for c in self.path_cells[start:start + self.path_length[i]].tolist()]
+
+    def _use(self, i, start, length):
+        self.path_start[i] = start
+        self.path_length[i] = length
+        self._users[start] = self._users.get(start, 0) + 1
+
+    def _release(self, i):
+        if self.path_length[i] == 0:
+            return
+        start = int(self.path_start[i])
+        self._users[start] -= 1
+        if self._users[start] == 0:
+            del self._users[start]
+            self.path_garbage += int(self.path_length[i])
+        self.path_length[i] = 0
+
+    def _append_cells(self, path):
+        n = len(path)
+        if self.path_garbage > self.path_used - self.path_garbage:
+            self._compact()
+        if self.path_used + n > len(self.path_cells):
+            cells = np.zeros((max(2 * len(self.path_cells), self.path_used + n), 2), dtype=np.int32)
+            cells[:self.path_used] = self.path_cells[:self.path_used]
+            self.path_cells = cells
+        start = self.path_used
+        self.path_cells[start:start + n] = path
+        self.path_used += n
+        return start
+
+    def _compact(self):
+        """把使用中的路徑搬到 path_cells 前段，更新代理的 path_start"""
+        rows = np.flatnonzero(self.path_length[:self.count] > 0)
+        old_starts, first = np.unique(self.path_start[rows], return_index=True)
+        lengths = self.path_length[rows[first]].astype(np.int64)
+        new_starts = np.cumsum(lengths) - lengths
+        cells, _ = self.segments(rows[first], 0)
+        self.path_cells = np.zeros_like(self.path_cells)
+        self.path_cells[:len(cells)] = cells
+        self.path_start[rows] = new_starts[np.searchsorted(old_starts, self.path_start[rows])]
+        self._users = {int(s): self._users[int(o)] for o, s in zip(old_starts, new_starts)}
+        self.path_used = len(cells)
+        self.path_garbage = 0
+
+    def active(self):
+        """尚未疏散的代理（布林陣列）"""
+        return self.state[:self.count] == ACTIVE
+
+    def segments(self, rows, begin):
+        """
+        rows 這些代理從路徑第 begin 個節點（純量或陣列）到終點的格子串接起來，
+        回傳 (格子 (m, 2), 各代理的格數)
+        """
+        start = self.path_start[rows] + begin
+        lengths = np.maximum(self.path_length[rows].astype(np.int64) - begin, 0)
+        offsets = np.repeat(start - np.cumsum(lengths) + lengths, lengths)
+        return self.path_cells[offsets + np.arange(lengths.sum())], lengths
+
+    def advance(self, rows):
+        """rows 這些代理沿路徑前進 speed 格（不超過終點），更新 position；回傳有移動的列號"""
+        remaining = self.path_length[rows] - 1 - self.path_index[rows]
+        steps = np.minimum(self.speed[rows].astype(np.int32), remaining)
+        mask = steps > 0
+        moving = rows[mask]
+        self.path_index[moving] += steps[mask]
+        self.position[moving] = self.path_cells[self.path_start[moving] + self.path_index[moving]]
+        return moving
+
+    def record(self, i):
+        """第 i 個代理的 dict 快照（與 SimulationController 舊版的代理格式相同）"""
+        return {
+            "id": self.ids[i],
+            "position": tuple(self.position[i].tolist()),
+            "goal": tuple(self.goal[i].tolist()),
+            "path": self.path(i),
+            "current_path_index": int(self.path_index[i]),
+            "evacuated": bool(self.state[i] == EVACUATED),
+            "speed": float(self.speed[i]),
+            "tolerance": float(self.tolerance[i]),
+            "reaction_time": float(self.reaction_time[i]),
+            "path_changes": int(self.path_changes[i]),
+        }
+
+
+# AgentRecord 的欄位（與 AgentStore.record 相同）
+RECORD_FIELDS = ("id", "position", "goal", "path", "current_path_index", "evacuated",
+                 "speed", "tolerance", "reaction_time", "path_changes")
+
+
+class AgentRecord(MutableMapping):
+    """
+    第 i 個代理的 dict 介面（欄位同 AgentStore.record），讀寫直接對應到 store 的欄位；
+    "path" 要整條指定（會從起點重新開始走），不能原地修改回傳的串列
+    """
+
+    def __init__(self, store, i):
+        self.store = store
+        self.i = i
+
+    def __getitem__(self, key):
+        store, i = self.store, self.i
+        if key == "id":
+            return store.ids[i]
+        if key in ("position", "goal"):
+            return tuple(getattr(store, key)[i].tolist())
+        if key == "path":
+            return store.path(i)
+        if key == "current_path_index":
+            return int(store.path_index[i])
+        if key == "evacuated":
+            return bool(store.state[i] == EVACUATED)
+        if key == "path_changes":
+            return int(store.path_changes[i])
+        if key in ("speed", "tolerance", "reaction_time"):
+            return float(getattr(store, key)[i])
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        store, i = self.store, self.i
+        if key == "id":
+            del store.index[store.ids[i]]
+            store.ids[i] = value
+            store.index[value] = i
+        elif key == "path":
+            store.set_path(i, value)
+        elif key == "current_path_index":
+            store.path_index[i] = value
+        elif key == "evacuated":
+            store.state[i] = EVACUATED if value else ACTIVE
+        elif key in ("position", "goal", "path_changes", "speed", "tolerance", "reaction_time"):
+            getattr(store, key)[i] = value
+        else:
+            raise KeyError(key)
+
+    def __delitem__(self, key):
+        raise TypeError("代理欄位不能刪除")
+
+    def __iter__(self):
+        return iter(RECORD_FIELDS)
+
+    def __len__(self):
+        return len(RECORD_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class AgentList(Sequence):
+    """store 的代理串列介面：元素為 AgentRecord，append(dict) 新增代理（舊版 controller.agents 的用法）"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [AgentRecord(self.store, i) for i in range(len(self.store))[k]]
+        if k < 0:
+            k += len(self.store)
+        if not 0 <= k < len(self.store):
+            raise IndexError(k)
+        return AgentRecord(self.store, k)
+
+    def __len__(self):
+        return len(self.store)
+
+    def append(self, agent):
+        """新增一個代理（dict，至少要有 id / position / goal；沒給的欄位用預設值）"""
+        i = self.store.add(agent["id"], agent["position"], agent["goal"], agent.get("path"),
+                           agent.get("speed", 1.0), agent.get("tolerance", np.inf),
+                           agent.get("reaction_time", 0.0))
+        record = AgentRecord(self.store, i)
+        for key in ("current_path_index", "evacuated", "path_changes"):
+            if key in agent:
+                record[key] = agent[key]
+
+    def extend(self, agents):
+        for agent in agents:
+            self.append(agent)
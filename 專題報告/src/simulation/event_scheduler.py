@@ -0,0 +1,55 @@
+import heapq
+import itertools
+
+
+class EventScheduler:
+    """
+    定時事件排程器（binary heap）
+    - schedule(time, event_type, data)：O(log n) 加入
+    - pop_due(now) / dispatch(now)：依時間取出 time <= now 的事件，每個 O(log n)；
+      同一時間的事件依加入順序處理
+    - on(event_type, handler)：每種事件一個處理函式 handler(data, time)，dispatch 時呼叫
+    """
+
+    def __init__(self):
+        self._heap = []                  # (時間, 序號, 事件類型, 資料)
+        self._order = itertools.count()  # 序號：同時間依加入順序，也避免比較到 data
+        self.handlers = {}
+
+    def __len__(self):
+        return len(self._heap)
+
+    def on(self, event_type, handler):
+        """註冊 event_type 的處理函式 handler(data, time)"""
+        self.handlers[event_type] = handler
+
+    def schedule(self, time, event_type, data=None):
+        heapq.heappush(self._heap, (time, next(self._order), event_type, data))
+
+    def next_time(self):
+        """最早的事件時間；沒有事件回傳 None"""
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """取出所有 time <= now 的事件，回傳 [(time, event_type, data), ...]（依時間、加入順序）"""
+        due = []
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            time, _, event_type, data = heapq.heappop(heap)
+            due.append((time, event_type, data))
+        return due
+
+    def dispatch(self, now):
+        """
+        處理所有 time <= now 的事件，回傳處理的事件數；
+        沒有註冊處理函式的事件直接丟掉。處理函式新排進來、時間已到的事件也在這次處理
+        """
+        heap = self._heap
+        count = 0
+        while heap and heap[0][0] <= now:
+            time, _, event_type, data = heapq.heappop(heap)
+            handler = self.handlers.get(event_type)
+            if handler is not None:
+                handler(data, time)
+            count += 1
+        return count
@@ -1,105 +1,203 @@
 import numpy as np
 from ..pathfinding.dynamic_path_planner import DynamicPathPlanner
+from .agent_store import AgentList, AgentStore, EVACUATED
+from .event_scheduler import EventScheduler
+from .tiled_replanner import TiledReplanner, replan_agents
+
+
+def _sum_segments(values, lengths):
+    """AgentStore.segments 串接起來的逐格數值，加總回各代理"""
+    owner = np.repeat(np.arange(len(lengths)), lengths)
+    return np.bincount(owner, weights=values, minlength=len(lengths))
+
 
 class SimulationController:
-    def __init__(self, grid_map, time_step=0.1):
+    def __init__(self, grid_map, time_step=0.1, replan_interval=1, batch_replan=False,
+                 congestion_threshold=5.0, workers=1, tile_size=32):
         """
         初始化模擬控制器
         
         參數:
         - grid_map: 環境地圖
         - time_step: 模擬時間步長（秒）
+        - replan_interval: 每幾步檢查一次重規劃（代理輪流分到不同步；1 為每步都檢查）；
+          剩餘路徑被擋住、或所在格擁擠度超過 tolerance 的代理當步一定檢查
+        - batch_replan: 同一目標要重規劃的代理用 DynamicPathPlanner.replan_paths 一次反向搜尋（大量代理時用）
+        - congestion_threshold: 擁擠度超過此值的格子視為擁擠點
+        - workers: 大於 1 時把重規劃依 tile 分到這麼多個 worker process（見 TiledReplanner），
+          結果與單核心相同（batch_replan 時代價相同的路徑可能選到不同的一條）；用完呼叫 close() 或用 with 區塊
+        - tile_size: 分塊執行時每個 tile 的邊長（格）
         """
         self.grid_map = grid_map
         self.time_step = time_step
         self.current_time = 0.0
-        self.path_planner = DynamicPathPlanner(grid_map)
+        self.steps = 0
+        self.replan_interval = max(1, replan_interval)
+        self.batch_replan = batch_replan
+        # find_path 快取只在擁擠度沒變時沿用（route_tolerance=None）：重規劃結果只由目前的通行層與
+        # 擁擠度決定，與先前規劃過哪些路徑無關，分到不同 worker（各自一份快取）時結果也相同
+        self.path_planner = DynamicPathPlanner(grid_map, route_tolerance=None)
+        self._checked_map_version = self.path_planner.map_version
+        self.tiled = TiledReplanner(self.path_planner, workers, tile_size) if workers > 1 else None
         
-        # 事件隊列，格式為 (觸發時間, 事件類型, 事件數據)
-        self.event_queue = []
+        # 事件隊列（heap），每種事件類型一個處理函式
+        self.event_queue = EventScheduler()
+        self.event_queue.on("add_obstacle", self._on_add_obstacle)
+        self.event_queue.on("remove_obstacle", self._on_remove_obstacle)
+        self.event_queue.on("change_agent_goal", self._on_change_agent_goal)
         
-        # 代理列表，每個代理包含位置、目標、當前路徑等信息
-        self.agents = []
+        # 代理資料：位置、目標、路徑指標、狀態、速度等欄位各一個 NumPy 陣列
+        self.store = AgentStore()
+        
+        # 擁擠統計（每步以遮罩一次更新，涵蓋整場模擬）
+        self.congestion_threshold = congestion_threshold
+        shape = self.path_planner.crowd_density.shape
+        self.congestion_peak = np.zeros(shape, dtype=np.float32)   # 每格出現過的最大擁擠度
+        self.congestion_ticks = np.zeros(shape, dtype=np.int32)    # 每格處於擁擠的步數
+        self.congestion_series = []   # 每步一筆 (時間, 擁擠格數, 最大擁擠度)
         
         # 統計數據
         self.stats = {
             "evacuation_time": 0,
             "congestion_points": [],
+            "congestion_series": self.congestion_series,
             "path_changes": 0
         }
     
-    def add_agent(self, agent_id, position, goal):
+    @property
+    def agents(self):
+        """
+        代理串列（AgentList）：元素像舊版的代理 dict，讀寫直接對應到 store；append(dict) 新增代理。
+        只讀取時用 store.record(i) 或 get_simulation_state() 比較快
+        """
+        return AgentList(self.store)
+    
+    def add_agent(self, agent_id, position, goal, speed=1.0, tolerance=np.inf, reaction_time=0.0):
         """添加代理（人員）"""
         path = self.path_planner.find_path(position, goal)
-        self.agents.append({
-            "id": agent_id,
-            "position": position,
-            "goal": goal,
-            "path": path,
-            "current_path_index": 0,
-            "evacuated": False,
-            "speed": 1.0,  # 每個時間步可以移動的網格數
-            "path_changes": 0
-        })
+        self.store.add(agent_id, position, goal, path, speed, tolerance, reaction_time)
+    
+    def add_agents(self, agents):
+        """
+        批次添加代理
+        
+        參數:
+        - agents: (agent_id, position, goal) 串列；同一目標的代理用 find_paths 一次規劃
+        """
+        groups = {}
+        for agent_id, position, goal in agents:
+            groups.setdefault(goal, []).append(position)
+        paths = {goal: iter(self.path_planner.find_paths(starts, goal))
+                 for goal, starts in groups.items()}
+        self.store.add_many([a[0] for a in agents], [a[1] for a in agents], [a[2] for a in agents],
+                            [next(paths[goal]) for _, _, goal in agents])
     
     def add_event(self, time, event_type, data):
-        """添加事件到隊列"""
-        self.event_queue.append((self.current_time + time, event_type, data))
-        self.event_queue.sort()  # 按時間排序
+        """添加事件到隊列（time 為從現在起算的秒數；同一時間的事件依加入順序處理）"""
+        self.event_queue.schedule(self.current_time + time, event_type, data)
     
     def update_agent_positions(self):
-        """更新所有代理的位置"""
-        # 收集所有代理的當前位置，用於更新擁擠度地圖
-        positions = [agent["position"] for agent in self.agents if not agent["evacuated"]]
-        self.path_planner.update_crowd_density(positions)
-        
-        for agent in self.agents:
-            if agent["evacuated"]:
-                continue
-                
-            # 如果已經到達目標
-            if agent["position"] == agent["goal"]:
-                agent["evacuated"] = True
-                continue
-                
-            # 檢查是否需要重新規劃路徑
-            new_path = self.path_planner.update_and_replan(
-                agent["position"], agent["goal"], agent["path"])
-                
-            if new_path and new_path != agent["path"]:
-                agent["path"] = new_path
-                agent["current_path_index"] = 0
-                agent["path_changes"] += 1
+        """更新所有代理的位置（到達判斷與移動以陣列運算一次處理所有代理）"""
+        store = self.store
+        planner = self.path_planner
+        active = np.flatnonzero(store.active())
+        
+        # 用所有未疏散代理的當前位置更新擁擠度地圖
+        planner.update_crowd_density(store.position[active])
+        
+        # 已到達目標的代理標記為疏散
+        arrived = np.all(store.position[active] == store.goal[active], axis=1)
+        store.state[active[arrived]] = EVACUATED
+        active = active[~arrived]
+        
+        # 檢查是否需要重新規劃路徑（先用陣列運算排除一定不會重規劃的代理）
+        rows = self._replan_candidates(active)
+        rows = rows[~self._keeps_path(rows)]
+        positions = [tuple(p) for p in store.position[rows].tolist()]
+        goals = [tuple(g) for g in store.goal[rows].tolist()]
+        paths = [store.path(i) for i in rows.tolist()]
+        if self.tiled is not None:
+            new_paths = self.tiled.replan(positions, goals, paths, self.batch_replan)
+        else:
+            new_paths = replan_agents(planner, positions, goals, paths, self.batch_replan)
+        for i, path, new_path in zip(rows.tolist(), paths, new_paths):
+            if new_path and new_path != path:
+                store.set_path(i, new_path)
+                store.path_changes[i] += 1
                 self.stats["path_changes"] += 1
+                
+        # 反應時間已過的代理沿著路徑移動（根據速度）
+        store.advance(active[store.reaction_time[active] <= self.current_time])
+    
+    def _replan_candidates(self, active):
+        """這一步要檢查重規劃的代理：輪到的、所在格擁擠度超過 tolerance 的、通行層改變後剩餘路徑被擋住的"""
+        store = self.store
+        planner = self.path_planner
+        check = np.zeros(len(store), dtype=bool)
+        check[self.steps % self.replan_interval::self.replan_interval] = True
+        
+        pos = store.position[active]
+        inside = ((pos >= 0) & (pos < planner.crowd_density.shape)).all(axis=1)
+        rows, pos = active[inside], pos[inside]
+        check[rows[planner.crowd_density[pos[:, 0], pos[:, 1]] > store.tolerance[rows]]] = True
+        
+        if planner.map_version != self._checked_map_version:
+            self._checked_map_version = planner.map_version
+            cells, lengths = store.segments(active, store.path_index[active])
+            blocked = _sum_segments(~planner.passable[cells[:, 0], cells[:, 1]], lengths)
+            check[active[blocked > 0]] = True
+        return active[check[active]]
+    
+    def _keeps_path(self, rows):
+        """
+        rows 中 should_replan 一定回傳 False 的代理（布林陣列）：整條路徑都可通行，而且已在終點、
+        或到終點的代價下界已經不可能讓代價降低超過閾值；其餘的交給 update_and_replan 判斷
+        """
+        store = self.store
+        planner = self.path_planner
+        keep = np.zeros(len(rows), dtype=bool)
+        has_path = store.path_length[rows] > 0
+        rows = rows[has_path]
+        if len(rows) == 0:
+            return keep
             
-            # 沿著路徑移動
-            if agent["path"] and agent["current_path_index"] < len(agent["path"]) - 1:
-                # 根據速度移動
-                steps = min(int(agent["speed"]), len(agent["path"]) - 1 - agent["current_path_index"])
-                agent["current_path_index"] += steps
-                agent["position"] = agent["path"][agent["current_path_index"]]
+        cells, lengths = store.segments(rows, 0)
+        clear = _sum_segments(~planner.passable[cells[:, 0], cells[:, 1]], lengths) == 0
+        
+        # 剩餘代價：目前節點之後每一步 1 + 擁擠度 * crowd_weight
+        cells, lengths = store.segments(rows, store.path_index[rows] + 1)
+        steps = 1.0 + planner.crowd_density[cells[:, 0], cells[:, 1]] * planner.crowd_weight
+        old_cost = _sum_segments(steps, lengths)
+        bound = np.zeros(len(rows))
+        ends = store.path_cells[store.path_start[rows] + store.path_length[rows] - 1]
+        for goal in np.unique(ends, axis=0):
+            same = (ends == goal).all(axis=1)
+            bound[same] = planner.path_cost_lower_bounds(store.position[rows[same]], tuple(goal.tolist()))
+        # 加總順序與 should_replan 不同，留一點浮點誤差的餘裕，剛好在邊界上的交給 should_replan
+        hopeless = bound >= old_cost * (1 - planner.replanning_threshold) * (1 + 1e-9)
+        
+        keep[has_path] = clear & ((lengths == 0) | hopeless)
+        return keep
     
     def process_events(self):
         """處理當前時間步的事件"""
-        while self.event_queue and self.event_queue[0][0] <= self.current_time:
-            _, event_type, data = self.event_queue.pop(0)
-            
-            if event_type == "add_obstacle":
-                x, y = data
-                self.path_planner.add_dynamic_obstacle((x, y))
-                
-            elif event_type == "remove_obstacle":
-                x, y = data
-                self.path_planner.remove_dynamic_obstacle((x, y))
-                
-            elif event_type == "change_agent_goal":
-                agent_id, new_goal = data
-                for agent in self.agents:
-                    if agent["id"] == agent_id:
-                        agent["goal"] = new_goal
-                        agent["path"] = self.path_planner.find_path(agent["position"], new_goal)
-                        agent["current_path_index"] = 0
-                        break
+        self.event_queue.dispatch(self.current_time)
+    
+    def _on_add_obstacle(self, data, time):
+        x, y = data
+        self.path_planner.add_dynamic_obstacle((x, y))
+    
+    def _on_remove_obstacle(self, data, time):
+        x, y = data
+        self.path_planner.remove_dynamic_obstacle((x, y))
+    
+    def _on_change_agent_goal(self, data, time):
+        agent_id, new_goal = data
+        i = self.store.index.get(agent_id)
+        if i is not None:
+            self.store.goal[i] = new_goal
+            position = tuple(self.store.position[i].tolist())
+            self.store.set_path(i, self.path_planner.find_path(position, new_goal))
     
     def step(self):
         """執行一個模擬時間步"""
@@ -108,24 +206,54 @@ class SimulationController:
         
         # 更新模擬時間
         self.current_time += self.time_step
+        self.steps += 1
         
         # 檢查是否所有代理都已疏散
-        all_evacuated = all(agent["evacuated"] for agent in self.agents)
+        all_evacuated = not self.store.active().any()
         if all_evacuated:
             self.stats["evacuation_time"] = self.current_time
             
-        # 識別擁擠點
-        congestion_threshold = 5.0  # 擁擠度閾值
-        congestion_points = []
-        for i in range(self.path_planner.height):
-            for j in range(self.path_planner.width):
-                if self.path_planner.crowd_density[i, j] > congestion_threshold:
-                    congestion_points.append((i, j, self.path_planner.crowd_density[i, j]))
-        
-        self.stats["congestion_points"] = congestion_points
+        self._track_congestion()
         
         return all_evacuated
     
+    def _track_congestion(self):
+        """識別本步的擁擠點，並累計每格峰值、擁擠步數與擁擠時間序列"""
+        density = self.path_planner.crowd_density
+        congested = density > self.congestion_threshold
+        np.maximum(self.congestion_peak, density, out=self.congestion_peak)
+        self.congestion_ticks += congested
+        
+        rows, cols = np.nonzero(congested)
+        values = density[rows, cols]
+        self.stats["congestion_points"] = list(zip(rows.tolist(), cols.tolist(), values))
+        self.congestion_series.append(
+            (self.current_time, len(values), float(values.max()) if len(values) else 0.0))
+    
+    def bottlenecks(self, top=10):
+        """
+        整場模擬的瓶頸格：依擁擠持續時間由長到短（同長度依峰值），
+        回傳 [(i, j, 擁擠秒數, 峰值擁擠度), ...]
+        """
+        rows, cols = np.nonzero(self.congestion_ticks)
+        ticks = self.congestion_ticks[rows, cols]
+        peaks = self.congestion_peak[rows, cols]
+        order = np.lexsort((-peaks, -ticks))[:top]
+        return [(int(rows[k]), int(cols[k]), float(ticks[k]) * self.time_step, float(peaks[k]))
+                for k in order]
+    
+    def close(self):
+        """釋放分塊執行的 worker 與 shared memory（workers > 1 時）"""
+        if self.tiled is not None:
+            self.tiled.close()
+            self.tiled = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
     def run_simulation(self, max_time=1000.0):
         """運行完整模擬"""
         while self.current_time < max_time:
@@ -143,7 +271,8 @@ class SimulationController:
             "congestion_map": self.path_planner.crowd_density.tolist()
         }
         
-        for agent in self.agents:
+        for i in range(len(self.store)):
+            agent = self.store.record(i)
             state["agents"].append({
                 "id": agent["id"],
                 "position": agent["position"],
@@ -153,4 +282,3 @@ class SimulationController:
             })
             
         return state
-
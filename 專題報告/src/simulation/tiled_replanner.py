@@ -0,0 +1,170 @@
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from ..pathfinding.dynamic_path_planner import DynamicPathPlanner
+
+
+def replan_agents(planner, positions, goals, paths, batch=False):
+    """
+    依序判斷每個代理是否重規劃，回傳與 positions 對應的新路徑（不換就是原路徑）
+
+    參數:
+    - planner: DynamicPathPlanner
+    - positions / goals / paths: 各代理目前位置、目標、路徑
+    - batch: 同一目標的代理用 replan_paths 一次反向搜尋
+    """
+    if not batch:
+        return [planner.update_and_replan(position, goal, path)
+                for position, goal, path in zip(positions, goals, paths)]
+    new_paths = [None] * len(paths)
+    groups = {}
+    for k, goal in enumerate(goals):
+        groups.setdefault(goal, []).append(k)
+    for goal, ks in groups.items():
+        results = planner.replan_paths([positions[k] for k in ks], goal, [paths[k] for k in ks])
+        for k, new_path in zip(ks, results):
+            new_paths[k] = new_path
+    return new_paths
+
+
+# worker process 內的狀態（_init_worker 建立）
+_worker = {}
+
+
+def _attach(name, shape, dtype):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(shape, names, crowd_weight, replanning_threshold, route_tolerance):
+    """每個 worker 一份規劃器（設定與主程式相同）；通行層與擁擠度每步從 shared memory 同步"""
+    passable_shm, passable = _attach(names[0], shape, np.bool_)
+    density_shm, density = _attach(names[1], shape, np.float64)
+    planner = DynamicPathPlanner((~passable).astype(np.int8), crowd_weight=crowd_weight,
+                                 replanning_threshold=replanning_threshold, route_tolerance=route_tolerance)
+    _worker.update(planner=planner, passable=passable, density=density,
+                   shm=(passable_shm, density_shm), versions=(None, None))
+
+
+def _sync(versions, obstacles):
+    """主程式的通行層 / 擁擠度版本變了才同步；版本號各自 +1，讓 worker 自己的快取失效"""
+    planner = _worker["planner"]
+    map_version, crowd_version = _worker["versions"]
+    if versions[0] != map_version:
+        planner.dynamic_obstacles = set(obstacles)   # 路徑是否被擋（should_replan）看的是這個集合
+        for node in map(tuple, np.argwhere(planner.passable != _worker["passable"]).tolist()):
+            planner.passable[node] = _worker["passable"][node]
+            planner.map_version += 1
+            planner.on_cell_changed(node)
+    if versions[1] != crowd_version:
+        planner.crowd_density[:] = _worker["density"]
+        planner.crowd.version += 1
+    _worker["versions"] = versions
+
+
+def _replan_chunk(versions, obstacles, positions, goals, paths, batch):
+    _sync(versions, obstacles)
+    return replan_agents(_worker["planner"], positions, goals, paths, batch)
+
+
+def _release(pool, shms):
+    """關閉 worker 並釋放 shared memory（close() 或物件被回收時呼叫，只執行一次）"""
+    pool.shutdown()
+    for shm in shms:
+        shm.close()
+        shm.unlink()
+
+
+class TiledReplanner:
+    def __init__(self, planner, workers, tile_size=32, min_parallel=64):
+        """
+        把代理的重規劃分到多個 worker process（分塊執行）
+
+        參數:
+        - planner: 主程式的 DynamicPathPlanner（通行層與擁擠度以它為準）
+        - workers: worker process 數
+        - tile_size: 地圖切成 tile_size x tile_size 的 tile，同一 tile 的代理交給同一個 worker
+        - min_parallel: 要重規劃的代理少於這個數就直接在主程式算（省下傳送的成本）
+
+        - 通行層與擁擠度放在 shared memory，每步只在版本改變時由主程式寫入，動態障礙物清單隨工作傳送；
+          擁擠度 kernel 跨 tile 邊界的部分（halo）因此不用另外交換，worker 看到的是整張地圖
+        - 代理每步依目前位置重新分 tile，走到別的 tile 就交給別的 worker
+        - planner 要用 route_tolerance=None（SimulationController 的設定）：每個 worker 各有一份路徑快取，
+          只在擁擠度沒變時沿用的快取結果與重新搜尋相同，每個代理的判斷就只由目前的通行層與擁擠度決定、
+          與分到哪個 worker 或之前規劃過什麼無關，所以結果與單核心相同（test_tiled_replanner.py）；
+          batch 模式下每塊各自一次反向搜尋，代價相同的路徑可能選到不同的一條（同 replan_paths）
+        - 只分攤重規劃：移動仍由主程式對所有代理一起處理，代理不在 worker 之間搬移
+        - 用完呼叫 close()，或用 with 區塊；忘了關閉時物件被回收也會釋放
+        """
+        self.planner = planner
+        self.workers = workers
+        self.tile_size = tile_size
+        self.min_parallel = min_parallel
+        shape = planner.passable.shape
+        self._shm = [shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape))) * itemsize)
+                     for itemsize in (np.dtype(np.bool_).itemsize, np.dtype(np.float64).itemsize)]
+        self._passable = np.ndarray(shape, dtype=np.bool_, buffer=self._shm[0].buf)
+        self._density = np.ndarray(shape, dtype=np.float64, buffer=self._shm[1].buf)
+        self._published = None
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(shape, [shm.name for shm in self._shm], planner.crowd_weight,
+                      planner.replanning_threshold, planner.route_tolerance))
+        self._finalizer = weakref.finalize(self, _release, self.pool, self._shm)
+
+    def _publish(self):
+        """把主程式目前的通行層 / 擁擠度寫進 shared memory，回傳版本"""
+        versions = (self.planner.map_version, self.planner.crowd.version)
+        if self._published is None or versions[0] != self._published[0]:
+            self._passable[:] = self.planner.passable
+        if self._published is None or versions[1] != self._published[1]:
+            self._density[:] = self.planner.crowd_density
+        self._published = versions
+        return versions
+
+    def chunks(self, positions):
+        """
+        依 tile 把代理分成最多 workers 塊，回傳每塊的索引陣列；
+        tile 依列優先排序，整個 tile 放進同一塊，每塊人數盡量平均
+        """
+        pos = np.asarray(positions, dtype=np.int64).reshape(-1, 2)
+        tiles_y = -(-self.planner.width // self.tile_size)
+        tile = (pos[:, 0] // self.tile_size) * tiles_y + pos[:, 1] // self.tile_size
+        order = np.argsort(tile, kind="stable")
+        starts = np.flatnonzero(np.r_[True, tile[order][1:] != tile[order][:-1]])
+        target = -(-len(order) // self.workers)
+        cuts = []
+        for s in starts[1:].tolist():
+            if s >= target * (len(cuts) + 1):
+                cuts.append(s)
+        return [np.sort(chunk) for chunk in np.split(order, cuts) if len(chunk)]
+
+    def replan(self, positions, goals, paths, batch=False):
+        """replan_agents 的分塊平行版本，回傳順序與 positions 相同"""
+        if len(positions) < self.min_parallel or self.workers <= 1:
+            return replan_agents(self.planner, positions, goals, paths, batch)
+        versions = self._publish()
+        obstacles = list(self.planner.dynamic_obstacles)
+        futures = []
+        for chunk in self.chunks(positions):
+            ks = chunk.tolist()
+            futures.append((ks, self.pool.submit(_replan_chunk, versions, obstacles, [positions[k] for k in ks],
+                                                 [goals[k] for k in ks], [paths[k] for k in ks], batch)))
+        new_paths = [None] * len(positions)
+        for ks, future in futures:
+            for k, new_path in zip(ks, future.result()):
+                new_paths[k] = new_path
+        return new_paths
+
+    def close(self):
+        """關閉 worker 並釋放 shared memory（可重複呼叫）"""
+        self._passable = self._density = None   # 先放掉指向 shared memory 的陣列
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from src.simulation.simulation_controller import SimulationController
+
+
+def run_controller(seed, workers, steps=40):
+    """隨機地圖、兩個出口、途中加障礙物；回傳每步所有代理的位置與總改路徑次數"""
+    rng = np.random.default_rng(seed)
+    grid_map = (rng.random((48, 48)) < 0.1).astype(np.int8)
+    grid_map[47, 47] = grid_map[0, 47] = 0
+    free = np.argwhere(grid_map == 0)
+    starts = free[rng.choice(len(free), 200, replace=False)]
+    with SimulationController(grid_map, replan_interval=3, workers=workers, tile_size=16) as controller:
+        if controller.tiled is not None:
+            controller.tiled.min_parallel = 1   # 每步都真的分到 worker
+        controller.add_agents([(i, (int(x), int(y)), (47, 47) if i % 2 else (0, 47))
+                               for i, (x, y) in enumerate(starts)])
+        for _ in range(8):
+            x, y = free[rng.integers(len(free))]
+            controller.add_event(float(rng.integers(1, 30)) * 0.1, "add_obstacle", (int(x), int(y)))
+        trajectory = []
+        for _ in range(steps):
+            controller.step()
+            trajectory.append(controller.store.position[:len(controller.store)].copy())
+        return trajectory, int(controller.store.path_changes[:len(controller.store)].sum())
+
+
+def test_workers_match_single_process():
+    # 分塊平行重規劃的每一步位置、改路徑次數都要與單核心相同
+    for seed in range(2):
+        single, single_changes = run_controller(seed, 1)
+        tiled, tiled_changes = run_controller(seed, 3)
+        for step, (a, b) in enumerate(zip(single, tiled)):
+            assert np.array_equal(a, b), f"seed {seed} 第 {step} 步位置不同"
+        assert single_changes == tiled_changes
@@ -10,6 +10,9 @@ import numpy as np
 # 使用新的資料夾結構導入
 from src.pathfinding.path_planner import PathPlanner
 from src.pathfinding.dynamic_path_planner import DynamicPathPlanner
+from src.pathfinding.hpa_planner import HierarchicalPathPlanner, HIERARCHICAL_MIN_CELLS
+from src.pathfinding.path_smoothing import compress_path
+from src.pathfinding.anytime_planner import AnytimeSearch
 from Time_Event_Control import SimulationController
 
 class UnitySimulationServer:
@@ -26,6 +29,13 @@ class UnitySimulationServer:
         self.simulation_controller = None
         self.agents = []
         self.exits = []
+        # 規劃出來的原始格子路徑 (row, col)，id -> (path, 每個轉角路徑點在 path 中的索引)；
+        # agent['path'] 只放壓縮後的轉角路徑點，agent['path_index'] 為下一個要走向的路徑點
+        self.grid_paths = {}
+        self._checked_map_version = None
+        # 每次 update/step 規劃路徑的時間預算（秒）；None 表示不限時間，一次規劃完
+        self.plan_time_budget = None
+        self.anytime = {}  # 代理 id -> 還在改善中的 AnytimeSearch
         
         print(f"[Server] Initializing Unity Simulation Server...")
     
@@ -113,18 +123,29 @@ class UnitySimulationServer:
         agent_count = data.get('agent_count', 10)
         exit_x = data.get('exit_x', grid_width // 2)
         exit_y = data.get('exit_y', 0)
+        self.plan_time_budget = data.get('plan_time_budget')
+        seed = data.get('seed')  # 指定種子時出生位置可重現（Monte Carlo 批次比較用）
+        rng = np.random.default_rng(seed) if seed is not None else np.random
         
         # 創建網格地圖 (height x width)
         self.grid_map = np.zeros((grid_height, grid_width), dtype=np.float32)
         
-        # 初始化路徑規劃器
+        # 初始化路徑規劃器（大型樓層改用分層 HPA*）
         try:
-            self.path_planner = DynamicPathPlanner(
-                self.grid_map,
-                crowd_weight=0.5,
-                replanning_threshold=0.5
-            )
-            print("[Server] ✓ DynamicPathPlanner initialized")
+            if grid_width * grid_height >= HIERARCHICAL_MIN_CELLS:
+                self.path_planner = HierarchicalPathPlanner(
+                    self.grid_map,
+                    crowd_weight=0.5,
+                    replanning_threshold=0.5
+                )
+                print("[Server] ✓ HierarchicalPathPlanner initialized")
+            else:
+                self.path_planner = DynamicPathPlanner(
+                    self.grid_map,
+                    crowd_weight=0.5,
+                    replanning_threshold=0.5
+                )
+                print("[Server] ✓ DynamicPathPlanner initialized")
         except Exception as e:
             print(f"[Server] ⚠ DynamicPathPlanner init failed: {e}")
             # 降級使用基礎版本
@@ -144,16 +165,19 @@ class UnitySimulationServer:
         
         # 生成代理人（避開邊界）
         self.agents = []
+        self.grid_paths = {}
+        self.anytime = {}
         margin = 3
         for i in range(agent_count):
             agent = {
                 'id': i,
                 'position': [
-                    float(np.random.uniform(margin, grid_width - margin)),
-                    float(np.random.uniform(margin, grid_height - margin))
+                    float(rng.uniform(margin, grid_width - margin)),
+                    float(rng.uniform(margin, grid_height - margin))
                 ],
                 'target': [float(exit_x), float(exit_y)],
                 'path': [],
+                'path_index': 0,
                 'active': True
             }
             self.agents.append(agent)
@@ -165,6 +189,7 @@ class UnitySimulationServer:
             'agent_count': agent_count,
             'grid_size': [grid_width, grid_height],
             'exit': [exit_x, exit_y],
+            'seed': seed,
             'agents': self.agents
         }
         
@@ -185,42 +210,24 @@ class UnitySimulationServer:
                      for a in self.agents if a['active']]
         self.path_planner.update_crowd_density(positions)
         
+        # 路徑被動態障礙物擋住的代理清掉路徑，和沒有路徑的代理一起規劃（同一出口只做一次反向搜尋）；
+        # 有時間預算時改用 anytime 搜尋，超過預算就先回應，下次 update 再繼續
+        self.drop_invalid_paths()
+        time_budget = data.get('plan_time_budget', self.plan_time_budget)
+        if time_budget is None:
+            self.plan_missing_paths()
+        else:
+            self.plan_anytime(time_budget)
+        
         for agent in self.agents:
             if not agent['active']:
                 continue
             
             active_count += 1
             
-            # 如果沒有路徑，計算新路徑
-            if not agent['path']:
-                try:
-                    # 注意：網格座標是 (row, col) = (y, x)
-                    start = (int(agent['position'][1]), int(agent['position'][0]))
-                    goal = (int(agent['target'][1]), int(agent['target'][0]))
-                    
-                    # 確保座標在範圍內
-                    start = (
-                        max(0, min(self.grid_map.shape[0] - 1, start[0])),
-                        max(0, min(self.grid_map.shape[1] - 1, start[1]))
-                    )
-                    goal = (
-                        max(0, min(self.grid_map.shape[0] - 1, goal[0])),
-                        max(0, min(self.grid_map.shape[1] - 1, goal[1]))
-                    )
-                    
-                    # 使用路徑規劃器
-                    path = self.path_planner.find_path(start, goal)
-                    
-                    if path:
-                        # 轉換回 (x, y) 格式
-                        agent['path'] = [[float(col), float(row)] for row, col in path]
-                    
-                except Exception as e:
-                    print(f"[Server] Path planning error for agent {agent['id']}: {e}")
-            
-            # 沿著路徑移動
-            if agent['path']:
-                next_pos = agent['path'][0]
+            # 沿著路徑移動（走過的路徑點不刪除，只把 path_index 往後移）
+            if self.has_path(agent):
+                next_pos = agent['path'][agent['path_index']]
                 
                 # 計算移動方向
                 dx = next_pos[0] - agent['position'][0]
@@ -228,7 +235,7 @@ class UnitySimulationServer:
                 distance = np.sqrt(dx**2 + dy**2)
                 
                 if distance < 0.5:  # 到達路徑點
-                    agent['path'].pop(0)
+                    agent['path_index'] += 1
                 else:
                     # 朝目標移動
                     move_distance = speed * time_step
@@ -254,6 +261,120 @@ class UnitySimulationServer:
         print(f"[Server] Updated {active_count} active agents")
         return response
     
+    def grid_endpoints(self, agent):
+        """代理的起點與目標（網格座標 (row, col) = (y, x)，夾在地圖範圍內）"""
+        rows, cols = self.grid_map.shape
+        start = (int(agent['position'][1]), int(agent['position'][0]))
+        goal = (int(agent['target'][1]), int(agent['target'][0]))
+        start = (max(0, min(rows - 1, start[0])), max(0, min(cols - 1, start[1])))
+        goal = (max(0, min(rows - 1, goal[0])), max(0, min(cols - 1, goal[1])))
+        return start, goal
+    
+    @staticmethod
+    def has_path(agent):
+        """代理還有沒走到的路徑點"""
+        return agent['path_index'] < len(agent['path'])
+    
+    def remaining_grid_path(self, agent):
+        """
+        原始格子路徑中還沒走完的部分：從目前所在格開始（不在這一段上就從上一個走過的路徑點開始）；
+        沒有路徑回傳 None
+        """
+        entry = self.grid_paths.get(agent['id'])
+        if entry is None:
+            return None
+        path, indices = entry
+        k = agent['path_index']
+        lo = indices[k - 1] if k > 0 else 0
+        start, _ = self.grid_endpoints(agent)
+        if start in path[lo:indices[k] + 1]:
+            lo = path.index(start, lo, indices[k] + 1)
+        return path[lo:]
+    
+    def plan_missing_paths(self):
+        """還沒有路徑的代理依目標分組，每組用 find_paths 一次規劃（init 後第一次 update 的大量請求）"""
+        groups = {}
+        for agent in self.agents:
+            if agent['active'] and not self.has_path(agent):
+                start, goal = self.grid_endpoints(agent)
+                groups.setdefault(goal, []).append((agent, start))
+        
+        for goal, members in groups.items():
+            try:
+                paths = self.path_planner.find_paths([start for _, start in members], goal)
+            except Exception as e:
+                print(f"[Server] Path planning error for goal {goal}: {e}")
+                continue
+            for (agent, _), path in zip(members, paths):
+                if path:
+                    self.set_path(agent, path)
+    
+    def plan_anytime(self, time_budget):
+        """
+        限時規劃：最多花 time_budget 秒
+        - 沒有路徑的代理各自建立 ARA* 搜尋，先拿到加權 A* 的第一條路徑，之後的 update 繼續改善到最短路徑
+        - 時間先給還沒有路徑的代理，剩下的時間再改善已經有路徑的
+        """
+        deadline = time.perf_counter() + time_budget
+        by_id = {agent['id']: agent for agent in self.agents}
+        for agent in self.agents:
+            if agent['active'] and not self.has_path(agent) and agent['id'] not in self.anytime:
+                start, goal = self.grid_endpoints(agent)
+                self.anytime[agent['id']] = AnytimeSearch(self.path_planner, start, goal)
+        
+        for agent_id in sorted(self.anytime, key=lambda i: self.anytime[i].path is not None):
+            agent = by_id[agent_id]
+            search = self.anytime[agent_id]
+            if not agent['active']:
+                del self.anytime[agent_id]
+                continue
+            if time.perf_counter() >= deadline:
+                break
+            if search.improve(deadline) and search.path:
+                self.set_path(agent, search.path)
+            if search.done:
+                del self.anytime[agent_id]
+    
+    def set_path(self, agent, path):
+        """
+        設定代理的格子路徑 (row, col)；已經在走舊路徑時（anytime 改善）從目前所在格接上新路徑，
+        目前所在格不在新路徑上就保留舊路徑
+        """
+        if self.has_path(agent):
+            start, _ = self.grid_endpoints(agent)
+            if start not in path:
+                return
+            path = path[path.index(start):]
+        # 只傳轉角路徑點（直線看得到的中間格省略），轉換回 (x, y) 格式
+        waypoints = compress_path(self.path_planner.passable, path)
+        indices = []
+        i = 0
+        for waypoint in waypoints:   # 路徑點依序都是 path 上的格子
+            while path[i] != waypoint:
+                i += 1
+            indices.append(i)
+        self.grid_paths[agent['id']] = (path, indices)
+        agent['path'] = [[float(col), float(row)] for row, col in waypoints]
+        agent['path_index'] = 0
+    
+    def drop_invalid_paths(self):
+        """
+        通行層改變後，用原始格子路徑中還沒走完的部分檢查是否被動態障礙物擋住，
+        擋住的代理清掉路徑重新規劃（身後的格子被擋不影響）
+        """
+        planner = self.path_planner
+        if not hasattr(planner, 'is_path_valid') or planner.map_version == self._checked_map_version:
+            return
+        self._checked_map_version = planner.map_version
+        for agent in self.agents:
+            if not (agent['active'] and self.has_path(agent)):
+                continue
+            path = self.remaining_grid_path(agent)
+            if path and not planner.is_path_valid(path):
+                agent['path'] = []
+                agent['path_index'] = 0
+                del self.grid_paths[agent['id']]
+    
     def handle_step(self, data):
         """使用 SimulationController 進行一步模擬"""
         if self.simulation_controller:
@@ -273,7 +394,7 @@ class UnitySimulationServer:
             if agent['active']:
                 paths.append({
                     'id': agent['id'],
-                    'path': agent['path']
+                    'path': agent['path'][agent['path_index']:]
                 })
         
         response = {